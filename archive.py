@@ -0,0 +1,244 @@
+import asyncio
+import contextlib
+import gzip
+import os
+import sqlite3
+import sys
+import threading
+from typing import Iterator
+
+import lib
+
+try:
+    import fcntl
+except ImportError:  # posix only, elsewhere just the in-process lock guards writes
+    fcntl = None
+
+# finished chess games as PGN. every game is its own gzip member appended to the
+# current file, so a whole file streams through gzip.open() (or chess.pgn.read_game)
+# while the index can still seek straight to one game
+
+
+def archive_dir() -> str:
+    return os.getenv("CHESS_ARCHIVE_DIR", "archive")
+
+
+def rotate_bytes() -> int:
+    # once a file grows past this the next game starts a new one
+    return int(os.getenv("CHESS_ARCHIVE_ROTATE_BYTES", str(64 * 1024 * 1024)))
+
+
+def export_limit() -> int:
+    return int(os.getenv("CHESS_ARCHIVE_EXPORT_LIMIT", "500"))
+
+
+FILE_PREFIX = "games-"
+FILE_SUFFIX = ".pgn.gz"
+INDEX_NAME = "index.db"
+LOCK_NAME = "archive.lock"
+
+
+class Record:
+    __slots__ = (
+        "pgn",
+        "message_id",
+        "white_id",
+        "black_id",
+        "variant",
+        "result",
+        "finished_at",
+    )
+
+    def __init__(
+        self,
+        pgn: str,
+        *,
+        message_id: int,
+        white_id: int,
+        black_id: int,
+        variant: str,
+        result: str,
+        finished_at: float,
+    ) -> None:
+        self.pgn = pgn
+        self.message_id = message_id
+        self.white_id = white_id
+        self.black_id = black_id
+        self.variant = variant
+        self.result = result
+        self.finished_at = finished_at
+
+
+def archive_files(directory: str) -> list[str]:
+    # oldest first, the numbers are zero padded so they sort as strings
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        name
+        for name in names
+        if name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)
+    )
+
+
+def iter_games(directory: str) -> Iterator[str]:
+    # every archived game in order, one file and one game in memory at a time
+    for name in archive_files(directory):
+        with gzip.open(os.path.join(directory, name), "rt", encoding="utf-8") as f:
+            lines: list[str] = []
+            for line in f:
+                if line.startswith("[Event ") and len(lines) > 0:
+                    yield "".join(lines)
+                    lines = []
+                lines.append(line)
+            if len(lines) > 0:
+                yield "".join(lines)
+
+
+class PGNArchive:
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.queue: asyncio.Queue[Record] | None = None
+        self.writer: asyncio.Task | None = None
+        # the writer thread and exports share the index connection
+        self.lock = threading.Lock()
+        self.db: sqlite3.Connection | None = None
+        self.current: str | None = None
+
+    def submit(self, record: Record) -> None:
+        # never blocks the click, the writer task does the disk work
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        self.queue.put_nowait(record)
+        if self.writer is None or self.writer.done():
+            self.writer = asyncio.create_task(self.write_forever())
+
+    async def write_forever(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await asyncio.to_thread(self.write, batch)
+            except Exception as e:
+                lib.LOGGER.error(f"Could not archive {len(batch)} chess game(s): {e!r}")
+
+    def index(self) -> sqlite3.Connection:
+        if self.db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.db = sqlite3.connect(
+                os.path.join(self.directory, INDEX_NAME), check_same_thread=False
+            )
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS games (
+                    message_id INTEGER,
+                    white_id INTEGER,
+                    black_id INTEGER,
+                    variant TEXT,
+                    result TEXT,
+                    finished_at REAL,
+                    file TEXT,
+                    offset INTEGER,
+                    length INTEGER
+                )
+                """
+            )
+            for column in ("white_id", "black_id"):
+                self.db.execute(
+                    f"CREATE INDEX IF NOT EXISTS games_{column} "
+                    f"ON games ({column}, finished_at)"
+                )
+            self.db.commit()
+        return self.db
+
+    def current_file(self) -> str:
+        if self.current is None:
+            files = archive_files(self.directory)
+            if len(files) > 0:
+                self.current = files[-1]
+            else:
+                self.current = f"{FILE_PREFIX}00001{FILE_SUFFIX}"
+        path = os.path.join(self.directory, self.current)
+        if os.path.exists(path) and os.path.getsize(path) >= rotate_bytes():
+            number = int(self.current[len(FILE_PREFIX) : -len(FILE_SUFFIX)]) + 1
+            self.current = f"{FILE_PREFIX}{number:05d}{FILE_SUFFIX}"
+        return self.current
+
+    @contextlib.contextmanager
+    def write_lock(self):
+        # sharded workers (see launcher.py) append to the same files, an offset in
+        # the index is only right while one process at a time appends and inserts
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, LOCK_NAME), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def write(self, batch: list[Record]) -> None:
+        with self.write_lock():
+            # another worker may have rotated to a newer file since our last batch
+            self.current = None
+            db = self.index()
+            for record in batch:
+                name = self.current_file()
+                member = gzip.compress(record.pgn.encode("utf-8"))
+                with open(os.path.join(self.directory, name), "ab") as f:
+                    offset = f.seek(0, os.SEEK_END)
+                    f.write(member)
+                db.execute(
+                    "INSERT INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        record.message_id,
+                        record.white_id,
+                        record.black_id,
+                        record.variant,
+                        record.result,
+                        record.finished_at,
+                        name,
+                        offset,
+                        len(member),
+                    ),
+                )
+            db.commit()
+
+    def games_for(self, user_id: int, limit: int) -> list[str]:
+        # the user's newest games, returned oldest first
+        with self.lock:
+            rows = (
+                self.index()
+                .execute(
+                    "SELECT file, offset, length FROM games "
+                    "WHERE white_id = ? OR black_id = ? "
+                    "ORDER BY finished_at DESC LIMIT ?",
+                    (user_id, user_id, limit),
+                )
+                .fetchall()
+            )
+        games = []
+        handles = {}
+        try:
+            for name, offset, length in reversed(rows):
+                if name not in handles:
+                    handles[name] = open(os.path.join(self.directory, name), "rb")
+                handle = handles[name]
+                handle.seek(offset)
+                games.append(gzip.decompress(handle.read(length)).decode("utf-8"))
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return games
+
+
+if __name__ == "__main__":
+    # python archive.py [directory] > games.pgn
+    directory = sys.argv[1] if len(sys.argv) > 1 else archive_dir()
+    for game in iter_games(directory):
+        sys.stdout.write(game)
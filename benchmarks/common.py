@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import sys
+import timeit
+from typing import Callable
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+
+def measure(func: Callable[[], object], repeat: int = 5) -> float:
+    """Best time per call in seconds, timeit picks a loop count of at least 0.2s."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def format_time(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.2f} us"
+
+
+class Suite:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.cases: list[tuple[str, Callable[[], object]]] = []
+
+    def add(self, name: str, func: Callable[[], object]) -> None:
+        self.cases.append((name, func))
+
+    def baseline_path(self) -> str:
+        return os.path.join(BASELINE_DIR, f"{self.name}.json")
+
+    def load_baseline(self) -> dict[str, float]:
+        try:
+            with open(self.baseline_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save_baseline(self, results: dict[str, float]) -> None:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        baseline = self.load_baseline()
+        baseline.update(results)
+        with open(self.baseline_path(), "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    def main(self, argv: list[str] | None = None) -> int:
+        parser = argparse.ArgumentParser(description=f"{self.name} benchmarks")
+        parser.add_argument(
+            "--filter", default="", help="only run cases containing this"
+        )
+        parser.add_argument(
+            "--save", action="store_true", help="store the results as the new baseline"
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.10,
+            help="relative slowdown counted as a regression (default 0.10)",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        args = parser.parse_args(argv)
+
+        baseline = self.load_baseline()
+        results: dict[str, float] = {}
+        regressions = 0
+        width = max((len(name) for name, _ in self.cases), default=10) + 2
+        print(f"{'case':<{width}}{'time':>12}{'baseline':>12}{'change':>10}")
+        for name, func in self.cases:
+            if args.filter not in name:
+                continue
+            seconds = measure(func, repeat=args.repeat)
+            results[name] = seconds
+            line = f"{name:<{width}}{format_time(seconds):>12}"
+            previous = baseline.get(name)
+            if previous is not None:
+                change = seconds / previous - 1
+                line += f"{format_time(previous):>12}{change * 100:>+9.1f}%"
+                if change > args.tolerance:
+                    line += "  REGRESSION"
+                    regressions += 1
+                elif change < -args.tolerance:
+                    line += "  improved"
+            print(line, flush=True)
+
+        if args.save:
+            self.save_baseline(results)
+            print(f"Saved {len(results)} results to {self.baseline_path()}")
+        if regressions > 0:
+            print(f"{regressions} regression(s) over {args.tolerance:.0%}")
+            return 1
+        return 0
+
+
+def run(suite: Suite) -> None:
+    sys.exit(suite.main())
@@ -0,0 +1,189 @@
+import os
+import random
+import tempfile
+
+import chess
+import hikari
+
+import elo
+import games.chess as games_chess
+import lib
+import loadtest
+import zobrist
+from benchmarks.common import Suite, run
+from games.chess import ChessGame, valid_chess_variants
+from games.connectfour import ConnectFourGame
+from games.rockpaperscissors import Game as RockPaperScissorsGame
+from games.tictactoe import TicTacToeGame
+
+PLAYER_1 = hikari.Snowflake(100000000000000001)
+PLAYER_2 = hikari.Snowflake(100000000000000002)
+
+# plies (or pieces / rounds) played before measuring, short to long games
+GAME_LENGTHS = [0, 20, 80]
+
+
+def random_chess_game(variant: str, plies: int, seed: int = 0) -> ChessGame:
+    # play random legal moves the same way make_move does, gravity included
+    random.seed(seed)  # chess960 picks its start position with the module rng
+    rng = random.Random(seed)
+    game = ChessGame(PLAYER_1, PLAYER_2, variant=variant)
+    for _ in range(plies):
+        moves = game.get_moves()
+        if len(moves) == 0:
+            break
+        from_square = rng.choice(sorted(moves))
+        to_square = rng.choice(sorted(moves[from_square]))
+        game.selected_piece = from_square
+        promotion = chess.QUEEN if game.next_move_is_promotion() else None
+        game.selected_piece = None
+        game.push(
+            chess.Move(
+                chess.parse_square(from_square.lower()),
+                chess.parse_square(to_square.lower()),
+                promotion=promotion,
+            )
+        )
+        game.current_turn = PLAYER_2 if game.current_turn == PLAYER_1 else PLAYER_1
+    return game
+
+
+def random_connect_four_game(pieces: int, seed: int = 0) -> ConnectFourGame:
+    rng = random.Random(seed)
+    game = ConnectFourGame(PLAYER_1, PLAYER_2)
+    for _ in range(min(pieces, 42)):
+        columns = [c for c in range(7) if game.board[0][c] == " "]
+        col = rng.choice(columns)
+        for row in reversed(range(6)):
+            if game.board[row][col] == " ":
+                game.board[row][col] = "R" if game.current_turn == PLAYER_1 else "Y"
+                break
+        game.current_turn = PLAYER_2 if game.current_turn == PLAYER_1 else PLAYER_1
+    return game
+
+
+def random_tic_tac_toe_game(moves: int, seed: int = 0) -> TicTacToeGame:
+    rng = random.Random(seed)
+    game = TicTacToeGame(PLAYER_1, PLAYER_2)
+    cells = [(r, c) for r in range(3) for c in range(3)]
+    rng.shuffle(cells)
+    for i, (r, c) in enumerate(cells[: min(moves, 9)]):
+        game.board[r][c] = "X" if i % 2 == 0 else "O"
+    return game
+
+
+def random_rock_paper_scissors_game(
+    rounds: int, seed: int = 0
+) -> RockPaperScissorsGame:
+    rng = random.Random(seed)
+    game = RockPaperScissorsGame(PLAYER_1, PLAYER_2)
+    for i in range(rounds):
+        game.round_history.append((rng.randrange(3), rng.randrange(3), i + 1))
+    game.round_history = game.round_history[-10:]
+    return game
+
+
+def build_suite() -> Suite:
+    lib.set_application_emojis(loadtest.synthetic_emojis())
+    suite = Suite("engine")
+
+    for length in GAME_LENGTHS:
+        # the exact dict a chess header carries at this game length
+        header = random_chess_game("standard", length).to_header()
+        encoded = header[3:].splitlines()[0]
+        data = lib.deserialize(encoded)
+        suite.add(f"lib.serialize[{length}]", lambda data=data: lib.serialize(data))
+        suite.add(
+            f"lib.deserialize[{length}]",
+            lambda encoded=encoded: lib.deserialize(encoded),
+        )
+
+    for length in GAME_LENGTHS:
+        games = {
+            "chess": (ChessGame, random_chess_game("standard", length)),
+            "connectfour": (ConnectFourGame, random_connect_four_game(length)),
+            "tictactoe": (TicTacToeGame, random_tic_tac_toe_game(length)),
+            "rockpaperscissors": (
+                RockPaperScissorsGame,
+                random_rock_paper_scissors_game(length),
+            ),
+        }
+        for code, (cls, game) in games.items():
+            header = game.to_header()
+            suite.add(f"{code}.to_header[{length}]", game.to_header)
+            suite.add(
+                f"{code}.from_header[{length}]",
+                lambda cls=cls, header=header: cls.from_header(header),
+            )
+        # what undo or an export pays once per game, the whole log replayed
+        history = games["chess"][1].history
+        suite.add(
+            f"chess.history_replay[{length}]",
+            lambda history=history: (
+                games_chess._boards.clear(),
+                games_chess.MoveHistory(
+                    history.variant, history.start_fen, history.moves
+                ).board(),
+            ),
+        )
+
+    for variant in valid_chess_variants:
+        for length in [0, 20]:
+            game = random_chess_game(variant, length)
+            suite.add(f"chess.get_moves[{variant},{length}]", game.get_moves)
+            suite.add(f"chess.has_legal_move[{variant},{length}]", game.has_legal_move)
+            # one click's validation, compare with get_moves above (the old path)
+            moves = game.get_moves()
+            from_square = max(moves)
+            move = chess.Move.from_uci(
+                f"{from_square}{max(moves[from_square])}".lower()
+            )
+            suite.add(
+                f"chess.legal_move[{variant},{length}]",
+                lambda game=game, move=move: game.legal_move(move),
+            )
+            suite.add(f"chess.board_tiles[{variant},{length}]", game.board_tiles)
+            suite.add(f"chess.render_board[{variant},{length}]", game.render_board)
+            # a position's key from scratch, and from the one before it
+            after = game.board.copy()
+            games_chess.play(after, move, variant)
+            key = zobrist.chess_hash(game.board, variant)
+            suite.add(
+                f"zobrist.chess_hash[{variant},{length}]",
+                lambda after=after, variant=variant: zobrist.chess_hash(after, variant),
+            )
+            suite.add(
+                f"zobrist.chess_update[{variant},{length}]",
+                lambda key=key, game=game, after=after: zobrist.chess_update(
+                    key, zobrist.chess_snapshot(game.board), after
+                ),
+            )
+
+    for length in GAME_LENGTHS:
+        game = random_connect_four_game(length)
+        suite.add(
+            f"connectfour.get_all_winning_positions[{length}]",
+            game.get_all_winning_positions,
+        )
+        suite.add(f"connectfour.board_str[{length}]", game.board_str)
+        suite.add(
+            f"zobrist.connect_four_hash[{length}]",
+            lambda game=game: zobrist.connect_four_hash(game.board),
+        )
+        game = random_tic_tac_toe_game(length)
+        suite.add(
+            f"zobrist.tic_tac_toe_hash[{length}]",
+            lambda game=game: zobrist.tic_tac_toe_hash(game.board),
+        )
+
+    db_dir = tempfile.mkdtemp(prefix="quiggle-bench-")
+    handler = elo.EloHandler(
+        db=elo.init_db(os.path.join(db_dir, "elo_ratings.db")), game_name="bench"
+    )
+    outcome = lib.Win(winner_id=PLAYER_1, loser_id=PLAYER_2)
+    suite.add("elo.record_outcome", lambda: handler.record_outcome(outcome))
+    return suite
+
+
+if __name__ == "__main__":
+    run(build_suite())
@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+
+import hikari
+
+import httpbot
+import loadtest
+
+
+class HttpModeBot(httpbot.InteractionBot):
+    # drives clicks through rest_main.py's path: captured response, then a builder
+    def __init__(self, rest_latency: float = 0.0) -> None:
+        super().__init__(loadtest.FakeRest(rest_latency))
+
+    async def dispatch(self, event: hikari.InteractionCreateEvent) -> None:
+        response = await self.respond(event.interaction)
+        httpbot.build_response(response)
+        if response is not None:
+            response_type, kwargs = response
+            if response_type == hikari.ResponseType.MESSAGE_UPDATE:
+                self.rest.responses[event.interaction.id] = kwargs
+
+
+async def run_mode(bot, args: argparse.Namespace) -> float:
+    harness = loadtest.Harness(args.games.split(","), bot=bot, seed=args.seed)
+    elapsed = await harness.run(clicks=args.clicks, concurrency=args.concurrency)
+    print(harness.report(elapsed))
+    return sum(len(samples) for samples in harness.latencies.values()) / elapsed
+
+
+async def main(args: argparse.Namespace) -> None:
+    latency = args.rest_latency / 1000
+    print("gateway (GatewayBot listeners, REST response)")
+    gateway = await run_mode(loadtest.FakeBot(latency), args)
+    print()
+    print("http (RESTBot listener, response returned in the webhook reply)")
+    http = await run_mode(HttpModeBot(latency), args)
+    print()
+    print(f"http / gateway throughput: {http / gateway:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare click throughput of the gateway and HTTP entry points."
+    )
+    parser.add_argument("--games", default=",".join(loadtest.all_games))
+    parser.add_argument("--clicks", type=int, default=500, help="clicks per game")
+    parser.add_argument("--concurrency", type=int, default=4, help="tables per game")
+    parser.add_argument(
+        "--rest-latency",
+        type=float,
+        default=50.0,
+        help="simulated REST latency in ms, the HTTP mode skips it for the reply",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,53 @@
+import lib
+import loadtest
+import render
+from benchmarks.common import Suite, run
+from benchmarks.engine import (
+    GAME_LENGTHS,
+    random_chess_game,
+    random_connect_four_game,
+)
+from games.chess import valid_chess_variants
+
+# the emoji grid against the sprite atlas PNG for the same board. payload sizes
+# are printed up front since the image trades CPU time for a much shorter message
+
+
+def build_suite() -> Suite:
+    lib.set_application_emojis(loadtest.synthetic_emojis())
+    suite = Suite("image_boards")
+    if not render.available():
+        print("Pillow is not installed, only the emoji cases run")
+    else:
+        suite.add("render.atlas", lambda: render.Atlas(render.ASSET_DIR, 48))
+
+    boards = []
+    for variant in valid_chess_variants:
+        for length in [0, 20]:
+            game = random_chess_game(variant, length)
+            boards.append((f"chess[{variant},{length}]", game.board_tiles))
+    for length in GAME_LENGTHS:
+        game = random_connect_four_game(length)
+        boards.append((f"connectfour[{length}]", game.board_tiles))
+
+    # the cached cases hit lib.render_cache on every call after the first,
+    # the memory tier only for images since the disk tier is behind it
+    lib.render_cache.directory = ""
+    for name, tiles in boards:
+        emoji = lib.emoji_grid(tiles())
+        suite.add(f"emoji.{name}", lambda tiles=tiles: lib.emoji_grid(tiles()))
+        suite.add(
+            f"emoji_cached.{name}", lambda tiles=tiles: lib.tiles_to_emoji(tiles())
+        )
+        if render.available():
+            image = render.draw_png(tiles())
+            print(f"{name}: {len(emoji.encode())} B of emojis, {len(image)} B of PNG")
+            suite.add(f"image.{name}", lambda tiles=tiles: render.draw_png(tiles()))
+            suite.add(
+                f"image_cached.{name}", lambda tiles=tiles: render.board_png(tiles())
+            )
+    return suite
+
+
+if __name__ == "__main__":
+    run(build_suite())
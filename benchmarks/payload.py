@@ -0,0 +1,48 @@
+import lib
+import loadtest
+from benchmarks.engine import (
+    GAME_LENGTHS,
+    random_chess_game,
+    random_connect_four_game,
+)
+from games.chess import valid_chess_variants
+
+# bytes sent per board update, message content plus the board embed, with the
+# emojis referenced by their full names and by the short aliases lib uses
+
+
+def payload_bytes(game, emojis: dict[str, str]) -> int:
+    lib.application_emojis = emojis
+    board = lib.emoji_grid(game.board_tiles())
+    return len(game.content().encode("utf-8")) + len(board.encode("utf-8"))
+
+
+def main() -> None:
+    full = loadtest.synthetic_emojis()
+    short = lib.shorten_emojis(full)
+
+    games = []
+    for variant in valid_chess_variants:
+        for length in GAME_LENGTHS:
+            game = random_chess_game(variant, length)
+            games.append((f"chess[{variant},{length}]", game))
+    for length in GAME_LENGTHS:
+        games.append((f"connectfour[{length}]", random_connect_four_game(length)))
+
+    width = max(len(name) for name, _ in games) + 2
+    print(f"{'case':<{width}}{'full names':>12}{'aliases':>12}{'change':>10}")
+    total_full = total_short = 0
+    for name, game in games:
+        before = payload_bytes(game, full)
+        after = payload_bytes(game, short)
+        total_full += before
+        total_short += after
+        change = after / before - 1
+        print(f"{name:<{width}}{before:>10} B{after:>10} B{change * 100:>+9.1f}%")
+    change = total_short / total_full - 1
+    total = f"{total_full:>10} B{total_short:>10} B"
+    print(f"{'total':<{width}}{total}{change * 100:>+9.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Iterator
+
+import chess
+import hikari
+
+from games.chess import ChessGame, valid_chess_variants
+
+# counts --record took for the variants without published numbers, checked in so
+# every run compares against them
+COUNTS_PATH = os.path.join(os.path.dirname(__file__), "perft_counts.json")
+
+# Scharnagl 518 is the standard back rank, so chess960 has known counts to check
+CHESS960_POSITION = 518
+
+# published perft numbers for the standard start position
+KNOWN_COUNTS: dict[str, dict[int, int]] = {
+    "standard": {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609},
+    "chess960": {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609},
+}
+
+PROMOTIONS = (chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT)
+
+
+def start_game(variant: str) -> ChessGame:
+    game = ChessGame(hikari.Snowflake(1), hikari.Snowflake(2), variant=variant)
+    if variant == "chess960":
+        # rebuilt from its FEN, exactly like every position after the first click
+        start = chess.Board.from_chess960_pos(CHESS960_POSITION)
+        game.board = chess.Board(fen=start.fen())
+    return game
+
+
+def variant_moves(game: ChessGame) -> Iterator[chess.Move]:
+    # iter_moves() collapses promotions into one square pair, expand them back out
+    for from_square, to_square in game.iter_moves():
+        piece = game.board.piece_at(from_square)
+        if piece.piece_type == chess.PAWN and chess.square_rank(to_square) in (0, 7):
+            for promotion in PROMOTIONS:
+                yield chess.Move(from_square, to_square, promotion=promotion)
+        else:
+            yield chess.Move(from_square, to_square)
+
+
+def perft(game: ChessGame, depth: int) -> int:
+    if depth == 0:
+        return 1
+    if depth == 1:
+        return sum(1 for _ in variant_moves(game))
+    nodes = 0
+    # materialized, the generator reads the board that the loop below pushes to
+    for move in list(variant_moves(game)):
+        game.board.push(move)
+        if game.variant == "gravitychess":
+            game.apply_gravity()
+        nodes += perft(game, depth - 1)
+        # pop restores the saved pre-move bitboards, gravity included
+        game.board.pop()
+    return nodes
+
+
+def load_counts() -> dict[str, dict[int, int]]:
+    counts = {variant: dict(depths) for variant, depths in KNOWN_COUNTS.items()}
+    try:
+        with open(COUNTS_PATH, encoding="utf-8") as f:
+            recorded = json.load(f)
+    except FileNotFoundError:
+        recorded = {}
+    for variant, depths in recorded.items():
+        for depth, nodes in depths.items():
+            counts.setdefault(variant, {}).setdefault(int(depth), nodes)
+    return counts
+
+
+def record_counts(results: dict[str, dict[int, int]]) -> None:
+    try:
+        with open(COUNTS_PATH, encoding="utf-8") as f:
+            recorded = json.load(f)
+    except FileNotFoundError:
+        recorded = {}
+    for variant, depths in results.items():
+        if variant in KNOWN_COUNTS:
+            continue
+        for depth, nodes in depths.items():
+            recorded.setdefault(variant, {})[str(depth)] = nodes
+    with open(COUNTS_PATH, "w", encoding="utf-8") as f:
+        json.dump(recorded, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Count move-tree nodes per chess variant."
+    )
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument(
+        "--variant", default="all", help="a key of valid_chess_variants, or all"
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="store the counts of variants without published numbers",
+    )
+    args = parser.parse_args(argv)
+
+    variants = list(valid_chess_variants) if args.variant == "all" else [args.variant]
+    known = load_counts()
+    results: dict[str, dict[int, int]] = {}
+    mismatches = 0
+    print(f"{'variant':<14}{'depth':>6}{'nodes':>12}{'seconds':>10}{'nodes/s':>12}")
+    for variant in variants:
+        game = start_game(variant)
+        for depth in range(1, args.depth + 1):
+            start = time.perf_counter()
+            nodes = perft(game, depth)
+            elapsed = time.perf_counter() - start
+            results.setdefault(variant, {})[depth] = nodes
+            line = (
+                f"{variant:<14}{depth:>6}{nodes:>12}{elapsed:>10.3f}"
+                f"{nodes / elapsed if elapsed > 0 else 0:>12.0f}"
+            )
+            expected = known.get(variant, {}).get(depth)
+            if expected is None:
+                line += "  (no known count)"
+            elif expected != nodes:
+                line += f"  MISMATCH, expected {expected}"
+                mismatches += 1
+            else:
+                line += "  ok"
+            print(line, flush=True)
+
+    if args.record:
+        record_counts(results)
+        print(f"Recorded counts to {COUNTS_PATH}")
+    if mismatches > 0:
+        print(f"{mismatches} count(s) differ from the known-good table")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import argparse
+import importlib
+import json
+import os
+import sqlite3
+import types
+
+import hikari
+import lightbulb
+
+import elo
+import lib
+
+# every command the games/ modules register, written down so that --lazy can put
+# them in front of discord without importing a single game. a game module is only
+# imported when one of its commands is used or one of its messages is clicked.
+# run `python command_manifest.py` after changing a command, tests/ checks it.
+
+MANIFEST_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "command_manifest.json"
+)
+
+COMMAND_CLASSES = {
+    hikari.CommandType.SLASH: lightbulb.SlashCommand,
+    hikari.CommandType.USER: lightbulb.UserCommand,
+    hikari.CommandType.MESSAGE: lightbulb.MessageCommand,
+}
+
+# the only option kinds the games use so far
+OPTION_FACTORIES = {
+    hikari.OptionType.USER: lightbulb.user,
+    hikari.OptionType.STRING: lightbulb.string,
+}
+
+
+def game_modules() -> list[str]:
+    return sorted(
+        filename[:-3]
+        for filename in os.listdir(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "games")
+        )
+        if filename.endswith(".py") and not filename.startswith("__")
+    )
+
+
+def describe(command: type) -> dict:
+    data = command._command_data
+    options = []
+    for option in data.options.values():
+        described = {
+            "type": int(option.type),
+            "name": option.name,
+            "description": option.description,
+        }
+        if option.default is not hikari.UNDEFINED:
+            described["default"] = option.default
+        if option.choices is not hikari.UNDEFINED:
+            described["choices"] = [
+                [choice.name, choice.value] for choice in option.choices
+            ]
+        options.append(described)
+    return {
+        "type": int(data.type),
+        "name": data.name,
+        "description": data.description,
+        "options": options,
+    }
+
+
+class CommandCollector:
+    # stands in for lightbulb.Client while a game's setup() runs
+    def __init__(self) -> None:
+        self.commands: list[type] = []
+
+    def register(self, *args, **kwargs):
+        def decorator(command):
+            self.commands.append(command)
+            return command
+
+        return decorator
+
+
+class ListenerCollector:
+    # stands in for the bot while the manifest is generated
+    def listen(self, *args, **kwargs):
+        def decorator(callback):
+            return callback
+
+        return decorator
+
+
+def generate() -> dict:
+    db = sqlite3.connect(":memory:")
+    manifest = {}
+    for game_code in game_modules():
+        module = importlib.import_module(f"games.{game_code}")
+        collector = CommandCollector()
+        module.setup(
+            ListenerCollector(),
+            collector,
+            elo.EloHandler(db=db, game_name=game_code),
+        )
+        manifest[game_code] = {
+            "game_name": module.game_name() if hasattr(module, "game_name") else None,
+            "commands": [describe(command) for command in collector.commands],
+        }
+    return manifest
+
+
+def load() -> dict:
+    with open(MANIFEST_PATH, "r") as f:
+        return json.load(f)
+
+
+def build_option(spec: dict):
+    kwargs = {}
+    if "default" in spec:
+        kwargs["default"] = spec["default"]
+    if "choices" in spec:
+        kwargs["choices"] = [
+            lightbulb.Choice(name, value) for name, value in spec["choices"]
+        ]
+    return OPTION_FACTORIES[hikari.OptionType(spec["type"])](
+        spec["name"], spec["description"], **kwargs
+    )
+
+
+class LazyGames:
+    # registers the manifest's commands up front and imports a game module on
+    # the first interaction that needs it
+    def __init__(
+        self,
+        bot: hikari.GatewayBot,
+        client: lightbulb.Client,
+        db: elo.Connection,
+        manifest: dict,
+    ) -> None:
+        self.bot = bot
+        self.db = db
+        self.manifest = manifest
+        # game code -> (command type, name) -> the game's own command class
+        self.commands: dict[str, dict[tuple[int, str], type]] = {}
+        # game code -> the game's InteractionCreateEvent listeners
+        self.listeners: dict[str, list] = {}
+        # the game's own command classes only get their option names once built
+        self.built: set[type] = set()
+        for game_code, entry in manifest.items():
+            if entry["game_name"] is not None:
+                lib.set_game_name(game_code=game_code, name=entry["game_name"])
+            for spec in entry["commands"]:
+                client.register()(self.proxy(game_code, spec))
+        bot.subscribe(hikari.InteractionCreateEvent, self.on_interaction)
+
+    def load(self, game_code: str) -> None:
+        if game_code in self.listeners:
+            return
+        with lib.startup_phase(f"load games.{game_code}"):
+            module = importlib.import_module(f"games.{game_code}")
+            before = set(self.bot.get_listeners(hikari.InteractionCreateEvent))
+            collector = CommandCollector()
+            module.setup(
+                self.bot, collector, elo.EloHandler(db=self.db, game_name=game_code)
+            )
+            # the game's listener only ever sees its own messages, routed by
+            # on_interaction, so it comes off the bot again
+            listeners = []
+            for callback in self.bot.get_listeners(hikari.InteractionCreateEvent):
+                if callback not in before:
+                    self.bot.unsubscribe(hikari.InteractionCreateEvent, callback)
+                    listeners.append(callback)
+        self.commands[game_code] = {
+            (int(command._command_data.type), command._command_data.name): command
+            for command in collector.commands
+        }
+        self.listeners[game_code] = listeners
+        lib.LOGGER.info(f"Loaded game module: games.{game_code}")
+
+    async def on_interaction(self, event: hikari.InteractionCreateEvent) -> None:
+        message = getattr(event.interaction, "message", None)
+        if message is None:
+            return
+        game_code = lib.game_code(lib.header_name(message.content or ""))
+        if game_code not in self.manifest:
+            return
+        # loading never awaits, every click after the first finds the game loaded
+        self.load(game_code)
+        for callback in self.listeners[game_code]:
+            await callback(event)
+
+    async def command(self, game_code: str, spec: dict, ctx: lightbulb.Context):
+        self.load(game_code)
+        command_class = self.commands[game_code][(spec["type"], spec["name"])]
+        if command_class not in self.built:
+            # lightbulb fills in the option names while building, which a
+            # command that never synced has not had happen yet
+            await command_class.as_command_builder(
+                ctx.client.default_locale, ctx.client.localization_provider
+            )
+            self.built.add(command_class)
+        command = command_class()
+        command._set_context(ctx)
+        await command._resolve_options()
+        return command
+
+    def proxy(self, game_code: str, spec: dict) -> type:
+        games = self
+
+        async def invoke(self, ctx: lightbulb.Context) -> None:
+            command = await games.command(game_code, spec, ctx)
+            await getattr(command, command._command_data.invoke_method)(ctx)
+
+        attrs = {option["name"]: build_option(option) for option in spec["options"]}
+        attrs["invoke"] = lightbulb.invoke(invoke)
+        return types.new_class(
+            f"Lazy{game_code.title()}Command",
+            (COMMAND_CLASSES[hikari.CommandType(spec["type"])],),
+            {"name": spec["name"], "description": spec["description"]},
+            lambda namespace: namespace.update(attrs),
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write the commands of every games/ module to command_manifest.json."
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="fail if the manifest is out of date"
+    )
+    args = parser.parse_args()
+    manifest = generate()
+    if args.check:
+        if manifest != load():
+            raise SystemExit("command_manifest.json is out of date")
+    else:
+        with open(MANIFEST_PATH, "w") as f:
+            json.dump(manifest, f, indent=4)
+            f.write("\n")
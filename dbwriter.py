@@ -0,0 +1,185 @@
+import argparse
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+LOGGER = logging.getLogger("quiggle-games-pro")
+
+
+def db_address() -> str | None:
+    # set by launcher.py, every worker then shares the writer's elo_ratings.db
+    return os.getenv("ELO_DB_ADDRESS")
+
+
+def db_authkey() -> bytes:
+    return os.getenv("ELO_DB_AUTHKEY", "quiggle-games-pro").encode()
+
+
+def parse_address(address: str) -> str | tuple[str, int]:
+    # "host:port" listens on TCP, anything else is a unix socket path
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and not address.startswith("/"):
+        return (host, int(port))
+    return address
+
+
+class RemoteCursor:
+    def __init__(self, connection: "RemoteConnection") -> None:
+        self.connection = connection
+        self.rows: list[tuple] = []
+
+    def execute(self, sql: str, parameters: tuple = ()) -> "RemoteCursor":
+        # the writer runs the statement and sends every row back in one message
+        self.rows = self.connection.request("execute", sql, tuple(parameters))
+        return self
+
+    def fetchone(self) -> tuple | None:
+        if len(self.rows) == 0:
+            return None
+        return self.rows.pop(0)
+
+    def fetchall(self) -> list[tuple]:
+        rows, self.rows = self.rows, []
+        return rows
+
+
+class RemoteConnection:
+    # the part of sqlite3.Connection that EloHandler uses, forwarded to the writer
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self.lock = threading.Lock()
+        self.conn = Client(parse_address(address), authkey=db_authkey())
+        self.in_transaction = False
+
+    def request(self, op: str, *args):
+        with self.lock:
+            self.conn.send((op, args))
+            status, value = self.conn.recv()
+        if status == "error":
+            name, message = value
+            raise getattr(sqlite3, name, sqlite3.Error)(message)
+        return value
+
+    def cursor(self) -> RemoteCursor:
+        return RemoteCursor(self)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # the writer runs nobody else's statements until this commits, callers
+        # hold elo.db_lock so only one thread per worker gets here at a time
+        if self.in_transaction:
+            yield
+            return
+        self.request("begin")
+        self.in_transaction = True
+        try:
+            yield
+        except BaseException:
+            self.in_transaction = False
+            self.request("rollback")
+            raise
+        self.in_transaction = False
+        self.request("commit")
+
+    def commit(self) -> None:
+        if self.in_transaction:
+            # committed with the rest of the transaction
+            return
+        self.request("commit")
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def run_statement(db: sqlite3.Connection, op: str, args: tuple):
+    if op == "execute":
+        return db.execute(*args).fetchall()
+    elif op == "commit":
+        db.commit()
+        return None
+    raise sqlite3.ProgrammingError(f"Unknown operation: {op}")
+
+
+def handle_client(conn, db: sqlite3.Connection, lock: threading.Lock) -> None:
+    # a client's transaction holds the lock from "begin" to its "commit" or
+    # "rollback", anything else runs and commits on its own
+    in_transaction = False
+    with conn:
+        try:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    if op == "begin":
+                        if in_transaction:
+                            raise sqlite3.ProgrammingError("Transaction already open")
+                        lock.acquire()
+                        try:
+                            db.execute("BEGIN IMMEDIATE")
+                        except BaseException:
+                            lock.release()
+                            raise
+                        in_transaction = True
+                        value = None
+                    elif op in ("commit", "rollback") and in_transaction:
+                        in_transaction = False
+                        try:
+                            getattr(db, op)()
+                        finally:
+                            lock.release()
+                        value = None
+                    elif op == "rollback":
+                        value = None
+                    elif in_transaction:
+                        value = run_statement(db, op, args)
+                    else:
+                        with lock:
+                            value = run_statement(db, op, args)
+                            if db.in_transaction:
+                                db.commit()
+                except sqlite3.Error as e:
+                    conn.send(("error", (type(e).__name__, str(e))))
+                    continue
+                conn.send(("ok", value))
+        finally:
+            if in_transaction:
+                # the client went away halfway, none of it happened
+                db.rollback()
+                lock.release()
+
+
+def serve(address: str, db_path: str) -> None:
+    db = sqlite3.connect(db_path, check_same_thread=False)
+    lock = threading.Lock()
+    parsed = parse_address(address)
+    if isinstance(parsed, str) and os.path.exists(parsed):
+        os.remove(parsed)
+    with Listener(parsed, authkey=db_authkey()) as listener:
+        LOGGER.info(f"Writing {db_path} for clients on {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, OSError) as e:
+                # a bad handshake only drops that client
+                LOGGER.warning(f"Rejected database client: {e}")
+                continue
+            threading.Thread(
+                target=handle_client, args=(conn, db, lock), daemon=True
+            ).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Own elo_ratings.db and run queries sent by the bot workers."
+    )
+    parser.add_argument("--address", default=db_address() or "127.0.0.1:9109")
+    parser.add_argument("--db", default="elo_ratings.db")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve(args.address, args.db)
@@ -1,11 +1,41 @@
 from sqlite3 import Connection, Cursor
 import sqlite3
 from typing import Optional
+import functools
+import threading
+import dbwriter
 import lib
 import hikari
+import metrics
 
 default_elo = 1200
 
+# game logic runs in worker threads (see lib.offload), so each read-modify-write
+# sequence on the shared connection holds this
+db_lock = threading.RLock()
+
+
+def locked(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with db_lock:
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def transactional(func):
+    # through launcher.py's writer every statement is a separate request, the
+    # writer keeps a read-modify-write together as one transaction
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if isinstance(self.db, dbwriter.RemoteConnection):
+            with self.db.transaction():
+                return func(self, *args, **kwargs)
+        return func(self, *args, **kwargs)
+
+    return wrapper
+
 
 class Change:
     def __init__(
@@ -39,11 +69,21 @@ class EloHandler:
     def __init__(self, db: Connection, game_name: str) -> None:
         self.db = db
         self.game_name = game_name
-        init_table(db, game_name)
+        # created on first query instead, one less commit per game at startup
+        self.table_ready = False
 
     def get_cursor(self) -> Cursor:
+        if not self.table_ready:
+            init_table(self.db, self.game_name)
+            self.table_ready = True
         return self.db.cursor()
 
+    def commit(self) -> None:
+        with metrics.sqlite_commit_seconds.time():
+            self.db.commit()
+
+    @lib.traced("store_user_data")
+    @locked
     def store_user_data(self, user_id: int, username: str, avatar_url: str) -> None:
         cursor = self.get_cursor()
         cursor.execute(
@@ -53,7 +93,7 @@ class EloHandler:
             """,
             (user_id, username, str(avatar_url)),
         )
-        self.db.commit()
+        self.commit()
 
     def _get_elo(self, user_id: int) -> Optional[int]:
         cursor = self.get_cursor()
@@ -69,8 +109,10 @@ class EloHandler:
             f"INSERT OR REPLACE INTO {self.game_name} (id, elo) VALUES (?, ?)",
             (user_id, elo),
         )
-        self.db.commit()
+        self.commit()
 
+    @locked
+    @transactional
     def get_elo(self, user_id: int) -> int:
         elo = self._get_elo(user_id)
         if elo is None:
@@ -78,6 +120,7 @@ class EloHandler:
             return default_elo
         return elo
 
+    @locked
     def get_all_games(self) -> list[tuple[int, int]]:
         if self.game_name == "elo":
             # get all table names in the database except for elo and sqlite internal tables
@@ -95,6 +138,7 @@ class EloHandler:
         else:
             return []
 
+    @locked
     def get_elo_from_table(self, user_id: int, table_name: str) -> Optional[int]:
         if self.game_name == "elo":
             cursor = self.get_cursor()
@@ -106,6 +150,9 @@ class EloHandler:
         else:
             return None
 
+    @lib.traced("record_outcome")
+    @locked
+    @transactional
     def record_outcome(self, result: lib.Win | lib.Tie | lib.Forfeit) -> Change:
         if isinstance(result, lib.Win):
             winner_elo = self.get_elo(result.winner_id)
@@ -181,7 +228,11 @@ class EloHandler:
 
 
 def init_db(db_path: str = "elo_ratings.db") -> Connection:
-    conn = sqlite3.connect(db_path)
+    address = dbwriter.db_address()
+    if address is not None:
+        # sharded workers (see launcher.py) send every query to the one writer process
+        return dbwriter.RemoteConnection(address)
+    conn = sqlite3.connect(db_path, check_same_thread=False)
     return conn
 
 
@@ -204,7 +255,8 @@ def init_table(db: Connection, game_name: str) -> None:
         )
         """
     )
-    db.commit()
+    with metrics.sqlite_commit_seconds.time():
+        db.commit()
 
 
 def result_embeds(
@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import os
+import sys
+
+import dotenv
+import hikari
+
+import lib
+
+# uploads assets/ as application emojis, touching only what changed since the last
+# run. emoji_manifest.json remembers the hash and id of everything this uploaded,
+# the name -> emoji map startup loads is written to lib.emoji_cache_path()
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+# an application id for the stub server, any snowflake works
+STUB_APPLICATION_ID = 1000000000000000000
+
+
+def manifest_path() -> str:
+    return os.getenv("EMOJI_MANIFEST_PATH", "emoji_manifest.json")
+
+
+def hash_assets(directory: str) -> dict[str, tuple[str, str]]:
+    # emoji name -> (path, sha256), the name is the file name without .png
+    assets = {}
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
+            if not filename.endswith(".png"):
+                continue
+            path = os.path.join(root, filename)
+            with open(path, "rb") as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            name = filename[:-4]
+            if name in assets:
+                if assets[name][1] != digest:
+                    lib.LOGGER.warning(f"{path} differs from {assets[name][0]}")
+                continue
+            assets[name] = (path, digest)
+    return assets
+
+
+def load_manifest() -> dict[str, dict]:
+    try:
+        with open(manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(manifest: dict[str, dict]) -> None:
+    path = manifest_path()
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(f"{path}.tmp", path)
+
+
+class Plan:
+    def __init__(self) -> None:
+        self.upload: list[str] = []
+        self.replace: list[str] = []
+        self.delete: list[str] = []
+        # on the application but not in the manifest yet, assumed to be current
+        self.adopt: list[str] = []
+
+
+def plan_sync(
+    assets: dict[str, tuple[str, str]],
+    manifest: dict[str, dict],
+    remote: dict[str, hikari.KnownCustomEmoji],
+    *,
+    force: bool = False,
+) -> Plan:
+    plan = Plan()
+    for name, (_, digest) in assets.items():
+        emoji = remote.get(name)
+        entry = manifest.get(name)
+        if emoji is None:
+            plan.upload.append(name)
+        elif entry is None:
+            # uploaded by hand or before the manifest existed
+            if force:
+                plan.replace.append(name)
+            else:
+                plan.adopt.append(name)
+        elif entry["hash"] != digest or entry["id"] != int(emoji.id):
+            plan.replace.append(name)
+    for name in remote:
+        # only what we uploaded ourselves, hand uploads like "blank" stay
+        if name not in assets and name in manifest:
+            plan.delete.append(name)
+    return plan
+
+
+async def sync(
+    rest: hikari.api.RESTClient,
+    application_id: int,
+    *,
+    dry_run: bool = False,
+    force: bool = False,
+) -> dict[str, str]:
+    assets = hash_assets(ASSET_DIR)
+    manifest = load_manifest()
+    remote = {
+        str(emoji.name): emoji
+        for emoji in await rest.fetch_application_emojis(application_id)
+    }
+    plan = plan_sync(assets, manifest, remote, force=force)
+    lib.LOGGER.info(
+        f"{len(assets)} assets, {len(remote)} emojis: {len(plan.upload)} to upload, "
+        f"{len(plan.replace)} to replace, {len(plan.delete)} to delete, "
+        f"{len(plan.adopt)} adopted"
+    )
+    if dry_run:
+        for action in ("upload", "replace", "delete", "adopt"):
+            for name in getattr(plan, action):
+                print(f"{action:<8}{name}")
+        return {}
+
+    for name in plan.adopt:
+        manifest[name] = {"hash": assets[name][1], "id": int(remote[name].id)}
+    for name in plan.delete:
+        await rest.delete_application_emoji(application_id, remote.pop(name))
+        manifest.pop(name, None)
+        lib.LOGGER.info(f"Deleted emoji {name}")
+    for name in plan.replace:
+        # an emoji's image can't be edited, it has to be uploaded again
+        await rest.delete_application_emoji(application_id, remote.pop(name))
+    for name in plan.upload + plan.replace:
+        path, digest = assets[name]
+        emoji = await rest.create_application_emoji(
+            application_id, name, hikari.File(path)
+        )
+        remote[name] = emoji
+        manifest[name] = {"hash": digest, "id": int(emoji.id)}
+        lib.LOGGER.info(f"Uploaded emoji {name}")
+        # saved as we go, an interrupted sync picks up where it stopped
+        save_manifest(manifest)
+    save_manifest(manifest)
+
+    emojis = {name: f"<:{name}:{emoji.id}>" for name, emoji in remote.items()}
+    lib.save_emoji_cache(emojis)
+    lib.LOGGER.info(f"Wrote {len(emojis)} emojis to {lib.emoji_cache_path()}")
+    return emojis
+
+
+class StubDiscord:
+    # the four emoji routes of the Discord API, state kept in a JSON file so
+    # repeated syncs against it are incremental like the real thing
+    def __init__(self, state_path: str) -> None:
+        self.state_path = state_path
+        try:
+            with open(state_path, encoding="utf-8") as f:
+                self.emojis: dict[str, dict] = json.load(f)
+        except FileNotFoundError:
+            self.emojis = {}
+        self.ids = itertools.count(max(map(int, self.emojis), default=0) + 1)
+        self.runner = None
+
+    def save(self) -> None:
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump(self.emojis, f, indent=2)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        # aiohttp comes with hikari
+        from aiohttp import web
+
+        async def list_emojis(request: web.Request) -> web.Response:
+            return web.json_response({"items": list(self.emojis.values())})
+
+        async def create_emoji(request: web.Request) -> web.Response:
+            body = await request.json()
+            # a data URI, decoded only to check it is one
+            base64.b64decode(body["image"].split(",", 1)[1])
+            emoji_id = str(STUB_APPLICATION_ID + next(self.ids))
+            self.emojis[emoji_id] = {
+                "id": emoji_id,
+                "name": body["name"],
+                "roles": [],
+                "require_colons": True,
+                "managed": False,
+                "animated": False,
+                "available": True,
+            }
+            self.save()
+            return web.json_response(self.emojis[emoji_id], status=201)
+
+        async def delete_emoji(request: web.Request) -> web.Response:
+            if self.emojis.pop(request.match_info["emoji"], None) is None:
+                return web.json_response(
+                    {"code": 10014, "message": "Unknown Emoji"}, status=404
+                )
+            self.save()
+            return web.Response(status=204)
+
+        app = web.Application()
+        base = "/api/v10/applications/{application}/emojis"
+        app.router.add_get(base, list_emojis)
+        app.router.add_post(base, create_emoji)
+        app.router.add_delete(base + "/{emoji}", delete_emoji)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        return f"http://{host}:{port}/api/v10"
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+async def main(args: argparse.Namespace) -> None:
+    stub = None
+    if args.stub:
+        stub = StubDiscord(args.stub_state)
+        url = await stub.start()
+        token = "stub"
+        application_id = STUB_APPLICATION_ID
+    else:
+        url = None
+        token = os.getenv("PRODUCTION_TOKEN" if args.prod else "DEVELOPMENT_TOKEN")
+        if token is None:
+            raise ValueError("Bot token not found in environment variables.")
+        application_id = args.application_id
+    rest_app = hikari.RESTApp(url=url)
+    await rest_app.start()
+    try:
+        async with rest_app.acquire(token, hikari.TokenType.BOT) as rest:
+            if application_id is None:
+                application_id = (await rest.fetch_application()).id
+            await sync(rest, application_id, dry_run=args.dry_run, force=args.force)
+    finally:
+        await rest_app.close()
+        if stub is not None:
+            await stub.stop()
+
+
+if __name__ == "__main__":
+    dotenv.load_dotenv()
+    parser = argparse.ArgumentParser(
+        description="Upload changed assets/ tiles as application emojis."
+    )
+    parser.add_argument("--prod", action="store_true", help="use PRODUCTION_TOKEN")
+    parser.add_argument("--application-id", type=int, default=None)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="print the changes without making them"
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="replace emojis the manifest doesn't know instead of adopting them",
+    )
+    parser.add_argument(
+        "--stub", action="store_true", help="sync against a local stub API instead"
+    )
+    parser.add_argument("--stub-state", default="emoji_stub.json")
+    args = parser.parse_args()
+    lib.LOGGER.setLevel("INFO")
+    asyncio.run(main(args))
+    sys.exit(0)
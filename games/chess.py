@@ -1,9 +1,24 @@
+from __future__ import annotations
+
+import collections
+import functools
+import os
+import threading
+
 import lightbulb
 import hikari
 import lib
 import random
-import chess
 import elo
+import archive
+import render
+import textwrap
+import time
+import zobrist
+from typing import Iterator
+
+# python-chess is the heaviest game import, with --lazy it loads on first use
+chess = lib.lazy_import("chess")
 
 
 def game_name(command_name: bool = False) -> str:
@@ -22,10 +37,15 @@ valid_chess_variants = {
     "crossderby": "Cross Derby",
 }
 
+# the Variant tag other PGN tools know, the rest use the display name
+pgn_variants = {"chess960": "Chess960"}
+
 
 def setup(
     bot: hikari.GatewayBot, client: lightbulb.Client, elo_handler: elo.EloHandler
 ) -> None:
+    pgn_archive = archive.PGNArchive(archive.archive_dir())
+
     @client.register()
     class ChessCommand(
         lightbulb.MessageCommand,
@@ -134,6 +154,35 @@ def setup(
                 components=invite.components(bot),
             )
 
+    @client.register()
+    class ChessExportCommand(
+        lightbulb.SlashCommand,
+        name="chessexport",
+        description="Download finished games of Chess as PGN.",
+    ):
+        player = lightbulb.user(
+            "player",
+            "The player whose games to export, yourself if left out.",
+            default=None,
+        )
+
+        @lightbulb.invoke
+        async def invoke(self, ctx: lightbulb.Context) -> None:
+            user = self.player or ctx.user
+            games = await lib.offload(
+                pgn_archive.games_for, user.id, archive.export_limit()
+            )
+            if len(games) == 0:
+                await ctx.respond("No finished games found.", ephemeral=True)
+                return
+            await ctx.respond(
+                f"{len(games)} game(s) of {lib.get_username(user)}.",
+                attachment=hikari.Bytes(
+                    "".join(games).encode("utf-8"), f"chess-{user.id}.pgn"
+                ),
+                ephemeral=True,
+            )
+
     @bot.listen(hikari.InteractionCreateEvent)
     async def on_interaction(event: hikari.InteractionCreateEvent) -> None:
         if not hasattr(event.interaction, "message"):
@@ -145,18 +194,34 @@ def setup(
         game_name = lib.header_name(content)
         if game_name != "Chess":
             return
+        with lib.trace("chess", event.interaction.custom_id):
+            async with lib.deferral(bot, event.interaction, "chess"):
+                async with lib.message_locks.hold(message.id):
+                    await handle_interaction(event, content)
+
+    async def handle_interaction(
+        event: hikari.InteractionCreateEvent, content: str
+    ) -> None:
         invite = lib.GameInvite.from_header(content)
         if invite is None:
 
-            chess_game = ChessGame.from_header(content)
+            with lib.span("decode"):
+                chess_game = ChessGame.from_header(content)
             if chess_game is None:
                 return
+            if await lib.reject_stale(bot, event.interaction, chess_game.version):
+                return
             custom_id = event.interaction.custom_id
             if custom_id.startswith("chess_"):
                 remainder = custom_id[len("chess_") :]
-                response = chess_game.make_move(
-                    event.interaction.user.id, remainder, event.interaction, elo_handler
-                )
+                with lib.span("logic"):
+                    response = await lib.offload(
+                        chess_game.make_move,
+                        event.interaction.user.id,
+                        remainder,
+                        event.interaction,
+                        elo_handler,
+                    )
                 # if type(resp) == bool and resp:
                 #     outcome = chess_game.check_outcome()
                 #     if outcome is None:
@@ -202,43 +267,50 @@ def setup(
                 #         )
                 #         return
                 if isinstance(response, bool) and response:
-                    await bot.rest.create_interaction_response(
-                        interaction=event.interaction,
-                        response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                        content=chess_game.content(),
-                        embeds=chess_game.embeds(),
-                        components=chess_game.components(bot),
-                        token=event.interaction.token,
+                    await lib.update_message(
+                        bot,
+                        event.interaction,
+                        render=lambda: dict(
+                            content=chess_game.content(),
+                            embeds=chess_game.embeds(),
+                            components=chess_game.components(bot),
+                        ),
                     )
                     return
                 elif isinstance(response, elo.Change):
-                    await bot.rest.create_interaction_response(
-                        interaction=event.interaction,
-                        response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                        content=f"{chess_game.to_empty_header()}",
-                        embeds=elo.result_embeds(response) + chess_game.embeds(),
-                        components=[],
-                        token=event.interaction.token,
+                    await lib.update_message(
+                        bot,
+                        event.interaction,
+                        render=lambda: dict(
+                            content=f"{chess_game.to_replay_header()}",
+                            embeds=elo.result_embeds(response) + chess_game.embeds(),
+                            components=[],
+                        ),
+                    )
+                    pgn_archive.submit(
+                        chess_game.archive_record(
+                            response, event.interaction.message.id
+                        )
                     )
                     return
                 elif isinstance(response, lib.MaybeEphemeral):
-                    await bot.rest.create_interaction_response(
+                    await lib.send_message(
+                        bot,
                         event.interaction,
-                        event.interaction.token,
-                        hikari.ResponseType.MESSAGE_CREATE,
                         response.message,
-                        flags=hikari.MessageFlag.EPHEMERAL if response.ephemeral else 0,
+                        ephemeral=response.ephemeral,
                     )
                 elif isinstance(response, lib.RefreshMessage):
                     if response.resend:
                         # TODO: delete old message?
-                        await bot.rest.create_interaction_response(
-                            interaction=event.interaction,
-                            response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                            content="Game resent!",
-                            embeds=[],
-                            components=[],
-                            token=event.interaction.token,
+                        await lib.update_message(
+                            bot,
+                            event.interaction,
+                            render=lambda: dict(
+                                content="Game resent!",
+                                embeds=[],
+                                components=[],
+                            ),
                         )
 
                         # await bot.rest.create_interaction_response(
@@ -251,26 +323,21 @@ def setup(
                             webhook=event.interaction.application_id,
                             token=event.interaction.token,
                             content=chess_game.content(),
-                            embeds=chess_game.embeds(),
+                            embeds=await lib.offload(chess_game.embeds),
                             components=chess_game.components(bot),
                         )
                     else:
-                        await bot.rest.create_interaction_response(
-                            interaction=event.interaction,
-                            response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                            content=chess_game.content(),
-                            embeds=chess_game.embeds(),
-                            components=chess_game.components(bot),
-                            token=event.interaction.token,
+                        await lib.update_message(
+                            bot,
+                            event.interaction,
+                            render=lambda: dict(
+                                content=chess_game.content(),
+                                embeds=chess_game.embeds(),
+                                components=chess_game.components(bot),
+                            ),
                         )
                 else:
-                    await bot.rest.create_interaction_response(
-                        event.interaction,
-                        event.interaction.token,
-                        hikari.ResponseType.MESSAGE_CREATE,
-                        "Invalid move.",
-                        flags=hikari.MessageFlag.EPHEMERAL,
-                    )
+                    await lib.send_message(bot, event.interaction, "Invalid move.")
                 return
         else:
             if await invite.handle_interaction(event, bot):
@@ -285,14 +352,16 @@ def setup(
                     black = invite.inviter_id
 
                 chess_game = ChessGame(white, black, variant=variant)
+                chess_game.version = invite.version
 
-                await bot.rest.create_interaction_response(
-                    interaction=event.interaction,
-                    response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                    content=chess_game.content(),
-                    embeds=chess_game.embeds(),
-                    components=chess_game.components(bot),
-                    token=event.interaction.token,
+                await lib.update_message(
+                    bot,
+                    event.interaction,
+                    render=lambda: dict(
+                        content=chess_game.content(),
+                        embeds=chess_game.embeds(),
+                        components=chess_game.components(bot),
+                    ),
                 )
                 return
 
@@ -308,6 +377,8 @@ class ChessGame:
     ) -> None:
         self.player_w = player_1
         self.player_b = player_2
+        # incremented with every header written, see lib.MessageLocks
+        self.version = 0
         self.selected_piece = None
         # print(f"Initializing chess game in variant: {variant}")
         match variant:
@@ -335,15 +406,17 @@ class ChessGame:
                 )
             case _:
                 raise ValueError(f"Invalid chess variant: {variant}")
+        # every move since the start position, undo and the archived PGN replay it
+        self.history = MoveHistory(variant, self.board.fen())
 
         self.current_turn = current_turn or self.player_w
         self.force_win = None
         # self.last_move = None
-        self.last_fen = None
         self.undo_vote = None
         self.truce_offer = None
         self.variant = variant
 
+    @lib.traced("make_move")
     def make_move(
         self,
         player: hikari.Snowflake,
@@ -383,6 +456,8 @@ class ChessGame:
             ):
                 # return lib.MaybeEphemeral("It's not your piece!", True)
                 self.board.turn = not self.board.turn
+                # a different position now, the side to move is part of its key
+                self.history.forget_positions()
                 return lib.RefreshMessage()
             self.selected_piece = square
             return True
@@ -421,10 +496,7 @@ class ChessGame:
                 # if move not in self.board.legal_moves:
                 if not self.legal_move(move):
                     return lib.MaybeEphemeral("Illegal move.", True)
-                self.last_fen = self.board.fen()
-                self.board.push(move)
-                if self.variant == "gravitychess":
-                    self.apply_gravity()
+                self.push(move)
                 self.selected_piece = None
                 # self.last_move = uci_move.upper()
                 self.current_turn = (
@@ -438,10 +510,7 @@ class ChessGame:
                 move = chess.Move.from_uci(uci_move.lower())
                 if not self.legal_move(move):
                     return lib.MaybeEphemeral("Illegal move.", True)
-                self.last_fen = self.board.fen()
-                self.board.push(move)
-                if self.variant == "gravitychess":
-                    self.apply_gravity()
+                self.push(move)
                 self.selected_piece = None
                 # self.last_move = uci_move.upper()
                 self.current_turn = (
@@ -469,7 +538,7 @@ class ChessGame:
             )
         elif command_parts[0] == "undo":
             # return lib.MaybeEphemeral("This doesnt actually work yet", True)
-            if self.last_fen is None:
+            if len(self.history) == 0:
                 return lib.MaybeEphemeral("No moves to undo.", True)
             elif self.undo_vote is None:
                 self.undo_vote = player
@@ -483,12 +552,13 @@ class ChessGame:
                     return lib.MaybeEphemeral(
                         "You cannot accept your own undo request.", True
                     )
-                # undo last move
-                # if len(self.board.move_stack) < 1:
-                #     return lib.MaybeEphemeral("Not enough moves to undo.", True)
-                # self.board.pop()
-                self.board = chess.Board(fen=self.last_fen)  # reset to last fen
-                self.last_fen = None
+                # undo last move, asking again undoes the one before it
+                board = self.history.pop(self.board)
+                if board is None:
+                    return lib.MaybeEphemeral(
+                        "The moves before this position can't be undone.", True
+                    )
+                self.board = board
                 self.current_turn = (
                     self.player_b
                     if self.current_turn == self.player_w
@@ -542,7 +612,7 @@ class ChessGame:
             # )
             return self.force_win
         if (
-            self.board.is_checkmate() or self.get_moves() == {}
+            self.board.is_checkmate() or not self.has_legal_move()
         ):  # handle variant losses as well
             # return (
             #     self.player_b if self.current_turn == self.player_w else self.player_w
@@ -561,13 +631,32 @@ class ChessGame:
             )
         if self.board.is_stalemate() or self.board.is_insufficient_material():
             return lib.Tie(self.player_w, self.player_b)
+        # without these a game can go round in circles forever, the same position
+        # three times or fifty moves each without a capture or pawn move is a draw.
+        # a position needs eight quiet plies to come up a third time, only then is
+        # the log replayed to count them
+        if self.board.halfmove_clock >= 100 or (
+            self.board.halfmove_clock >= 8 and self.history.repetitions(self.board) >= 3
+        ):
+            return lib.Tie(self.player_w, self.player_b)
         return None
 
+    @property
+    def start_fen(self) -> str | None:
+        return self.history.start_fen
+
+    def push(self, move: chess.Move) -> None:
+        # the positions are only kept up to date once something has counted them
+        before = None
+        if self.history.positions is not None:
+            before = zobrist.chess_snapshot(self.board)
+        play(self.board, move, self.variant)
+        self.history.push(move, self.board, before)
+
     def last_move(self) -> str | None:
-        if len(self.board.move_stack) == 0:
+        if len(self.history) == 0:
             return None
-        last_move = self.board.move_stack[-1]
-        return last_move.uci().upper()
+        return self.history.moves[-1].upper()
 
     def content(self) -> str:
         header = self.to_header()
@@ -580,6 +669,12 @@ class ChessGame:
         return content
 
     def embeds(self) -> list:
+        if render.enabled():
+            return [
+                render.board_embed(
+                    self.board_tiles(), hikari.Color(0x3498DB), "chess.png"
+                )
+            ]
         board_str = self.render_board()
         embed = hikari.Embed(
             description=board_str,
@@ -587,214 +682,186 @@ class ChessGame:
         )
         return [embed]
 
+    @lib.traced("render_board")
     def render_board(self) -> str:
+        return lib.tiles_to_emoji(self.board_tiles())
+
+    def board_tiles(self) -> list[list[str]]:
+        # emoji names, row by row, the emoji and image renderers both draw these
         if self.board.is_checkmate():
             # special rendering for checkmate that renders the cause of checkmate
-            return self.render_checkmate_board()
-        selected_moves = []
+            return self.checkmate_board_tiles()
+        view = BOARD_VIEWS[self.variant]
+        selected_square = None
+        selected_moves = set()
         if self.selected_piece is not None:
-            moves = self.get_moves()
-            for to_square in moves.get(self.selected_piece, []):
-                selected_moves.append(to_square)
-        last_moved_to = None
-        last_moved_from = None
-        if self.last_move() is not None:
-            uci = self.last_move()[2:4]
-            # convert to 0-indexed file/rank
-            file = ord(uci[0]) - ord("A")
-            rank = int(uci[1]) - 1
-            last_moved_to = (file, rank)
-            uci_from = self.last_move()[0:2]
-            file_from = ord(uci_from[0]) - ord("A")
-            rank_from = int(uci_from[1]) - 1
-            last_moved_from = (file_from, rank_from)
-        board_str = ""
-        for rank in range(8, 0, -1):
-            if self.variant == "gravitychess":
-                board_str += lib.letter_emoji(9 - rank)
-            else:
-                board_str += lib.number_emoji(rank)
-            for file in range(1, 9):
-                if (rank, file) in self.blank_squares():
-                    board_str += lib.application_emoji("blank")
+            selected_square = chess.parse_square(self.selected_piece.lower())
+            for from_square, to_square in self.iter_moves():
+                if from_square == selected_square:
+                    selected_moves.add(to_square)
+        last_moved = set()
+        last_move = self.history.last()
+        if last_move is not None and self.force_win is None:
+            last_moved = {last_move.from_square, last_move.to_square}
+        tiles = []
+        for label, squares in zip(view.rank_labels, view.rows):
+            row = [label]
+            for square in squares:
+                if view.blank_mask & (1 << square):
+                    row.append("blank")
                     continue
-                # handle rotated board
-                if self.variant == "gravitychess":
-                    # rotate rank and file 90 degrees counterclockwise
-                    rotated_file = 8 - rank
-                    rotated_rank = file - 1
-                else:
-                    rotated_file = file - 1
-                    rotated_rank = rank - 1
-                square_index = chess.square(rotated_file, rotated_rank)
-                piece = self.board.piece_at(square_index)
-                board_str += str(
-                    get_emoji(
-                        rotated_file,
-                        rotated_rank,
-                        piece,
-                        # danger=self.selected_piece is not None
-                        # and chess.square_name(square_index).upper() in selected_moves,
-                        # info=self.selected_piece
-                        # == chess.square_name(square_index).upper(),
-                        # success=last_moved_to == (file - 1, rank - 1)
-                        # or last_moved_from == (file - 1, rank - 1),
-                        info=self.selected_piece is not None
-                        and chess.square_name(square_index).upper() in selected_moves,
-                        danger=self.selected_piece
-                        == chess.square_name(square_index).upper(),
-                        success=(
-                            last_moved_to == (rotated_file, rotated_rank)
-                            or last_moved_from == (rotated_file, rotated_rank)
-                        )
-                        and self.force_win is None,
+                row.append(
+                    tile_name(
+                        chess.square_file(square),
+                        chess.square_rank(square),
+                        self.board.piece_at(square),
+                        info=square in selected_moves,
+                        danger=square == selected_square,
+                        success=square in last_moved,
                     )
                 )
-            board_str += "\n"
-        board_str += lib.application_emoji("quiggle")
-        for file in range(1, 9):
-            if self.variant == "gravitychess":
-                board_str += lib.number_emoji(file)
-            else:
-                board_str += lib.letter_emoji(file)
-        return board_str
-
-    def blank_squares(self) -> set[tuple[int, int]]:
-        if self.variant != "crossderby":
-            return set()
-        blank_squares = set()
-        # cross derby has blank squares surrounding the corners of the board, 3 each totaling to 12 blank squares
-        corners = [(1, 1), (1, 8), (8, 1), (8, 8)]
-        # for each corner, add all 8 surrounding squares to blank squares, then remove any that are out of bounds
-        for corner in corners:
-            cx, cy = corner
-            for dx in [-1, 0, 1]:
-                for dy in [-1, 0, 1]:
-                    if dx == 0 and dy == 0:
-                        continue
-                    x = cx + dx
-                    y = cy + dy
-                    if 1 <= x <= 8 and 1 <= y <= 8:
-                        blank_squares.add((x, y))
-
-        return blank_squares
+            tiles.append(row)
+        tiles.append(list(view.file_labels))
+        return tiles
 
+    @lib.traced("get_moves")
     def get_moves(self) -> dict[str, set[str]]:
+        moves = {}
+        for from_square, to_square in self.iter_moves():
+            from_name = chess.square_name(from_square).upper()
+            if moves.get(from_name) is None:
+                moves[from_name] = set()
+            moves[from_name].add(chess.square_name(to_square).upper())
+        return moves
+
+    def iter_moves(self) -> Iterator[tuple[chess.Square, chess.Square]]:
+        # lazily yields every distinct (from, to) pair get_moves() would contain,
+        # promotions collapse into one pair like they do on the buttons
         match self.variant:
             case "gravitychess":
                 # we're gonna need to do a bit of custom move generation here since gravity chess has different rules
                 # we'll figure out all pseudo-legal moves, then modify them to get their FINAL positions after gravity applies, then check legality on those final positions
-                legal_moves = {}
-                for move in self.board.pseudo_legal_moves:
-                    # simulate the move on a copy of the board
-                    temp_board = self.board.copy()
-                    temp_board.push(move)
-                    # apply gravity: for each piece on the board, move it down (to the right) until it hits another piece or the edge of the board, also change move to be the final position after gravity applies, dedup moves as needed
-                    pieces_to_move = []
-                    for square in chess.SQUARES:
-                        piece = temp_board.piece_at(square)
-                        if piece is not None:
-                            pieces_to_move.append((square, piece))
-                            temp_board.remove_piece_at(square)
-                    for square, piece in pieces_to_move:
-                        file = chess.square_file(square)
-                        rank = chess.square_rank(square)
-                        while file < 7:
-                            next_square = chess.square(file + 1, rank)
-                            if temp_board.piece_at(next_square) is not None:
-                                break
-                            file += 1
-                        final_square = chess.square(file, rank)
-                        temp_board.set_piece_at(final_square, piece)
-                    # now check if the move is legal on the modified board
-                    if not temp_board.is_check():
-                        # move is legal, adjust the move to be the final position after gravity applies
-                        move_file = chess.square_file(move.to_square)
-                        move_rank = chess.square_rank(move.to_square)
-                        while move_file < 7:
-                            next_square = chess.square(move_file + 1, move_rank)
-                            if self.board.piece_at(next_square) is not None:
-                                break
-                            move_file += 1
-                        final_to_square = chess.square(move_file, move_rank)
-                        final_uci = f"{chess.square_name(move.from_square).upper()}{chess.square_name(final_to_square).upper()}"
-                        uci_move = final_uci.upper()
-                        from_square = uci_move[0:2]
-                        to_square = uci_move[2:4]
-                        if legal_moves.get(from_square) is None:
-                            legal_moves[from_square] = set()
-                        if to_square not in legal_moves[from_square]:
-                            legal_moves[from_square].add(to_square)
-                # remove any moves that result in the piece going immediately to the left of itself (this will cause no net movement after gravity) unless the horizontal position is changed (i.e. captures or vertical moves)
-                new_legal_moves = {}
-                for from_square, to_squares in legal_moves.items():
-                    new_to_squares = set()
-                    from_file = ord(from_square[0]) - ord("A")
-                    from_rank = int(from_square[1]) - 1
-                    for to_square in to_squares:
-                        to_file = ord(to_square[0]) - ord("A")
-                        to_rank = int(to_square[1]) - 1
-                        if to_file != from_file - 1 or to_rank != from_rank:
-                            new_to_squares.add(to_square)
-                    if len(new_to_squares) > 0:
-                        new_legal_moves[from_square] = new_to_squares
-                return new_legal_moves
+                seen = set()
+                for move in self.board.generate_pseudo_legal_moves():
+                    final_to_square = self.gravity_landing(move.to_square)
+                    # skip any moves that result in the piece going immediately to the left of itself (this will cause no net movement after gravity) unless the horizontal position is changed (i.e. captures or vertical moves)
+                    if chess.square_rank(final_to_square) == chess.square_rank(
+                        move.from_square
+                    ) and chess.square_file(final_to_square) == (
+                        chess.square_file(move.from_square) - 1
+                    ):
+                        continue
+                    pair = (move.from_square, final_to_square)
+                    if pair in seen:
+                        continue
+                    if self.gravity_move_is_safe(move):
+                        seen.add(pair)
+                        yield pair
             case "crossderby":
                 # filter out any moves leading to blank squares
-                moves = {}
-                for move in self.board.legal_moves:
-                    uci_move = move.uci().upper()
-                    from_square = uci_move[0:2]
-                    to_square = uci_move[2:4]
-                    to_file = ord(to_square[0]) - ord("A") + 1
-                    to_rank = int(to_square[1])
-                    if (to_file, to_rank) in self.blank_squares():
+                for move in self.board.generate_legal_moves():
+                    if move.promotion not in (None, chess.QUEEN):
                         continue
-                    if moves.get(from_square) is None:
-                        moves[from_square] = set()
-                    moves[from_square].add(to_square)
-                return moves
+                    if CROSS_DERBY_BLANK_MASK & (1 << move.to_square):
+                        continue
+                    yield move.from_square, move.to_square
             case _:
-                moves = {}
-                for move in self.board.legal_moves:
-                    uci_move = move.uci().upper()
-                    from_square = uci_move[0:2]
-                    to_square = uci_move[2:4]
-                    if moves.get(from_square) is None:
-                        moves[from_square] = set()
-                    moves[from_square].add(to_square)
-                return moves
+                for move in self.board.generate_legal_moves():
+                    if move.promotion not in (None, chess.QUEEN):
+                        continue
+                    yield move.from_square, move.to_square
+
+    def has_legal_move(self) -> bool:
+        # stops at the first move, check_outcome runs on every render
+        return next(self.iter_moves(), None) is not None
+
+    def gravity_move_is_safe(self, move: chess.Move) -> bool:
+        # simulate the move on a copy of the board
+        temp_board = self.board.copy(stack=False)
+        temp_board.push(move)
+        # apply gravity: for each piece on the board, move it down (to the right) until it hits another piece or the edge of the board
+        pieces_to_move = []
+        for square in chess.SQUARES:
+            piece = temp_board.piece_at(square)
+            if piece is not None:
+                pieces_to_move.append((square, piece))
+                temp_board.remove_piece_at(square)
+        for square, piece in pieces_to_move:
+            file = chess.square_file(square)
+            rank = chess.square_rank(square)
+            while file < 7:
+                next_square = chess.square(file + 1, rank)
+                if temp_board.piece_at(next_square) is not None:
+                    break
+                file += 1
+            final_square = chess.square(file, rank)
+            temp_board.set_piece_at(final_square, piece)
+        # now check if the move is legal on the modified board
+        return not temp_board.is_check()
+
+    def gravity_landing(self, to_square: chess.Square) -> chess.Square:
+        # where a piece moved to to_square ends up once it slides right
+        move_file = chess.square_file(to_square)
+        move_rank = chess.square_rank(to_square)
+        while move_file < 7:
+            next_square = chess.square(move_file + 1, move_rank)
+            if self.board.piece_at(next_square) is not None:
+                break
+            move_file += 1
+        return chess.square(move_file, move_rank)
+
+    @lib.traced("is_legal")
+    def is_legal(self, move: chess.Move) -> bool:
+        # checks just this move, get_moves() builds the whole map for every variant
+        match self.variant:
+            case "gravitychess":
+                # the target is where the piece lands, try the pseudo-legal moves
+                # from the same square that slide there
+                if (
+                    chess.square_rank(move.to_square)
+                    == chess.square_rank(move.from_square)
+                    and chess.square_file(move.to_square)
+                    == chess.square_file(move.from_square) - 1
+                ):
+                    # no net movement after gravity, get_moves() leaves these out
+                    return False
+                to_rank = chess.square_rank(move.to_square)
+                for candidate in self.board.generate_pseudo_legal_moves(
+                    from_mask=chess.BB_SQUARES[move.from_square]
+                ):
+                    if chess.square_rank(candidate.to_square) != to_rank:
+                        continue
+                    if self.gravity_landing(candidate.to_square) != move.to_square:
+                        continue
+                    if self.gravity_move_is_safe(candidate):
+                        return True
+                return False
+            case "crossderby":
+                if CROSS_DERBY_BLANK_MASK & (1 << move.to_square):
+                    return False
+                return self.board_is_legal(move)
+            case _:
+                return self.board_is_legal(move)
+
+    def board_is_legal(self, move: chess.Move) -> bool:
+        # python-chess also takes the king moving onto its own rook as castling, but
+        # iter_moves() only offers that in chess960. everywhere else castling is the
+        # king's two square step and no offered move lands on the player's own piece
+        board = self.board
+        if (
+            not board.chess960
+            and board.occupied_co[board.turn] & chess.BB_SQUARES[move.to_square]
+        ):
+            return False
+        return board.is_legal(move)
 
     def legal_move(self, move: chess.Move) -> bool:
-        legal_moves = self.get_moves()
-        uci_move = move.uci().upper()
-        from_square = uci_move[0:2]
-        to_square = uci_move[2:4]
-        return to_square in legal_moves.get(from_square, set())
+        return self.is_legal(move)
 
     def apply_gravity(self) -> None:
-        # move any piece with a space to its right, repeat until no pieces are moved
-        while True:
-            pieces_moved = False
-            all_pieces = []
-            for square in chess.SQUARES:
-                piece = self.board.piece_at(square)
-                if piece is not None:
-                    all_pieces.append((square, piece))
-            for square, piece in all_pieces:
-                file = chess.square_file(square)
-                rank = chess.square_rank(square)
-                if file < 7:
-                    next_square = chess.square(file + 1, rank)
-                    if self.board.piece_at(next_square) is None:
-                        # move piece to next square
-                        self.board.remove_piece_at(square)
-                        self.board.set_piece_at(next_square, piece)
-                        pieces_moved = True
-            if not pieces_moved:
-                break
+        apply_gravity(self.board)
 
-    def render_checkmate_board(self) -> str:
+    def checkmate_board_tiles(self) -> list[list[str]]:
         # find the king in check
         king_square = None
         for square in chess.SQUARES:
@@ -807,7 +874,7 @@ class ChessGame:
                 king_square = square
                 break
         if king_square is None:
-            return self.render_board()
+            return self.board_tiles()
         # find all attackers to the king and any surrounding squares
         attackers = self.board.attackers(not self.board.turn, king_square)
         red_squares = set()
@@ -825,79 +892,34 @@ class ChessGame:
                     and self.board.piece_at(chess.square(f, r)) is None
                 ):
                     red_squares.add(chess.square(f, r))
-        board_str = ""
-        for rank in range(8, 0, -1):
-            if self.variant == "gravitychess":
-                board_str += lib.letter_emoji(9 - rank)
-            else:
-                board_str += lib.number_emoji(rank)
-            for file in range(1, 9):
-                if self.variant == "gravitychess":
-                    # rotate rank and file 90 degrees counterclockwise
-                    rotated_file = 8 - rank
-                    rotated_rank = file - 1
-                else:
-                    rotated_file = file - 1
-                    rotated_rank = rank - 1
-                square_index = chess.square(rotated_file, rotated_rank)
-                piece = self.board.piece_at(square_index)
-                board_str += str(
-                    get_emoji(
-                        rotated_file,
-                        rotated_rank,
-                        piece,
-                        danger=square_index in red_squares
-                        or square_index == king_square,
-                        success=square_index in attackers,
+        view = BOARD_VIEWS[self.variant]
+        tiles = []
+        for label, squares in zip(view.rank_labels, view.rows):
+            row = [label]
+            for square in squares:
+                row.append(
+                    tile_name(
+                        chess.square_file(square),
+                        chess.square_rank(square),
+                        self.board.piece_at(square),
+                        danger=square in red_squares or square == king_square,
+                        success=square in attackers,
                     )
                 )
-            board_str += "\n"
-        board_str += lib.application_emoji("quiggle")
-        for file in range(1, 9):
-            if self.variant == "gravitychess":
-                board_str += lib.number_emoji(file)
-            else:
-                board_str += lib.letter_emoji(file)
-        return board_str
+            tiles.append(row)
+        tiles.append(list(view.file_labels))
+        return tiles
 
+    @lib.traced("components")
     def components(self, bot: hikari.GatewayBot) -> list:
         if self.check_outcome() is not None:
             return []
-        helper_row = bot.rest.build_message_action_row()
-        helper_row.add_interactive_button(
-            hikari.ButtonStyle.SECONDARY,
-            "chess_resend",
-            label="Resend!",
-        )
-        helper_row.add_interactive_button(
-            hikari.ButtonStyle.SECONDARY,
-            "chess_forfeit",
-            label="Forfeit",
-            emoji=hikari.Emoji.parse("🏳️"),
-        )
-        if self.truce_offer is None and self.undo_vote is None:
-            helper_row.add_interactive_button(
-                hikari.ButtonStyle.SECONDARY,
-                "chess_truce",
-                label="Offer Truce",
-                emoji=hikari.Emoji.parse("🤝"),
-            )
-            helper_row.add_interactive_button(
-                (
-                    hikari.ButtonStyle.SECONDARY
-                    if self.undo_vote is None
-                    else hikari.ButtonStyle.DANGER
-                ),
-                "chess_undo",
-                label=(
-                    "Request Undo" if self.last_fen is not None else "No Undo Available"
-                ),
-                is_disabled=(self.last_fen is None),
-                emoji=(hikari.UNDEFINED if self.undo_vote is None else "⏪"),
-            )
-        helper_row.add_link_button(
-            "https://www.youtube.com/watch?v=OCSbzArwB10",
-            label="How to Play",
+        # the helper row only depends on pending votes and whether undo is possible
+        no_votes = self.truce_offer is None and self.undo_vote is None
+        can_undo = len(self.history) > 0
+        (helper_row,) = lib.component_template(
+            ("chess", "helper", no_votes, can_undo),
+            lambda: [build_helper_row(bot, no_votes, can_undo)],
         )
         moves = self.get_moves()
 
@@ -1101,6 +1123,81 @@ class ChessGame:
                     return True
         return False
 
+    def pgn_result(self, change: elo.Change) -> str:
+        if isinstance(change.result, lib.Tie):
+            return "1/2-1/2"
+        return "1-0" if change.result.winner_id == self.player_w else "0-1"
+
+    def pgn_moves(self) -> list[str]:
+        # SAN while the moves replay under normal rules, UCI from the first one that
+        # doesn't (gravity landings, or a start position we never stored)
+        start = self.start_fen
+        if start is None and self.variant == "standard":
+            start = chess.STARTING_FEN
+        board = None
+        if start is not None and self.variant != "gravitychess":
+            board = chess.Board(start, chess960=self.variant == "chess960")
+        # a history restarted by an undo can begin with black to move
+        offset = 1 if start is not None and start.split()[1] == "b" else 0
+        tokens = []
+        for ply, uci in enumerate(self.history.moves):
+            move = chess.Move.from_uci(uci)
+            if (ply + offset) % 2 == 0:
+                tokens.append(f"{(ply + offset) // 2 + 1}.")
+            elif ply == 0:
+                tokens.append("1...")
+            if board is not None and board.is_legal(move):
+                tokens.append(board.san(move))
+                board.push(move)
+            else:
+                board = None
+                tokens.append(move.uci())
+        return tokens
+
+    def to_pgn(self, change: elo.Change, finished_at: float) -> str:
+        result = self.pgn_result(change)
+        tags = {
+            "Event": f"Quiggle Games {game_name()}",
+            "Site": "Discord",
+            "Date": time.strftime("%Y.%m.%d", time.gmtime(finished_at)),
+            "Round": "-",
+            "White": str(self.player_w),
+            "Black": str(self.player_b),
+            "Result": result,
+        }
+        for player, color in ((self.player_w, "White"), (self.player_b, "Black")):
+            old_elo = change.get_old_elo(player)
+            if old_elo is not None:
+                tags[f"{color}Elo"] = str(old_elo)
+                tags[f"{color}RatingDiff"] = f"{change.get_elo_change(player):+d}"
+        if self.variant != "standard":
+            tags["Variant"] = pgn_variants.get(
+                self.variant, valid_chess_variants[self.variant]
+            )
+        if self.start_fen is not None and self.start_fen != chess.STARTING_FEN:
+            tags["SetUp"] = "1"
+            tags["FEN"] = self.start_fen
+        tokens = self.pgn_moves()
+        if isinstance(change.result, lib.Forfeit):
+            color = "White" if change.result.forfeiter_id == self.player_w else "Black"
+            tokens.append(f"{{ {color} forfeits. }}")
+        tokens.append(result)
+        lines = [f'[{name} "{value}"]' for name, value in tags.items()]
+        movetext = textwrap.fill(" ".join(tokens), width=79, break_on_hyphens=False)
+        return "\n".join(lines) + "\n\n" + movetext + "\n\n"
+
+    def archive_record(self, change: elo.Change, message_id: int) -> archive.Record:
+        finished_at = time.time()
+        return archive.Record(
+            self.to_pgn(change, finished_at),
+            message_id=int(message_id),
+            white_id=int(self.player_w),
+            black_id=int(self.player_b),
+            variant=self.variant,
+            result=self.pgn_result(change),
+            finished_at=finished_at,
+        )
+
     def to_header(self) -> str:
         game_data = {
             "player_w": str(self.player_w),
@@ -1110,18 +1207,32 @@ class ChessGame:
             "current_turn": str(self.current_turn),
             "force_win": str(self.force_win),
             # "last_move": str(self.last_move),
-            "last_fen": str(self.last_fen),
-            "move_stack": [move_to_string(m) for m in self.board.move_stack],
+            # the moves since start_fen, replayed only when the positions are needed
+            "moves": self.history.uci(),
             "undo_vote": str(self.undo_vote),
             "truce_offer": str(self.truce_offer),
             "variant": self.variant,
+            "version": self.version + 1,
         }
+        if self.start_fen != variant_start_fen(self.variant):
+            # chess960 picks its own, the other variants always start the same
+            game_data["start_fen"] = self.start_fen
         game_data = lib.serialize(game_data)
         return f"```{game_data}\nChess\n```"
 
     def to_empty_header(self) -> str:
         return f"```Chess```"
 
+    def to_replay_header(self) -> str:
+        # what the finished message keeps, enough for the replay command
+        data = {
+            "variant": self.variant,
+            "moves": self.history.uci(),
+        }
+        if self.start_fen != variant_start_fen(self.variant):
+            data["start_fen"] = self.start_fen
+        return lib.replay_header(game_name(), data)
+
     @staticmethod
     def from_header(content: str) -> "ChessGame | None":
         header = lib.extract_header(content)
@@ -1143,6 +1254,7 @@ class ChessGame:
                 variant=dict_data.get("variant", "standard"),
             )
             game.board = chess.Board(fen=dict_data["board"])
+            game.version = dict_data.get("version", 0)
             game.selected_piece = dict_data["selected_piece"]
             if game.selected_piece == "None":
                 game.selected_piece = None
@@ -1152,14 +1264,31 @@ class ChessGame:
             # game.last_move = dict_data.get("last_move", None)
             # if game.last_move == "None":
             #     game.last_move = None
-            game.last_fen = dict_data.get("last_fen", None)
-            if game.last_fen == "None":
-                game.last_fen = None
-            move_stack = dict_data.get("move_stack", None)
-            if move_stack == "None":
-                move_stack = None
-            if move_stack is not None:
-                game.board.move_stack = [string_to_move(m) for m in move_stack]
+            if "moves" in dict_data:
+                moves = dict_data["moves"].split()
+            else:
+                # older headers stored move dicts, and a last_fen for a single undo
+                move_stack = dict_data.get("move_stack", None)
+                if move_stack == "None":
+                    move_stack = None
+                moves = [string_to_move(m).uci() for m in move_stack or []]
+            # only stored when it isn't the variant's usual start, and unknown for
+            # chess960 games started before it was stored
+            start_fen = dict_data.get("start_fen")
+            if start_fen == "None":
+                # headers written before it was left out
+                start_fen = None
+            if start_fen is None:
+                start_fen = variant_start_fen(game.variant)
+            # nothing is replayed here, most clicks never look at the history
+            game.history = MoveHistory(game.variant, start_fen, moves)
+            if "moves" not in dict_data and start_fen is not None:
+                # an old undo restarted the position and gravity used to clear the
+                # move stack, so an old log may not lead here. checked once, the
+                # header written next carries a log that does
+                replayed = game.history.board()
+                if replayed is None or replayed.board_fen() != game.board.board_fen():
+                    game.history = MoveHistory(game.variant, game.board.fen())
             game.undo_vote = dict_data.get("undo_vote", None)
             if game.undo_vote == "None":
                 game.undo_vote = None
@@ -1179,7 +1308,7 @@ class ChessGame:
             return None
 
 
-def get_emoji(
+def tile_name(
     x: int,
     y: int,
     piece: chess.PieceType | None,
@@ -1187,31 +1316,31 @@ def get_emoji(
     danger: bool = False,
     success: bool = False,
     info: bool = False,
-) -> hikari.Emoji:
+) -> str:
     is_black_square = (x + y) % 2 == 1
     square_color = "black" if is_black_square else "red"
     if piece is None:
 
         if square_color == "black":
             if danger:
-                return lib.application_emoji("green_danger")
+                return "green_danger"
             elif success:
-                return lib.application_emoji("green_green")
+                return "green_green"
             elif info:
-                return lib.application_emoji("green_blue")
+                return "green_blue"
             else:
-                return lib.application_emoji("green")
+                return "green"
         elif square_color == "red":
             if danger:
-                return lib.application_emoji("white_danger")
+                return "white_danger"
             elif success:
-                return lib.application_emoji("white_green")
+                return "white_green"
             elif info:
-                return lib.application_emoji("white_blue")
+                return "white_blue"
             else:
-                return lib.application_emoji("white")
+                return "white"
         else:
-            return lib.application_emoji("quiggle")
+            return "quiggle"
 
     color = "w" if piece.color == chess.WHITE else "b"
     symbol = piece.symbol().upper()
@@ -1223,7 +1352,21 @@ def get_emoji(
         emoji_name += "_green"
     elif info:
         emoji_name += "_blue"
-    return lib.application_emoji(emoji_name)
+    return emoji_name
+
+
+def get_emoji(
+    x: int,
+    y: int,
+    piece: chess.PieceType | None,
+    *,
+    danger: bool = False,
+    success: bool = False,
+    info: bool = False,
+) -> hikari.Emoji:
+    return lib.application_emoji(
+        tile_name(x, y, piece, danger=danger, success=success, info=info)
+    )
 
 
 def piece_name(symbol: str) -> str:
@@ -1243,13 +1386,348 @@ def piece_name(symbol: str) -> str:
     return "Unknown"
 
 
-def move_to_string(move: chess.Move) -> str:
-    return {
-        "from_square": str(move.from_square),
-        "to_square": str(move.to_square),
-        "promotion": str(move.promotion),
-        "drop": str(move.drop),
-    }
+def replay_frames(data: dict) -> list[list[list[str]]]:
+    # every position of a finished game, from its replay header
+    game = ChessGame(hikari.Snowflake(0), hikari.Snowflake(0), variant=data["variant"])
+    start_fen = data.get("start_fen")
+    if start_fen is not None:
+        game.board = chess.Board(fen=start_fen)
+        game.history = MoveHistory(game.variant, start_fen)
+    elif data["variant"] == "chess960":
+        raise ValueError("chess960 replay without a start position")
+    frames = [game.board_tiles()]
+    for uci in data["moves"].split():
+        # the same push the live game made, so gravity, castling rights and the
+        # last move highlight all come out the same
+        game.push(chess.Move.from_uci(uci))
+        frames.append(game.board_tiles())
+    return frames
+
+
+def build_helper_row(bot: hikari.GatewayBot, no_votes: bool, can_undo: bool):
+    helper_row = bot.rest.build_message_action_row()
+    helper_row.add_interactive_button(
+        hikari.ButtonStyle.SECONDARY,
+        "chess_resend",
+        label="Resend!",
+    )
+    helper_row.add_interactive_button(
+        hikari.ButtonStyle.SECONDARY,
+        "chess_forfeit",
+        label="Forfeit",
+        emoji=hikari.Emoji.parse("🏳️"),
+    )
+    if no_votes:
+        helper_row.add_interactive_button(
+            hikari.ButtonStyle.SECONDARY,
+            "chess_truce",
+            label="Offer Truce",
+            emoji=hikari.Emoji.parse("🤝"),
+        )
+        helper_row.add_interactive_button(
+            hikari.ButtonStyle.SECONDARY,
+            "chess_undo",
+            label=("Request Undo" if can_undo else "No Undo Available"),
+            is_disabled=not can_undo,
+        )
+    helper_row.add_link_button(
+        "https://www.youtube.com/watch?v=OCSbzArwB10",
+        label="How to Play",
+    )
+    return helper_row
+
+
+def cross_derby_blank_squares() -> set[tuple[int, int]]:
+    blank_squares = set()
+    # cross derby has blank squares surrounding the corners of the board, 3 each totaling to 12 blank squares
+    corners = [(1, 1), (1, 8), (8, 1), (8, 8)]
+    # for each corner, add all 8 surrounding squares to blank squares, then remove any that are out of bounds
+    for corner in corners:
+        cx, cy = corner
+        for dx in [-1, 0, 1]:
+            for dy in [-1, 0, 1]:
+                if dx == 0 and dy == 0:
+                    continue
+                x = cx + dx
+                y = cy + dy
+                if 1 <= x <= 8 and 1 <= y <= 8:
+                    blank_squares.add((x, y))
+
+    return blank_squares
+
+
+# (file, rank) from 1, and the same squares as a bitboard (bit n is chess square n)
+CROSS_DERBY_BLANK_SQUARES = frozenset(cross_derby_blank_squares())
+CROSS_DERBY_BLANK_MASK = sum(
+    1 << ((x - 1) + (y - 1) * 8) for x, y in CROSS_DERBY_BLANK_SQUARES
+)
+
+
+class BoardView:
+    # how a variant lays the board out on screen: the squares of each row top to
+    # bottom, the label tiles around them and the squares drawn blank. squares are
+    # plain indices (file + rank * 8) so building these doesn't import chess
+    __slots__ = ("rows", "rank_labels", "file_labels", "blank_mask")
+
+    def __init__(self, variant: str) -> None:
+        rows = []
+        rank_labels = []
+        for rank in range(8, 0, -1):
+            if variant == "gravitychess":
+                # rotated 90 degrees counterclockwise, pieces fall to the right
+                rows.append(tuple(file * 8 + 8 - rank for file in range(8)))
+                rank_labels.append(lib.letter_tile(9 - rank))
+            else:
+                rows.append(tuple((rank - 1) * 8 + file for file in range(8)))
+                rank_labels.append(lib.number_tile(rank))
+        self.rows = tuple(rows)
+        self.rank_labels = tuple(rank_labels)
+        if variant == "gravitychess":
+            file_labels = [lib.number_tile(file) for file in range(1, 9)]
+        else:
+            file_labels = [lib.letter_tile(file) for file in range(1, 9)]
+        self.file_labels = ("quiggle", *file_labels)
+        self.blank_mask = CROSS_DERBY_BLANK_MASK if variant == "crossderby" else 0
+
+
+# built once, every render of a variant walks the same tables
+BOARD_VIEWS = {variant: BoardView(variant) for variant in valid_chess_variants}
+
+
+def apply_gravity(board: chess.Board) -> None:
+    # move any piece with a space to its right, repeat until no pieces are moved.
+    # Board.set_piece_at and remove_piece_at clear the move stack, the BaseBoard
+    # ones keep it so pop() can still step back over this move
+    while True:
+        pieces_moved = False
+        all_pieces = []
+        for square in chess.SQUARES:
+            piece = board.piece_at(square)
+            if piece is not None:
+                all_pieces.append((square, piece))
+        for square, piece in all_pieces:
+            file = chess.square_file(square)
+            rank = chess.square_rank(square)
+            if file < 7:
+                next_square = chess.square(file + 1, rank)
+                if board.piece_at(next_square) is None:
+                    # move piece to next square
+                    chess.BaseBoard.remove_piece_at(board, square)
+                    chess.BaseBoard.set_piece_at(board, next_square, piece)
+                    pieces_moved = True
+        if not pieces_moved:
+            break
+    # with a move stack python-chess trusts the castling rights as they are, a
+    # king or rook that slid away has to lose them here like a move would
+    board.castling_rights = board.copy(stack=False).clean_castling_rights()
+
+
+def play(board: chess.Board, move: chess.Move, variant: str) -> None:
+    # a move the way every game plays it. python-chess only cleans up castling
+    # rights without a move stack, so they're cleaned here to keep a position's
+    # key the same whether or not the board it's on has history
+    board.push(move)
+    if variant == "gravitychess":
+        apply_gravity(board)
+    else:
+        board.castling_rights = board.copy(stack=False).clean_castling_rights()
+
+
+@functools.cache
+def variant_start_fen(variant: str) -> str | None:
+    # every variant but chess960 always starts from the same position
+    if variant == "chess960":
+        return None
+    game = ChessGame(hikari.Snowflake(0), hikari.Snowflake(0), variant=variant)
+    return game.start_fen
+
+
+class MoveHistory:
+    # the moves since start_fen as UCI. a decoded game only has this text, the
+    # positions are replayed the first time undo, an export or the repetition
+    # count asks for them
+    def __init__(
+        self, variant: str, start_fen: str | None, moves: list[str] | None = None
+    ) -> None:
+        self.variant = variant
+        # None for chess960 games started before it was stored
+        self.start_fen = start_fen
+        self.moves = moves if moves is not None else []
+        # zobrist keys of the positions since the last capture or pawn move, only
+        # those can come back. None until counted, they're rebuilt from the log
+        # rather than stored in the header
+        self.positions: list[int] | None = None
+        self.counts: dict[int, int] = {}
+        # the replayed board and how many moves it covers
+        self.replayed: chess.Board | None = None
+        self.replayed_length = -1
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+    def uci(self) -> str:
+        return " ".join(self.moves)
+
+    def last(self) -> chess.Move | None:
+        if len(self.moves) == 0:
+            return None
+        return chess.Move.from_uci(self.moves[-1])
+
+    def push(
+        self, move: chess.Move, board: chess.Board, before: tuple[int, ...] | None
+    ) -> None:
+        # board is the position after the move, gravity included, and before the
+        # zobrist.chess_snapshot of the one it was played in
+        self.moves.append(move.uci())
+        if self.positions is None:
+            return
+        position = zobrist.chess_update(self.positions[-1], before, board)
+        if board.halfmove_clock == 0:
+            self.positions = []
+            self.counts = {}
+        self.add_position(position)
+
+    def add_position(self, position: int) -> None:
+        self.positions.append(position)
+        self.counts[position] = self.counts.get(position, 0) + 1
+
+    def forget_positions(self) -> None:
+        self.positions = None
+        self.counts = {}
+
+    def repetitions(self, current: chess.Board) -> int:
+        # how often current has come up since the last capture or pawn move, itself
+        # included
+        if self.positions is None:
+            self.count_positions(current)
+        return self.counts[self.positions[-1]]
+
+    def count_positions(self, current: chess.Board) -> None:
+        # a log that doesn't lead to current, like one an old undo restarted or the
+        # turn flip in select, only counts from here on
+        key = zobrist.chess_hash(current, self.variant)
+        board = self.board()
+        positions: tuple[int, ...] = (key,)
+        if board is not None and zobrist.chess_hash(board, self.variant) == key:
+            positions = replay_positions(
+                self.variant, self.start_fen, self.moves, board, key
+            )
+        self.positions = []
+        self.counts = {}
+        for position in positions:
+            self.add_position(position)
+
+    def board(self) -> chess.Board | None:
+        # every position on python-chess's own stack, None if the log doesn't replay
+        if self.replayed_length != len(self.moves):
+            if self.start_fen is None:
+                return None
+            try:
+                self.replayed = replay_moves(self.variant, self.start_fen, self.uci())
+            except (ValueError, AssertionError):
+                return None
+            self.replayed_length = len(self.moves)
+        return self.replayed
+
+    def pop(self, current: chess.Board) -> chess.Board | None:
+        # the position before the last move, gravity included. None when the log
+        # doesn't lead to current, like a history an old undo restarted
+        board = self.board()
+        if board is None or board.board_fen() != current.board_fen():
+            return None
+        board = board.copy()
+        board.pop()
+        self.moves.pop()
+        self.replayed = board.copy()
+        self.replayed_length = len(self.moves)
+        # the list may have already dropped positions the undo brings back
+        self.forget_positions()
+        return board
+
+
+def history_cache_size() -> int:
+    return int(os.getenv("CHESS_HISTORY_CACHE_SIZE", "1024"))
+
+
+# (variant, start fen, moves) -> the board they lead to, with python-chess's own
+# state stack so pop() works. an undo is requested and accepted on two clicks,
+# the second one finds the replay the first did
+_boards: collections.OrderedDict[tuple[str, str, str], chess.Board] = (
+    collections.OrderedDict()
+)
+# headers are built and read on executor threads
+_boards_lock = threading.Lock()
+
+
+def remember_board(
+    variant: str, start_fen: str, moves: str, board: chess.Board
+) -> None:
+    key = (variant, start_fen, moves)
+    with _boards_lock:
+        if key in _boards:
+            _boards.move_to_end(key)
+            return
+    board = board.copy()
+    with _boards_lock:
+        _boards[key] = board
+        while len(_boards) > history_cache_size():
+            _boards.popitem(last=False)
+
+
+# (variant, start fen, moves) -> the keys of the positions since the last capture
+# or pawn move, the next click counts one more instead of walking the stack back
+_positions: collections.OrderedDict[tuple[str, str, str], tuple[int, ...]] = (
+    collections.OrderedDict()
+)
+
+
+def replay_positions(
+    variant: str, start_fen: str, moves: list[str], board: chess.Board, key: int
+) -> tuple[int, ...]:
+    # board is the replay of moves and key its zobrist key
+    cache_key = (variant, start_fen, " ".join(moves))
+    with _boards_lock:
+        positions = _positions.get(cache_key)
+        if positions is None and board.halfmove_clock > 0:
+            previous = _positions.get((variant, start_fen, " ".join(moves[:-1])))
+            if previous is not None:
+                positions = previous + (key,)
+    if positions is None:
+        keys = [key]
+        board = board.copy()
+        while board.halfmove_clock > 0 and len(board.move_stack) > 0:
+            after = zobrist.chess_snapshot(board)
+            board.pop()
+            keys.append(zobrist.chess_update(keys[-1], after, board))
+        positions = tuple(reversed(keys))
+    with _boards_lock:
+        _positions[cache_key] = positions
+        _positions.move_to_end(cache_key)
+        while len(_positions) > history_cache_size():
+            _positions.popitem(last=False)
+    return positions
+
+
+def replay_moves(variant: str, start_fen: str, moves: str) -> chess.Board:
+    # raises ValueError or AssertionError for a log that doesn't replay. a cached
+    # log one move short is extended instead of replaying from the start
+    ucis = moves.split()
+    with _boards_lock:
+        board = _boards.get((variant, start_fen, moves))
+        if board is not None:
+            _boards.move_to_end((variant, start_fen, moves))
+            return board.copy()
+        # usually a move was made since the position we have
+        previous = _boards.get((variant, start_fen, " ".join(ucis[:-1])))
+    if ucis and previous is not None:
+        board = previous.copy()
+        ucis = ucis[-1:]
+    else:
+        board = chess.Board(start_fen)
+    for uci in ucis:
+        play(board, chess.Move.from_uci(uci), variant)
+    remember_board(variant, start_fen, moves, board)
+    return board
 
 
 def string_to_move(data: dict) -> chess.Move:
@@ -3,6 +3,7 @@ import hikari
 import lib
 import random
 import elo
+import render
 
 
 def game_name(command_name: bool = False) -> str:
@@ -104,12 +105,23 @@ def setup(
         game_name = lib.header_name(content)
         if game_name != "Connect Four" and game_name != "ConnectFour":
             return
+        with lib.trace("connectfour", event.interaction.custom_id):
+            async with lib.deferral(bot, event.interaction, "connectfour"):
+                async with lib.message_locks.hold(message.id):
+                    await handle_interaction(event, content)
+
+    async def handle_interaction(
+        event: hikari.InteractionCreateEvent, content: str
+    ) -> None:
         invite = lib.GameInvite.from_header(content)
         if invite is None:
 
-            c4_game = ConnectFourGame.from_header(content)
+            with lib.span("decode"):
+                c4_game = ConnectFourGame.from_header(content)
             if c4_game is None:
                 return
+            if await lib.reject_stale(bot, event.interaction, c4_game.version):
+                return
             custom_id = event.interaction.custom_id
             if custom_id.startswith("c4_move_"):
                 parts = custom_id.split("_")
@@ -121,49 +133,43 @@ def setup(
                 except ValueError:
                     print("Invalid column in c4_move_ interaction id:", custom_id)
                     return
-                response = c4_game.make_move(
-                    event.interaction.user.id, col, elo_handler
-                )
+                with lib.span("logic"):
+                    response = await lib.offload(
+                        c4_game.make_move, event.interaction.user.id, col, elo_handler
+                    )
                 if isinstance(response, bool) and response:
-                    await bot.rest.create_interaction_response(
-                        interaction=event.interaction,
-                        response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                        content=c4_game.content(),
-                        embeds=c4_game.embeds(),
-                        components=c4_game.components(bot),
-                        token=event.interaction.token,
+                    await lib.update_message(
+                        bot,
+                        event.interaction,
+                        render=lambda: dict(
+                            content=c4_game.content(),
+                            embeds=c4_game.embeds(),
+                            components=c4_game.components(bot),
+                        ),
                     )
                     return
                 elif isinstance(response, elo.Change):
-                    await bot.rest.create_interaction_response(
-                        interaction=event.interaction,
-                        response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                        # content=c4_game.content(),
-                        content=f"{c4_game.to_empty_header()}",
-                        embeds=elo.result_embeds(response) + c4_game.embeds(),
-                        components=c4_game.components(bot),
-                        token=event.interaction.token,
+                    await lib.update_message(
+                        bot,
+                        event.interaction,
+                        render=lambda: dict(
+                            # content=c4_game.content(),
+                            content=f"{c4_game.to_replay_header()}",
+                            embeds=elo.result_embeds(response) + c4_game.embeds(),
+                            components=c4_game.components(bot),
+                        ),
                     )
                     return
                 elif isinstance(response, lib.MaybeEphemeral):
-                    await bot.rest.create_interaction_response(
+                    await lib.send_message(
+                        bot,
                         event.interaction,
-                        event.interaction.token,
-                        hikari.ResponseType.MESSAGE_CREATE,
                         response.message,
-                        flags=(
-                            hikari.MessageFlag.EPHEMERAL if response.ephemeral else None
-                        ),
+                        ephemeral=response.ephemeral,
                     )
                     return
                 else:
-                    await bot.rest.create_interaction_response(
-                        event.interaction,
-                        event.interaction.token,
-                        hikari.ResponseType.MESSAGE_CREATE,
-                        "Invalid move.",
-                        flags=hikari.MessageFlag.EPHEMERAL,
-                    )
+                    await lib.send_message(bot, event.interaction, "Invalid move.")
                     return
                 # if isinstance(response, bool):
                 #     if response:
@@ -230,12 +236,10 @@ def setup(
                 #     print("Invalid response from make_move:", response)
                 #     return
             elif custom_id == "c4_quiggle":
-                await bot.rest.create_interaction_response(
+                await lib.send_message(
+                    bot,
                     event.interaction,
-                    event.interaction.token,
-                    hikari.ResponseType.MESSAGE_CREATE,
                     "(heehee that tickles!)>" + lib.application_emoji("quiggle"),
-                    flags=hikari.MessageFlag.EPHEMERAL,
                 )
                 return
         else:
@@ -245,14 +249,16 @@ def setup(
                     c4_game = ConnectFourGame(invite.invited_id, invite.inviter_id)
                 else:
                     c4_game = ConnectFourGame(invite.inviter_id, invite.invited_id)
+                c4_game.version = invite.version
 
-                await bot.rest.create_interaction_response(
-                    interaction=event.interaction,
-                    response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                    content=c4_game.content(),
-                    embeds=c4_game.embeds(),
-                    components=c4_game.components(bot),
-                    token=event.interaction.token,
+                await lib.update_message(
+                    bot,
+                    event.interaction,
+                    render=lambda: dict(
+                        content=c4_game.content(),
+                        embeds=c4_game.embeds(),
+                        components=c4_game.components(bot),
+                    ),
                 )
                 return
 
@@ -269,6 +275,10 @@ class ConnectFourGame:
         self.player_y = player_2
         self.board = [[" " for _ in range(7)] for _ in range(6)]
         self.current_turn = current_turn or self.player_r
+        # incremented with every header written, see lib.MessageLocks
+        self.version = 0
+        # columns played so far, None for games started before they were recorded
+        self.moves: list[int] | None = []
 
     def make_move(
         self, player: hikari.Snowflake, col: int, elo_handler: elo.EloHandler
@@ -278,12 +288,10 @@ class ConnectFourGame:
         if self.current_turn != player:
             return lib.MaybeEphemeral("It's not your turn!", ephemeral=True)
 
-        for row in reversed(range(6)):
-            if self.board[row][col] == " ":
-                self.board[row][col] = "R" if player == self.player_r else "Y"
-                break
-        else:
+        if not self.drop_piece(col, "R" if player == self.player_r else "Y"):
             return False
+        if self.moves is not None:
+            self.moves.append(col)
         self.current_turn = (
             self.player_y if self.current_turn == self.player_r else self.player_r
         )
@@ -292,6 +300,13 @@ class ConnectFourGame:
             return elo_handler.record_outcome(outcome)
         return True
 
+    def drop_piece(self, col: int, piece: str) -> bool:
+        for row in reversed(range(6)):
+            if self.board[row][col] == " ":
+                self.board[row][col] = piece
+                return True
+        return False
+
     def get_all_winning_positions(self) -> list[tuple[int, int]]:
         winning_positions = []
 
@@ -363,6 +378,12 @@ class ConnectFourGame:
         return f"{header}It is <@{self.current_turn}>'s turn! {lib.application_emoji('c4_red_piece') if self.current_turn == self.player_r else lib.application_emoji('c4_yellow_piece')}"
 
     def embeds(self) -> list[hikari.Embed]:
+        if render.enabled():
+            return [
+                render.board_embed(
+                    self.board_tiles(), hikari.Color(0xFFAA00), "connectfour.png"
+                )
+            ]
         embed = hikari.Embed(
             description=self.board_str(),
             color=hikari.Color(0xFFAA00),
@@ -370,70 +391,53 @@ class ConnectFourGame:
         return [embed]
 
     def board_str(self) -> str:
+        return lib.tiles_to_emoji(self.board_tiles())
 
-        board_lines = []
+    def board_tiles(self) -> list[list[str]]:
+        tiles = []
         winning_positions = self.get_all_winning_positions()
 
-        top_border = lib.application_emoji("c4_border_top_left")
+        top_border = ["c4_border_top_left"]
         for i in range(7):
-            top_border += lib.application_emoji(f"c4_border_top_{i + 1}")
-        top_border += lib.application_emoji("c4_border_top_right")
-        board_lines.append(top_border)
+            top_border.append(f"c4_border_top_{i + 1}")
+        top_border.append("c4_border_top_right")
+        tiles.append(top_border)
 
         for row_index, row in enumerate(self.board):
-            row_str = lib.application_emoji("c4_border_left")
+            row_tiles = ["c4_border_left"]
             for col_index, cell in enumerate(row):
                 if cell == "R":
                     if (row_index, col_index) in winning_positions:
-                        row_str += lib.application_emoji("c4_red_winner")
+                        row_tiles.append("c4_red_winner")
                     else:
-                        row_str += str(lib.application_emoji("c4_red"))
+                        row_tiles.append("c4_red")
                 elif cell == "Y":
                     if (row_index, col_index) in winning_positions:
-                        row_str += lib.application_emoji("c4_yellow_winner")
+                        row_tiles.append("c4_yellow_winner")
                     else:
-                        row_str += str(lib.application_emoji("c4_yellow"))
+                        row_tiles.append("c4_yellow")
                 else:
-                    row_str += str(lib.application_emoji("c4_empty"))
-            row_str += lib.application_emoji("c4_border_right")
-            board_lines.append(row_str)
+                    row_tiles.append("c4_empty")
+            row_tiles.append("c4_border_right")
+            tiles.append(row_tiles)
 
-        bottom_border_str = lib.application_emoji("c4_border_bottom_left")
+        bottom_border = ["c4_border_bottom_left"]
         for i in range(7):
-            bottom_border_str += lib.application_emoji(f"c4_border_bottom_{i + 1}")
-        bottom_border_str += lib.application_emoji("c4_border_bottom_right")
-        board_lines.append(bottom_border_str)
-        return "\n".join(board_lines)
+            bottom_border.append(f"c4_border_bottom_{i + 1}")
+        bottom_border.append("c4_border_bottom_right")
+        tiles.append(bottom_border)
+        return tiles
 
     def components(self, bot: hikari.GatewayBot) -> list:
         rows = []
         if self.check_outcome() is not None:
             return rows
-        row = bot.rest.build_message_action_row()
-        for c in range(4):
-            row.add_interactive_button(
-                hikari.components.ButtonStyle.SECONDARY,
-                f"c4_move_{c}",
-                emoji=hikari.Emoji.parse(lib.number_emoji(c + 1)),
-                is_disabled=self.board[0][c] != " ",
-            )
-        rows.append(row)
-        row = bot.rest.build_message_action_row()
-        for c in range(4, 7):
-            row.add_interactive_button(
-                hikari.components.ButtonStyle.SECONDARY,
-                f"c4_move_{c}",
-                emoji=hikari.Emoji.parse(lib.number_emoji(c + 1)),
-                is_disabled=self.board[0][c] != " ",
-            )
-        row.add_interactive_button(
-            hikari.components.ButtonStyle.SUCCESS,
-            "c4_quiggle",
-            emoji=hikari.Emoji.parse(lib.application_emoji("quiggle")),
+        # the rows only differ in which columns are full
+        full_columns = tuple(self.board[0][c] != " " for c in range(7))
+        return lib.component_template(
+            ("connectfour", full_columns),
+            lambda: build_column_rows(bot, full_columns),
         )
-        rows.append(row)
-
-        return rows
 
     def to_header(self) -> str:
         game_data = {
@@ -441,6 +445,8 @@ class ConnectFourGame:
             "player_y": str(self.player_y),
             "board": self.board,
             "current_turn": str(self.current_turn),
+            "moves": self.moves,
+            "version": self.version + 1,
         }
         game_data = lib.serialize(game_data)
         return f"```{game_data}\nConnect Four\n```"
@@ -448,6 +454,12 @@ class ConnectFourGame:
     def to_empty_header(self) -> str:
         return f"```Connect Four```"
 
+    def to_replay_header(self) -> str:
+        # what the finished message keeps, enough for the replay command
+        if self.moves is None:
+            return self.to_empty_header()
+        return lib.replay_header(game_name(), {"moves": self.moves})
+
     @staticmethod
     def from_header(content: str) -> "ConnectFourGame | None":
         header = lib.extract_header(content)
@@ -468,6 +480,47 @@ class ConnectFourGame:
                 current_turn=hikari.Snowflake(dict_data["current_turn"]),
             )
             game.board = dict_data["board"]
+            game.version = dict_data.get("version", 0)
+            game.moves = dict_data.get("moves", None)
             return game
         except Exception:
             return None
+
+
+def replay_frames(data: dict) -> list[list[list[str]]]:
+    # every position of a finished game, from its replay header
+    game = ConnectFourGame(hikari.Snowflake(0), hikari.Snowflake(0))
+    frames = [game.board_tiles()]
+    for index, col in enumerate(data["moves"]):
+        # red always moves first
+        game.drop_piece(col, "R" if index % 2 == 0 else "Y")
+        frames.append(game.board_tiles())
+    return frames
+
+
+def build_column_rows(bot: hikari.GatewayBot, full_columns: tuple[bool, ...]) -> list:
+    rows = []
+    row = bot.rest.build_message_action_row()
+    for c in range(4):
+        row.add_interactive_button(
+            hikari.components.ButtonStyle.SECONDARY,
+            f"c4_move_{c}",
+            emoji=hikari.Emoji.parse(lib.number_emoji(c + 1)),
+            is_disabled=full_columns[c],
+        )
+    rows.append(row)
+    row = bot.rest.build_message_action_row()
+    for c in range(4, 7):
+        row.add_interactive_button(
+            hikari.components.ButtonStyle.SECONDARY,
+            f"c4_move_{c}",
+            emoji=hikari.Emoji.parse(lib.number_emoji(c + 1)),
+            is_disabled=full_columns[c],
+        )
+    row.add_interactive_button(
+        hikari.components.ButtonStyle.SUCCESS,
+        "c4_quiggle",
+        emoji=hikari.Emoji.parse(lib.application_emoji("quiggle")),
+    )
+    rows.append(row)
+    return rows
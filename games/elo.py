@@ -151,6 +151,8 @@ class EloGame:
         self.target = target
         self.username = username
         self.invoker = invoker
+        # incremented with every header written, see lib.MessageLocks
+        self.version = 0
 
     def make_move(self, remaining_parts: list[str]) -> bool:
         # Todo: implement Elo display logic
@@ -209,6 +211,7 @@ class EloGame:
             "target": str(self.target),
             "username": self.username,
             "invoker": str(self.invoker),
+            "version": self.version + 1,
         }
         game_data = lib.serialize(game_data)
         return f"```{game_data}\nElo\n```"
@@ -235,6 +238,7 @@ class EloGame:
                 username=dict_data["username"],
                 invoker=hikari.Snowflake(dict_data["invoker"]),
             )
+            game.version = dict_data.get("version", 0)
             return game
         except Exception:
             return None
@@ -104,12 +104,25 @@ def setup(
         parsed_name = lib.header_name(content)
         if parsed_name != f"{game_name()}":
             return
+        with lib.trace(game_name(command_name=True), event.interaction.custom_id):
+            async with lib.deferral(
+                bot, event.interaction, game_name(command_name=True)
+            ):
+                async with lib.message_locks.hold(message.id):
+                    await handle_interaction(event, content)
+
+    async def handle_interaction(
+        event: hikari.InteractionCreateEvent, content: str
+    ) -> None:
         invite = lib.GameInvite.from_header(content)
         if invite is None:
 
-            game = Game.from_header(content)
+            with lib.span("decode"):
+                game = Game.from_header(content)
             if game is None:
                 return
+            if await lib.reject_stale(bot, event.interaction, game.version):
+                return
             custom_id = event.interaction.custom_id
             if custom_id.startswith(f"{game_name()}_move_"):
                 parts = custom_id.split("_")
@@ -126,59 +139,47 @@ def setup(
                 except ValueError:
                     return
                 if choice not in [0, 1, 2]:
-                    await bot.rest.create_interaction_response(
-                        event.interaction,
-                        event.interaction.token,
-                        hikari.ResponseType.MESSAGE_CREATE,
-                        "Invalid move choice.",
-                        flags=hikari.MessageFlag.EPHEMERAL,
+                    await lib.send_message(
+                        bot, event.interaction, "Invalid move choice."
                     )
                     return
-                response = game.make_move(
-                    event.interaction.user.id, choice, elo_handler
-                )
+                with lib.span("logic"):
+                    response = await lib.offload(
+                        game.make_move, event.interaction.user.id, choice, elo_handler
+                    )
                 if isinstance(response, lib.MaybeEphemeral):
-                    await bot.rest.create_interaction_response(
+                    await lib.send_message(
+                        bot,
                         event.interaction,
-                        event.interaction.token,
-                        hikari.ResponseType.MESSAGE_CREATE,
                         response.message,
-                        flags=(
-                            hikari.MessageFlag.EPHEMERAL
-                            if response.ephemeral
-                            else hikari.MessageFlag.NONE
-                        ),
+                        ephemeral=response.ephemeral,
                     )
                     return
                 elif isinstance(response, elo.Change):
-                    await bot.rest.create_interaction_response(
-                        interaction=event.interaction,
-                        response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                        content=game.content(),
-                        embeds=elo.result_embeds(response)
-                        + game.embeds(),  # append game embeds after result embeds
-                        components=game.components(bot),
-                        token=event.interaction.token,
+                    await lib.update_message(
+                        bot,
+                        event.interaction,
+                        render=lambda: dict(
+                            content=game.content(),
+                            embeds=elo.result_embeds(response)
+                            + game.embeds(),  # append game embeds after result embeds
+                            components=game.components(bot),
+                        ),
                     )
                     return
                 elif isinstance(response, bool) and response:
-                    await bot.rest.create_interaction_response(
-                        interaction=event.interaction,
-                        response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                        content=game.content(),
-                        components=game.components(bot),
-                        embeds=game.embeds(),
-                        token=event.interaction.token,
+                    await lib.update_message(
+                        bot,
+                        event.interaction,
+                        render=lambda: dict(
+                            content=game.content(),
+                            components=game.components(bot),
+                            embeds=game.embeds(),
+                        ),
                     )
                     return
                 else:
-                    await bot.rest.create_interaction_response(
-                        event.interaction,
-                        event.interaction.token,
-                        hikari.ResponseType.MESSAGE_CREATE,
-                        "Invalid move.",
-                        flags=hikari.MessageFlag.EPHEMERAL,
-                    )
+                    await lib.send_message(bot, event.interaction, "Invalid move.")
                 return
         else:
             if await invite.handle_interaction(event, bot):
@@ -187,14 +188,16 @@ def setup(
                     game = Game(invite.invited_id, invite.inviter_id)
                 else:
                     game = Game(invite.inviter_id, invite.invited_id)
+                game.version = invite.version
 
-                await bot.rest.create_interaction_response(
-                    interaction=event.interaction,
-                    response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                    content=game.content(),
-                    components=game.components(bot),
-                    embeds=game.embeds(),
-                    token=event.interaction.token,
+                await lib.update_message(
+                    bot,
+                    event.interaction,
+                    render=lambda: dict(
+                        content=game.content(),
+                        components=game.components(bot),
+                        embeds=game.embeds(),
+                    ),
                 )
                 return
 
@@ -212,6 +215,8 @@ class Game:
         self.player_1_wins = 0
         self.player_2_wins = 0
         self.round_history: list[tuple[int, int, int]] = []
+        # incremented with every header written, see lib.MessageLocks
+        self.version = 0
 
     def make_move(
         self, player: hikari.Snowflake, choice: int, elo_handler: elo.EloHandler
@@ -318,18 +323,10 @@ class Game:
 
     def components(self, bot: hikari.GatewayBot) -> list:
         # override_disable = self.check_outcome() is not None
-        rows = []
-        # game logic to create components
-        row = bot.rest.build_message_action_row()
-        for i, move in enumerate(move_map):
-            row.add_interactive_button(
-                move["button_style"],
-                f"{game_name()}_move_{i}",
-                label=move["name"],
-                emoji=move["emoji"],
-            )
-        rows.append(row)
-        return rows
+        # the row never changes, so it is only built once
+        return lib.component_template(
+            (game_name(command_name=True),), lambda: build_move_rows(bot)
+        )
 
     def to_header(self) -> str:
         game_data = {
@@ -340,6 +337,7 @@ class Game:
             "player_1_choice": self.player_1_choice,
             "player_2_choice": self.player_2_choice,
             "round_history": self.round_history,
+            "version": self.version + 1,
         }
         game_data = lib.serialize(game_data)
         return f"```{game_data}\n{game_name()}\n```"
@@ -374,6 +372,7 @@ class Game:
             if game.player_2_choice is not None:
                 game.player_2_choice = int(game.player_2_choice)
             game.round_history = [tuple(triad) for triad in dict_data["round_history"]]
+            game.version = dict_data.get("version", 0)
             # if game.round_history is tuple[int, int] we need to convert to tuple[int, int, int] and truncate to last 10 rounds
             if (
                 game.round_history
@@ -390,6 +389,20 @@ class Game:
             return None
 
 
+def build_move_rows(bot: hikari.GatewayBot) -> list:
+    rows = []
+    row = bot.rest.build_message_action_row()
+    for i, move in enumerate(move_map):
+        row.add_interactive_button(
+            move["button_style"],
+            f"{game_name()}_move_{i}",
+            label=move["name"],
+            emoji=move["emoji"],
+        )
+    rows.append(row)
+    return rows
+
+
 move_map = [
     {"emoji": "🪨", "name": "Rock", "button_style": hikari.ButtonStyle.PRIMARY},
     {"emoji": "📄", "name": "Paper", "button_style": hikari.ButtonStyle.SUCCESS},
@@ -104,12 +104,23 @@ def setup(
         game_name = lib.header_name(content)
         if game_name != "Tic Tac Toe" and game_name != "TicTacToe":
             return
+        with lib.trace("tictactoe", event.interaction.custom_id):
+            async with lib.deferral(bot, event.interaction, "tictactoe"):
+                async with lib.message_locks.hold(message.id):
+                    await handle_interaction(event, content)
+
+    async def handle_interaction(
+        event: hikari.InteractionCreateEvent, content: str
+    ) -> None:
         invite = lib.GameInvite.from_header(content)
         if invite is None:
 
-            ttt_game = TicTacToeGame.from_header(content)
+            with lib.span("decode"):
+                ttt_game = TicTacToeGame.from_header(content)
             if ttt_game is None:
                 return
+            if await lib.reject_stale(bot, event.interaction, ttt_game.version):
+                return
             custom_id = event.interaction.custom_id
             if custom_id.startswith("ttt_move_"):
                 parts = custom_id.split("_")
@@ -121,34 +132,35 @@ def setup(
                     col = int(parts[3])
                 except ValueError:
                     return
-                response = ttt_game.make_move(
-                    event.interaction.user.id, row, col, elo_handler
-                )
+                with lib.span("logic"):
+                    response = await lib.offload(
+                        ttt_game.make_move,
+                        event.interaction.user.id,
+                        row,
+                        col,
+                        elo_handler,
+                    )
                 if isinstance(response, bool) and response:
-                    await bot.rest.create_interaction_response(
-                        interaction=event.interaction,
-                        response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                        content=ttt_game.content(),
-                        components=ttt_game.components(bot),
-                        token=event.interaction.token,
+                    await lib.update_message(
+                        bot,
+                        event.interaction,
+                        render=lambda: dict(
+                            content=ttt_game.content(),
+                            components=ttt_game.components(bot),
+                        ),
                     )
                 elif isinstance(response, elo.Change):
-                    await bot.rest.create_interaction_response(
-                        interaction=event.interaction,
-                        response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                        content=ttt_game.to_empty_header(),
-                        embeds=elo.result_embeds(response),
-                        components=ttt_game.components(bot),
-                        token=event.interaction.token,
-                    )
-                else:
-                    await bot.rest.create_interaction_response(
+                    await lib.update_message(
+                        bot,
                         event.interaction,
-                        event.interaction.token,
-                        hikari.ResponseType.MESSAGE_CREATE,
-                        "Invalid move.",
-                        flags=hikari.MessageFlag.EPHEMERAL,
+                        render=lambda: dict(
+                            content=ttt_game.to_empty_header(),
+                            embeds=elo.result_embeds(response),
+                            components=ttt_game.components(bot),
+                        ),
                     )
+                else:
+                    await lib.send_message(bot, event.interaction, "Invalid move.")
                 return
         else:
             if await invite.handle_interaction(event, bot):
@@ -157,13 +169,15 @@ def setup(
                     ttt_game = TicTacToeGame(invite.invited_id, invite.inviter_id)
                 else:
                     ttt_game = TicTacToeGame(invite.inviter_id, invite.invited_id)
+                ttt_game.version = invite.version
 
-                await bot.rest.create_interaction_response(
-                    interaction=event.interaction,
-                    response_type=hikari.ResponseType.MESSAGE_UPDATE,
-                    content=ttt_game.content(),
-                    components=ttt_game.components(bot),
-                    token=event.interaction.token,
+                await lib.update_message(
+                    bot,
+                    event.interaction,
+                    render=lambda: dict(
+                        content=ttt_game.content(),
+                        components=ttt_game.components(bot),
+                    ),
                 )
                 return
 
@@ -180,6 +194,8 @@ class TicTacToeGame:
         self.player_o = player_2
         self.board = [[" " for _ in range(3)] for _ in range(3)]
         self.current_turn = current_turn or self.player_x
+        # incremented with every header written, see lib.MessageLocks
+        self.version = 0
 
     def make_move(
         self, player: hikari.Snowflake, row: int, col: int, elo_handler: elo.EloHandler
@@ -250,6 +266,7 @@ class TicTacToeGame:
             "player_o": str(self.player_o),
             "board": self.board,
             "current_turn": str(self.current_turn),
+            "version": self.version + 1,
         }
         game_data = lib.serialize(game_data)
         return f"```{game_data}\nTic Tac Toe\n```"
@@ -277,6 +294,7 @@ class TicTacToeGame:
                 current_turn=hikari.Snowflake(dict_data["current_turn"]),
             )
             game.board = dict_data["board"]
+            game.version = dict_data.get("version", 0)
             return game
         except Exception:
             return None
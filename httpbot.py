@@ -0,0 +1,219 @@
+import asyncio
+import contextvars
+import os
+import time
+
+import hikari
+
+import lib
+
+# Discord needs the HTTP answer within 3 seconds, anything slower is deferred
+RESPONSE_TIMEOUT = 2.5
+
+_DEFERRED_TYPES = (
+    hikari.ResponseType.DEFERRED_MESSAGE_CREATE,
+    hikari.ResponseType.DEFERRED_MESSAGE_UPDATE,
+)
+
+
+def max_request_age() -> int:
+    # seconds a signed request stays valid, older ones are rejected as replays
+    return int(os.getenv("HTTP_MAX_REQUEST_AGE", "300"))
+
+
+class CapturedResponse:
+    def __init__(self, interaction_id: int) -> None:
+        self.interaction_id = interaction_id
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        # set once the HTTP request was answered without the listener's response
+        self.deferred = False
+
+
+_captured: contextvars.ContextVar[CapturedResponse | None] = contextvars.ContextVar(
+    "_captured", default=None
+)
+
+
+class CapturingRest:
+    """`bot.rest` for the games: the initial response becomes the HTTP reply."""
+
+    def __init__(self, rest) -> None:
+        self.rest = rest
+
+    def __getattr__(self, name: str):
+        return getattr(self.rest, name)
+
+    async def create_interaction_response(
+        self, interaction, token, response_type, content=hikari.UNDEFINED, **kwargs
+    ) -> None:
+        captured = _captured.get()
+        interaction_id = getattr(interaction, "id", interaction)
+        if captured is None or captured.interaction_id != interaction_id:
+            await self.rest.create_interaction_response(
+                interaction, token, response_type, content, **kwargs
+            )
+            return
+        if not captured.future.done():
+            kwargs["content"] = content
+            captured.future.set_result((hikari.ResponseType(response_type), kwargs))
+            return
+        if captured.deferred:
+            # the request was already acknowledged, deliver the response as an edit
+            await self.deliver_late(interaction, token, response_type, content, kwargs)
+            return
+        raise RuntimeError("Interaction has already been responded to.")
+
+    async def deliver_late(
+        self, interaction, token, response_type, content, kwargs: dict
+    ) -> None:
+        if response_type == hikari.ResponseType.MESSAGE_UPDATE:
+            kwargs.pop("flags", None)
+            await self.rest.edit_initial_response(
+                interaction.application_id, token, content, **kwargs
+            )
+        elif response_type == hikari.ResponseType.MESSAGE_CREATE:
+            await self.rest.execute_webhook(
+                interaction.application_id, token, content, **kwargs
+            )
+
+
+def _log_failure(task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        lib.LOGGER.error("Interaction listener failed", exc_info=task.exception())
+
+
+class InteractionBot:
+    """Just enough of `hikari.GatewayBot` for the games' setup(), fed by HTTP."""
+
+    def __init__(self, rest) -> None:
+        self.rest = CapturingRest(rest)
+        self.listeners: list = []
+        # listeners still running after their response went out
+        self.background_tasks: set[asyncio.Future] = set()
+
+    def listen(self, event_type: type | None = None):
+        def decorator(callback):
+            self.listeners.append(callback)
+            return callback
+
+        return decorator
+
+    def subscribe(self, event_type: type, callback) -> None:
+        self.listeners.append(callback)
+
+    async def respond(
+        self, interaction: hikari.ComponentInteraction
+    ) -> tuple[hikari.ResponseType, dict] | None:
+        # run every listener like the gateway would, return the first response one makes
+        captured = CapturedResponse(interaction.id)
+        reset_token = _captured.set(captured)
+        try:
+            event = hikari.InteractionCreateEvent(shard=None, interaction=interaction)
+            task = asyncio.gather(*(callback(event) for callback in self.listeners))
+        finally:
+            _captured.reset(reset_token)
+        await asyncio.wait(
+            {task, captured.future},
+            timeout=RESPONSE_TIMEOUT,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        if not task.done():
+            self.background_tasks.add(task)
+            task.add_done_callback(self.background_tasks.discard)
+            task.add_done_callback(_log_failure)
+        elif task.exception() is not None:
+            _log_failure(task)
+        if captured.future.done():
+            return captured.future.result()
+        captured.deferred = True
+        captured.future.cancel()
+        return None
+
+
+def _as_list(value):
+    if value is None or value is hikari.UNDEFINED:
+        return hikari.UNDEFINED
+    return list(value)
+
+
+def build_response(
+    response: tuple[hikari.ResponseType, dict] | None,
+) -> hikari.api.InteractionResponseBuilder:
+    if response is None:
+        # nothing answered (yet), acknowledge without touching the message
+        return hikari.impl.InteractionDeferredBuilder(
+            hikari.ResponseType.DEFERRED_MESSAGE_UPDATE
+        )
+    response_type, kwargs = response
+    if response_type in _DEFERRED_TYPES:
+        return hikari.impl.InteractionDeferredBuilder(
+            response_type, flags=kwargs.get("flags", hikari.UNDEFINED)
+        )
+    embeds = kwargs.get("embeds", hikari.UNDEFINED)
+    if kwargs.get("embed", hikari.UNDEFINED) is not hikari.UNDEFINED:
+        embeds = [kwargs["embed"]]
+    components = kwargs.get("components", hikari.UNDEFINED)
+    if kwargs.get("component", hikari.UNDEFINED) is not hikari.UNDEFINED:
+        components = [kwargs["component"]]
+    return hikari.impl.InteractionMessageBuilder(
+        response_type,
+        kwargs.get("content", hikari.UNDEFINED),
+        components=_as_list(components),
+        embeds=_as_list(embeds),
+        flags=kwargs.get("flags", hikari.UNDEFINED),
+        mentions_everyone=kwargs.get("mentions_everyone", hikari.UNDEFINED),
+        user_mentions=kwargs.get("user_mentions", hikari.UNDEFINED),
+        role_mentions=kwargs.get("role_mentions", hikari.UNDEFINED),
+    )
+
+
+class RejectedRequest:
+    # implements hikari.api.Response for requests turned away before verification
+    def __init__(self, status_code: int, message: str) -> None:
+        self.status_code = status_code
+        # aiohttp_hook passes these on as the response's Content-Type
+        self.content_type = "text/plain"
+        self.charset = "UTF-8"
+        self.headers = None
+        self.payload = message.encode()
+        self.files = ()
+
+
+def precheck(body: bytes, signature: bytes, timestamp: bytes) -> RejectedRequest | None:
+    # cheap checks, so malformed and replayed requests never reach ed25519 or json
+    if len(body) == 0:
+        return RejectedRequest(400, "Empty request body")
+    if len(signature) != 64:
+        return RejectedRequest(401, "Invalid request signature")
+    try:
+        sent = int(timestamp)
+    except ValueError:
+        return RejectedRequest(400, "Invalid request timestamp")
+    if abs(time.time() - sent) > max_request_age():
+        return RejectedRequest(401, "Request timestamp out of range")
+    return None
+
+
+# the body hikari's InteractionServer rejects a failed ed25519 check with
+INVALID_SIGNATURE = b"Invalid request signature"
+
+
+class FastPathInteractionServer(hikari.impl.InteractionServer):
+    __slots__ = ()
+
+    async def on_interaction(
+        self, body: bytes, signature: bytes, timestamp: bytes
+    ) -> hikari.api.Response:
+        rejected = precheck(body, signature, timestamp)
+        if rejected is not None:
+            return rejected
+        response = await super().on_interaction(body, signature, timestamp)
+        if response.status_code == 400 and response.payload == INVALID_SIGNATURE:
+            # hikari answers a forged signature with a 400, discord expects a 401
+            return RejectedRequest(401, "Invalid request signature")
+        return response
+
+
+def install_fast_path(bot: hikari.RESTBot) -> None:
+    # RESTBot builds its own server, adding no slots keeps the layout swappable
+    bot.interaction_server.__class__ = FastPathInteractionServer
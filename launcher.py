@@ -0,0 +1,129 @@
+import argparse
+import logging
+import os
+import secrets
+import subprocess
+import sys
+import time
+from multiprocessing.connection import Client
+
+import dbwriter
+
+LOGGER = logging.getLogger("quiggle-games-pro")
+
+
+def shard_ranges(shard_count: int, workers: int) -> list[list[int]]:
+    # contiguous, as even as possible: 10 shards over 4 workers is 3, 3, 2, 2
+    ranges = []
+    start = 0
+    for index in range(workers):
+        size = shard_count // workers + (1 if index < shard_count % workers else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return [shard_ids for shard_ids in ranges if len(shard_ids) > 0]
+
+
+def wait_for_writer(address: str, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            Client(
+                dbwriter.parse_address(address), authkey=dbwriter.db_authkey()
+            ).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def stop(processes: list[subprocess.Popen]) -> None:
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Run main.py as sharded workers around one database writer.",
+        epilog="Unknown arguments (--prod, --metrics, ...) are passed to every worker.",
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--shard-count", type=int, default=None, help="defaults to one per worker"
+    )
+    parser.add_argument(
+        "--address",
+        default=dbwriter.db_address() or "127.0.0.1:9109",
+        help="host:port or unix socket path of the database writer",
+    )
+    parser.add_argument("--db", default="elo_ratings.db")
+    parser.add_argument(
+        "--stub",
+        action="store_true",
+        help="run loadtest.py in each worker instead of connecting to the gateway",
+    )
+    args, extra = parser.parse_known_args()
+    logging.basicConfig(level=logging.INFO)
+
+    env = dict(os.environ)
+    env["ELO_DB_ADDRESS"] = args.address
+    # a fresh key per launch, so only our own workers can talk to the writer
+    env["ELO_DB_AUTHKEY"] = os.getenv("ELO_DB_AUTHKEY") or secrets.token_hex(16)
+    os.environ["ELO_DB_AUTHKEY"] = env["ELO_DB_AUTHKEY"]
+
+    writer = subprocess.Popen(
+        [sys.executable, "dbwriter.py", "--address", args.address, "--db", args.db],
+        env=env,
+    )
+    processes = [writer]
+    try:
+        wait_for_writer(args.address)
+        shard_count = args.shard_count or args.workers
+        metrics_port = int(os.getenv("METRICS_PORT", "9108"))
+        workers = []
+        for index, shard_ids in enumerate(shard_ranges(shard_count, args.workers)):
+            worker_env = dict(env)
+            # one metrics endpoint per worker
+            worker_env["METRICS_PORT"] = str(metrics_port + index)
+            if args.stub:
+                command = [sys.executable, "loadtest.py", "--seed", str(index)]
+            else:
+                command = [
+                    sys.executable,
+                    "main.py",
+                    "--shard-ids",
+                    ",".join(str(shard_id) for shard_id in shard_ids),
+                    "--shard-count",
+                    str(shard_count),
+                ]
+            LOGGER.info(f"Starting worker {index} for shards {shard_ids}")
+            workers.append(subprocess.Popen(command + extra, env=worker_env))
+            processes.append(workers[-1])
+
+        if args.stub:
+            return max(worker.wait() for worker in workers)
+        # a dead worker leaves its shards offline, stop everything so it gets noticed
+        while True:
+            for index, worker in enumerate(workers):
+                code = worker.poll()
+                if code is not None:
+                    LOGGER.error(f"Worker {index} exited with {code}, shutting down")
+                    return code or 1
+            if writer.poll() is not None:
+                LOGGER.error("Database writer exited, shutting down")
+                return writer.returncode or 1
+            time.sleep(1)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        stop(processes[::-1])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
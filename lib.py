@@ -1,3 +1,5 @@
+import asyncio
+import collections
 import os
 from attr import dataclass
 import hikari
@@ -7,6 +9,18 @@ import json
 import sys
 import datetime
 import logging
+import metrics
+import contextlib
+import contextvars
+import functools
+import hashlib
+import importlib
+import importlib.util
+import threading
+import re
+import string
+import time
+from typing import Callable, Iterable, TypeVar
 
 LOGGER = logging.getLogger("quiggle-games-pro")
 
@@ -26,6 +40,8 @@ class GameInvite:
         self.target_game_display_name = game_display_name
         self.game_name = "Invitation"
         self.options = options or {}
+        # incremented with every header written, see MessageLocks
+        self.version = 0
 
     @staticmethod
     def from_header(content: str) -> "GameInvite | None":
@@ -47,13 +63,15 @@ class GameInvite:
                 invited = None
             if invited is not None:
                 invited = hikari.Snowflake(invited)
-            return GameInvite(
+            invite = GameInvite(
                 inviter_id=hikari.Snowflake(dict_data["inviter_id"]),
                 invited_id=invited,
                 game_name=target_game_name,
                 game_display_name=dict_data.get("game_display_name", target_game_name),
                 options=dict_data.get("options"),
             )
+            invite.version = dict_data.get("version", 0)
+            return invite
         except Exception as e:
             # print(f"Error deserializing GameInvite from header: {e}")
             return None
@@ -64,6 +82,7 @@ class GameInvite:
             "invited_id": str(self.invited_id),
             "game_display_name": self.target_game_display_name,
             "options": self.options,
+            "version": self.version + 1,
         }
         serialized_data = serialize(data)
         header = f"```{serialized_data}\n{self.target_game_name}\n```"
@@ -101,16 +120,17 @@ class GameInvite:
     async def handle_interaction(
         self, event: hikari.InteractionCreateEvent, bot: hikari.GatewayBot
     ) -> bool:
+        # a second click on an open invite must not start a second game
+        if await reject_stale(bot, event.interaction, self.version):
+            return False
         if (
             event.interaction.user.id == self.inviter_id
             and event.interaction.user.id not in admins()
         ):
-            await bot.rest.create_interaction_response(
+            await send_message(
+                bot,
                 event.interaction,
-                event.interaction.token,
-                hikari.ResponseType.MESSAGE_CREATE,
                 "You cannot accept or decline your own game invite.",
-                flags=hikari.MessageFlag.EPHEMERAL,
             )
             return False
         if self.invited_id is not None:
@@ -118,12 +138,8 @@ class GameInvite:
                 event.interaction.user.id != self.invited_id
                 and event.interaction.user.id not in admins()
             ):
-                await bot.rest.create_interaction_response(
-                    event.interaction,
-                    event.interaction.token,
-                    hikari.ResponseType.MESSAGE_CREATE,
-                    "You are not invited to this game.",
-                    flags=hikari.MessageFlag.EPHEMERAL,
+                await send_message(
+                    bot, event.interaction, "You are not invited to this game."
                 )
                 return False
         else:
@@ -138,26 +154,25 @@ class GameInvite:
 
             message = event.interaction.message
             if message is not None:
-                await bot.rest.create_interaction_response(
+                await update_message(
+                    bot,
                     event.interaction,
-                    event.interaction.token,
-                    hikari.ResponseType.MESSAGE_UPDATE,
-                    "The game invite has been declined.",
-                    components=[],
-                    embeds=message.embeds,
+                    render=lambda: {
+                        "content": "The game invite has been declined.",
+                        "components": [],
+                        "embeds": message.embeds,
+                    },
                 )
             return False
-        await bot.rest.create_interaction_response(
-            event.interaction,
-            event.interaction.token,
-            hikari.ResponseType.MESSAGE_CREATE,
-            "Unknown interaction.",
-            flags=hikari.MessageFlag.EPHEMERAL,
-        )
+        await send_message(bot, event.interaction, "Unknown interaction.")
         return False
 
 
 def serialize(data: dict) -> str:
+    slot = _current_slot.get()
+    if slot is not None and "version" in data:
+        # the version this click is about to write, recorded once the update succeeds
+        slot.pending = data["version"]
 
     json_data = json.dumps(data).encode("utf-8")
     compressed_data = zlib.compress(json_data)
@@ -192,6 +207,25 @@ def header_name(content: str) -> str | None:
         return None
 
 
+# finished games keep their moves under "<game name> Replay", which no game listens to
+REPLAY_SUFFIX = " Replay"
+
+
+def replay_header(game_name: str, data: dict) -> str:
+    return f"```{serialize(data)}\n{game_name}{REPLAY_SUFFIX}\n```"
+
+
+def replay_data(content: str) -> tuple[str, dict] | None:
+    # (game name, data) of a finished game's replay header
+    name = header_name(content)
+    if name is None or not name.endswith(REPLAY_SUFFIX):
+        return None
+    data = deserialize(extract_header(content)[3:-3].strip().splitlines()[0])
+    if data is None:
+        return None
+    return name[: -len(REPLAY_SUFFIX)], data
+
+
 def extract_header(content: str) -> str | None:
 
     if content.startswith("```") and "```" in content[3:]:
@@ -241,19 +275,78 @@ class RefreshMessage:
 
 def number_emoji(n: int) -> str:
 
-    return application_emoji(str(n))
+    return application_emoji(number_tile(n))
 
 
 def letter_emoji(n: int) -> str:
 
-    return application_emoji(str(chr(64 + n)))
+    return application_emoji(letter_tile(n))
+
+
+# a board as rows of emoji names, drawn as emojis here or as an image by render.py
+def number_tile(n: int) -> str:
+    return f"{n}_"
+
+
+def letter_tile(n: int) -> str:
+    return f"{chr(64 + n)}_"
+
+
+def emoji_grid(tiles: list[list[str]]) -> str:
+    return "\n".join("".join(application_emoji(name) for name in row) for row in tiles)
+
+
+def tiles_to_emoji(tiles: list[list[str]]) -> str:
+    # memory only, building the grid is cheaper than reading a file back
+    return render_cache.get(
+        render_key("emoji", tiles, emoji_map_digest), lambda: emoji_grid(tiles)
+    )
 
 
 application_emojis = {}
+# identifies the emoji map in render cache keys, emoji grids change along with it
+emoji_map_digest = ""
+
+# Discord finds a custom emoji by its id, the name in <:name:id> only has to be
+# 2 to 32 word characters. boards send 64+ of them per update, so every emoji
+# is referenced by a 2 character alias instead of names like wKg_danger
+ALIAS_ALPHABET = string.digits + string.ascii_uppercase + string.ascii_lowercase
+EMOJI_REFERENCE = re.compile(r"<(a?):(\w+):(\d+)>")
+
+
+def emoji_aliases(names: Iterable[str]) -> dict[str, str]:
+    # the alias comes from a hash of the name, a taken one moves on to the next
+    # free slot. names go in sorted order so the same set always gets the same
+    # aliases, in every process and across restarts
+    slots = len(ALIAS_ALPHABET) ** 2
+    taken = set()
+    aliases = {}
+    for name in sorted(names):
+        digest = hashlib.blake2b(name.encode("utf-8"), digest_size=4).digest()
+        slot = int.from_bytes(digest, "big") % slots
+        while slot in taken:
+            slot = (slot + 1) % slots
+        taken.add(slot)
+        high, low = divmod(slot, len(ALIAS_ALPHABET))
+        aliases[name] = ALIAS_ALPHABET[high] + ALIAS_ALPHABET[low]
+    return aliases
+
+
+def shorten_emojis(emojis: dict[str, str]) -> dict[str, str]:
+    aliases = emoji_aliases(emojis)
+    shortened = {}
+    for name, emoji in emojis.items():
+        match = EMOJI_REFERENCE.fullmatch(emoji)
+        if match is None:
+            shortened[name] = emoji
+            continue
+        animated, _, emoji_id = match.groups()
+        shortened[name] = f"<{animated}:{aliases[name]}:{emoji_id}>"
+    return shortened
 
 
 def set_application_emojis(emojis: dict[str, str]) -> None:
-    global application_emojis
+    global application_emojis, emoji_map_digest
     emojis_str = "Application emojis set: "
     # print(f"Application emojis set: ", end="")
     first = True
@@ -263,7 +356,35 @@ def set_application_emojis(emojis: dict[str, str]) -> None:
         emojis_str += f"{', ' if not first else ''}{key}"
         first = False
     LOGGER.info(emojis_str)
-    application_emojis = emojis
+    application_emojis = shorten_emojis(emojis)
+    emoji_map_digest = hashlib.blake2b(
+        json.dumps(application_emojis, sort_keys=True).encode("utf-8"), digest_size=8
+    ).hexdigest()
+    # templates hold parsed emojis, rebuild them with the new map
+    _component_templates.clear()
+
+
+def emoji_cache_path() -> str:
+    return os.getenv("EMOJI_CACHE_PATH", "emoji_cache.json")
+
+
+def load_emoji_cache() -> bool:
+    # the last known emoji map, so renders work before the REST fetch comes back
+    try:
+        with open(emoji_cache_path(), encoding="utf-8") as f:
+            emojis = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        LOGGER.info(f"No usable emoji cache at {emoji_cache_path()}: {e}")
+        return False
+    set_application_emojis(emojis)
+    return True
+
+
+def save_emoji_cache(emojis: dict[str, str]) -> None:
+    path = emoji_cache_path()
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(emojis, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
 
 
 def application_emoji(name: str) -> str:
@@ -271,10 +392,172 @@ def application_emoji(name: str) -> str:
         name = f"{name}_"
     emoji = application_emojis.get(name)
     if emoji is not None:
+        metrics.cache_requests.inc("emoji", "hit")
         return emoji
+    metrics.cache_requests.inc("emoji", "miss")
     return fallback(name)
 
 
+_component_templates: dict[tuple, list] = {}
+
+
+def component_template(key: tuple, build: Callable[[], list]) -> list:
+    # prebuilt component rows, keyed on the few state bits that change them
+    rows = _component_templates.get(key)
+    if rows is None:
+        metrics.cache_requests.inc("components", "miss")
+        rows = build()
+        _component_templates[key] = rows
+    else:
+        metrics.cache_requests.inc("components", "hit")
+    # a fresh list so callers can append rows, the builders themselves are shared
+    return list(rows)
+
+
+def render_key(mode: str, tiles: list[list[str]], *parts: object) -> str:
+    # the tiles already spell out the game, position and highlights
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(mode.encode("utf-8"))
+    for part in parts:
+        digest.update(f"\0{part}".encode("utf-8"))
+    for row in tiles:
+        digest.update(("\n" + " ".join(row)).encode("utf-8"))
+    return digest.hexdigest()
+
+
+Rendered = TypeVar("Rendered", str, bytes)
+
+
+class RenderCache:
+    # rendered boards by content hash. an LRU in memory bounded by size, and for
+    # the expensive renders a directory of files that every process can share,
+    # trimmed oldest first once it grows past disk_bytes
+    def __init__(self, memory_bytes: int, directory: str, disk_bytes: int) -> None:
+        self.memory_bytes = memory_bytes
+        self.directory = directory
+        self.disk_bytes = disk_bytes
+        # renders happen on executor threads
+        self.lock = threading.Lock()
+        self.memory: collections.OrderedDict[str, str | bytes] = (
+            collections.OrderedDict()
+        )
+        self.memory_used = 0
+        # file name -> size, least recently used first, read from disk on first use
+        self.disk: collections.OrderedDict[str, int] | None = None
+        self.disk_used = 0
+
+    def get(
+        self, key: str, build: Callable[[], Rendered], *, disk: bool = False
+    ) -> Rendered:
+        value = self.lookup(key, disk=disk)
+        if value is None:
+            value = build()
+            self.store(key, value, disk=disk)
+        return value
+
+    def lookup(self, key: str, *, disk: bool = False) -> str | bytes | None:
+        with self.lock:
+            value = self.memory.get(key)
+            if value is not None:
+                self.memory.move_to_end(key)
+        if value is not None:
+            metrics.cache_requests.inc("render", "hit")
+            return value
+        metrics.cache_requests.inc("render", "miss")
+        if disk and self.directory != "":
+            value = self.read(key)
+            metrics.cache_requests.inc(
+                "render_disk", "miss" if value is None else "hit"
+            )
+            if value is not None:
+                self.remember(key, value)
+        return value
+
+    def store(self, key: str, value: str | bytes, *, disk: bool = False) -> None:
+        if disk and self.directory != "":
+            self.write(key, value)
+        self.remember(key, value)
+
+    def remember(self, key: str, value: str | bytes) -> None:
+        with self.lock:
+            if key in self.memory:
+                return
+            self.memory[key] = value
+            self.memory_used += len(value)
+            while self.memory_used > self.memory_bytes and len(self.memory) > 1:
+                _, dropped = self.memory.popitem(last=False)
+                self.memory_used -= len(dropped)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def load_index(self) -> collections.OrderedDict[str, int]:
+        # caller holds the lock
+        if self.disk is None:
+            files = []
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if name.endswith(".tmp"):
+                        # another process is still writing it, or crashed doing so
+                        continue
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, name, stat.st_size))
+            files.sort()
+            self.disk = collections.OrderedDict((name, size) for _, name, size in files)
+            self.disk_used = sum(self.disk.values())
+        return self.disk
+
+    def read(self, key: str) -> bytes | None:
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                value = f.read()
+            # the mtime is the recency other processes see when they trim
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            LOGGER.warning(f"Could not read render cache entry {key}: {e}")
+            return None
+        with self.lock:
+            index = self.load_index()
+            if key in index:
+                index.move_to_end(key)
+        return value
+
+    def write(self, key: str, value: bytes) -> None:
+        path = self.path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # the directory is shared between processes, thread ids are not unique
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(value)
+            os.replace(temporary, path)
+        except OSError as e:
+            LOGGER.warning(f"Could not write render cache entry {key}: {e}")
+            return
+        with self.lock:
+            index = self.load_index()
+            self.disk_used += len(value) - index.pop(key, 0)
+            index[key] = len(value)
+            while self.disk_used > self.disk_bytes and len(index) > 1:
+                name, size = index.popitem(last=False)
+                self.disk_used -= size
+                with contextlib.suppress(OSError):
+                    os.remove(self.path(name))
+
+
+render_cache = RenderCache(
+    int(os.getenv("RENDER_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024))),
+    os.getenv("RENDER_CACHE_DIR", "render_cache"),
+    int(os.getenv("RENDER_CACHE_DISK_BYTES", str(256 * 1024 * 1024))),
+)
+
+
 game_names = {}
 
 
@@ -288,11 +571,260 @@ def get_game_name(game_code: str) -> str:
     return game_names.get(game_code, "Unknown Game")
 
 
+def game_code(name: str | None) -> str:
+    # "Connect Four" -> "connectfour", the same key the games and elo tables use
+    if name is None:
+        return "other"
+    return name.lower().replace(" ", "")
+
+
+def response_budget() -> float:
+    # seconds a click may take before it gets a deferred update, 0 disables
+    return int(os.getenv("RESPONSE_BUDGET_MS", "1500")) / 1000
+
+
+_current_deferral: contextvars.ContextVar["Deferral | None"] = contextvars.ContextVar(
+    "_current_deferral", default=None
+)
+
+
+class Deferral:
+    # acknowledges the interaction if the handler has not responded within the budget
+    def __init__(
+        self,
+        bot: hikari.GatewayBot,
+        interaction: hikari.ComponentInteraction,
+        game: str,
+    ) -> None:
+        self.bot = bot
+        self.interaction = interaction
+        self.game = game
+        self.responded = False
+        # the DEFERRED_MESSAGE_UPDATE, once the budget ran out
+        self.ack: asyncio.Task | None = None
+        self.timer: asyncio.TimerHandle | None = None
+
+    async def __aenter__(self) -> "Deferral":
+        self.token = _current_deferral.set(self)
+        if response_budget() > 0:
+            self.timer = asyncio.get_running_loop().call_later(
+                response_budget(), self.expire
+            )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+        _current_deferral.reset(self.token)
+        if self.ack is not None:
+            await self.ack
+
+    def expire(self) -> None:
+        if self.responded:
+            return
+        self.responded = True
+        metrics.deferred_responses.inc(self.game)
+        LOGGER.info(f"Deferring {self.game} interaction {self.interaction.id}")
+        self.ack = asyncio.ensure_future(
+            self.bot.rest.create_interaction_response(
+                self.interaction,
+                self.interaction.token,
+                hikari.ResponseType.DEFERRED_MESSAGE_UPDATE,
+            )
+        )
+
+    async def claim(self) -> bool:
+        # True if the caller still owns the initial response, False if it was deferred
+        if self.ack is None:
+            self.responded = True
+            return True
+        await self.ack
+        return False
+
+
+def deferral(
+    bot: hikari.GatewayBot, interaction: hikari.ComponentInteraction, game: str
+) -> Deferral:
+    return Deferral(bot, interaction, game)
+
+
+class MessageSlot:
+    __slots__ = ("lock", "version", "pending", "finished", "users")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        # last header version this process wrote to the message
+        self.version: int | None = None
+        self.pending: int | None = None
+        # the message was last updated without a live game header (a finished
+        # game's replay header, a declined invite), no click on it can continue
+        self.finished = False
+        self.users = 0
+
+
+_current_slot: contextvars.ContextVar[MessageSlot | None] = contextvars.ContextVar(
+    "_current_slot", default=None
+)
+
+
+class MessageLocks:
+    # clicks on the same message run one at a time, least recently used slots are
+    # dropped once there are more than max_size (never one that is held or awaited)
+    def __init__(self, max_size: int = 10000) -> None:
+        self.max_size = max_size
+        self.slots: collections.OrderedDict[int, MessageSlot] = (
+            collections.OrderedDict()
+        )
+
+    @contextlib.asynccontextmanager
+    async def hold(self, message_id: int):
+        slot = self.slots.get(message_id)
+        if slot is None:
+            slot = MessageSlot()
+            self.slots[message_id] = slot
+            self.evict()
+        else:
+            self.slots.move_to_end(message_id)
+        slot.users += 1
+        try:
+            async with slot.lock:
+                token = _current_slot.set(slot)
+                try:
+                    yield slot
+                finally:
+                    slot.pending = None
+                    _current_slot.reset(token)
+        finally:
+            slot.users -= 1
+
+    def evict(self) -> None:
+        while len(self.slots) > self.max_size:
+            for message_id, slot in self.slots.items():
+                if slot.users == 0:
+                    del self.slots[message_id]
+                    break
+            else:
+                return
+
+
+message_locks = MessageLocks(int(os.getenv("MESSAGE_LOCKS_MAX", "10000")))
+
+
+async def reject_stale(
+    bot: hikari.GatewayBot, interaction: hikari.ComponentInteraction, version: int
+) -> bool:
+    # the click was made on a header older than one we already replaced it with
+    slot = _current_slot.get()
+    if slot is None:
+        return False
+    if slot.finished:
+        metrics.stale_clicks.inc()
+        await send_message(bot, interaction, "This game is already over.")
+        return True
+    if slot.version is None or version >= slot.version:
+        return False
+    metrics.stale_clicks.inc()
+    await send_message(
+        bot, interaction, "Someone else just updated this game, please try again."
+    )
+    return True
+
+
+async def offload(func: Callable, *args, **kwargs):
+    # game logic runs in a thread so the event loop stays free to send the deferral
+    if response_budget() <= 0:
+        return func(*args, **kwargs)
+    return await asyncio.to_thread(func, *args, **kwargs)
+
+
+async def update_message(
+    bot: hikari.GatewayBot,
+    interaction: hikari.ComponentInteraction,
+    *,
+    render: Callable[[], dict],
+) -> None:
+    # render is called here (and not by the caller) so its time is measured apart from the REST call
+    with span("render"):
+        kwargs = await offload(render)
+    deferral = _current_deferral.get()
+    with span("rest"):
+        if deferral is not None and not await deferral.claim():
+            await bot.rest.edit_initial_response(
+                interaction.application_id, interaction.token, **kwargs
+            )
+        else:
+            await bot.rest.create_interaction_response(
+                interaction=interaction,
+                response_type=hikari.ResponseType.MESSAGE_UPDATE,
+                token=interaction.token,
+                **kwargs,
+            )
+    slot = _current_slot.get()
+    if slot is not None:
+        if slot.pending is not None:
+            slot.version = slot.pending
+        else:
+            slot.finished = True
+
+
+async def send_message(
+    bot: hikari.GatewayBot,
+    interaction: hikari.ComponentInteraction,
+    content: str,
+    *,
+    ephemeral: bool = True,
+) -> None:
+    flags = hikari.MessageFlag.EPHEMERAL if ephemeral else hikari.MessageFlag.NONE
+    deferral = _current_deferral.get()
+    if deferral is not None and not await deferral.claim():
+        # after a deferred update a new message can only be a followup
+        await bot.rest.execute_webhook(
+            interaction.application_id, interaction.token, content, flags=flags
+        )
+        return
+    await bot.rest.create_interaction_response(
+        interaction,
+        interaction.token,
+        hikari.ResponseType.MESSAGE_CREATE,
+        content,
+        flags=flags,
+    )
+
+
 def fallback(name: str) -> str:
     LOGGER.warning(f"Falling back for emoji: {name}")
     return "❌"
 
 
+def lazy_import(name: str):
+    # with --lazy the module body only runs on first attribute access
+    if name in sys.modules:
+        # import_module would touch the module's attributes and load a lazy one
+        return sys.modules[name]
+    if "--lazy" not in sys.argv:
+        return importlib.import_module(name)
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+@contextlib.contextmanager
+def startup_phase(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        LOGGER.info(
+            f"Startup phase {name} took {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+
+
 def get_username(user: hikari.User) -> str:
     # get the pretty username of the user, otherwise fall back to their full actual username
     return user.global_name or user.username
@@ -307,3 +839,129 @@ def donation_logo_url() -> str:
         "DONATION_LOGO_URL",
         "https://storage.ko-fi.com/cdn/kofi3.png?v=2",
     )
+
+
+# tracing: one Trace per handled click, spans nest inside it through a contextvar.
+# spans always feed metrics.phase_seconds; the span list is only kept with --trace.
+tracing_enabled = "--trace" in sys.argv
+
+_current_trace: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar(
+    "quiggle_trace", default=None
+)
+
+
+def slow_trace_threshold() -> float:
+    return float(os.getenv("TRACE_SLOW_MS", "250")) / 1000
+
+
+def trace_file() -> str | None:
+    return os.getenv("TRACE_FILE")
+
+
+class Trace:
+    __slots__ = ("game", "label", "start", "depth", "spans", "token")
+
+    def __init__(self, game: str, label: str) -> None:
+        self.game = game
+        self.label = label
+        self.depth = 0
+        # (name, offset from trace start, duration, depth)
+        self.spans: list[tuple[str, float, float, int]] | None = (
+            [] if tracing_enabled else None
+        )
+
+    def __enter__(self) -> "Trace":
+        self.token = _current_trace.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        elapsed = time.perf_counter() - self.start
+        _current_trace.reset(self.token)
+        metrics.phase_seconds.observe(elapsed, self.game, "total")
+        if self.spans is not None and elapsed >= slow_trace_threshold():
+            report_slow_trace(self, elapsed)
+        return False
+
+
+class _Span:
+    __slots__ = ("name", "start", "trace")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.trace = _current_trace.get()
+        if self.trace is not None:
+            self.trace.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        elapsed = time.perf_counter() - self.start
+        trace = self.trace
+        if trace is None:
+            return False
+        trace.depth -= 1
+        metrics.phase_seconds.observe(elapsed, trace.game, self.name)
+        if trace.spans is not None:
+            trace.spans.append(
+                (self.name, self.start - trace.start, elapsed, trace.depth)
+            )
+        return False
+
+
+def trace(game: str, label: str) -> Trace:
+    return Trace(game, label)
+
+
+def span(name: str) -> _Span:
+    return _Span(name)
+
+
+def traced(name: str):
+    # decorator form of span(), for engine methods that are called from inside render lambdas
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def report_slow_trace(trace: Trace, elapsed: float) -> None:
+    # spans are appended as they finish, sort them back into start order for reading
+    spans = sorted(trace.spans, key=lambda s: s[1])
+    breakdown = ", ".join(
+        f"{'  ' * depth}{name}={duration * 1000:.1f}ms"
+        for name, _, duration, depth in spans
+    )
+    LOGGER.warning(
+        f"Slow {trace.game} interaction ({trace.label}): {elapsed * 1000:.1f}ms [{breakdown}]"
+    )
+    path = trace_file()
+    if path is None:
+        return
+    record = {
+        "timestamp": current_timestamp(),
+        "game": trace.game,
+        "label": trace.label,
+        "total_ms": round(elapsed * 1000, 3),
+        "spans": [
+            {
+                "name": name,
+                "offset_ms": round(offset * 1000, 3),
+                "duration_ms": round(duration * 1000, 3),
+                "depth": depth,
+            }
+            for name, offset, duration, depth in spans
+        ],
+    }
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        LOGGER.warning(f"Could not write trace to {path}: {e}")
@@ -0,0 +1,372 @@
+import argparse
+import asyncio
+import datetime
+import importlib
+import itertools
+import os
+import random
+import time
+import types
+
+import hikari
+
+import elo
+import lib
+
+# synthetic snowflakes start here so they never collide with anything real
+_ids = itertools.count(1_000_000_000_000_000_000)
+
+all_games = ["chess", "connectfour", "tictactoe", "rockpaperscissors", "invite"]
+
+
+class FakeRest:
+    """Stands in for `bot.rest`: builds real component builders, records responses."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.calls: list[tuple[str, dict]] = []
+        # latest message content written for each interaction id
+        self.responses: dict[int, dict] = {}
+
+    def build_message_action_row(self) -> hikari.impl.MessageActionRowBuilder:
+        return hikari.impl.MessageActionRowBuilder()
+
+    async def _record(self, method: str, kwargs: dict) -> None:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        self.calls.append((method, kwargs))
+
+    async def create_interaction_response(self, *args, **kwargs) -> None:
+        names = ("interaction", "token", "response_type", "content")
+        for name, value in zip(names, args):
+            kwargs[name] = value
+        await self._record("create_interaction_response", kwargs)
+        if kwargs.get("response_type") == hikari.ResponseType.MESSAGE_UPDATE:
+            self.responses[kwargs["interaction"].id] = kwargs
+
+    async def execute_webhook(
+        self, webhook, token, content=hikari.UNDEFINED, **kwargs
+    ) -> None:
+        kwargs.update(webhook=webhook, token=token, content=content)
+        await self._record("execute_webhook", kwargs)
+
+    async def edit_initial_response(
+        self, application, token, content=hikari.UNDEFINED, **kwargs
+    ) -> None:
+        kwargs.update(application=application, token=token, content=content)
+        await self._record("edit_initial_response", kwargs)
+
+    async def create_message(self, channel, content=hikari.UNDEFINED, **kwargs) -> None:
+        kwargs.update(channel=channel, content=content)
+        await self._record("create_message", kwargs)
+
+
+class FakeBot:
+    """Just enough of `hikari.GatewayBot` for the games' setup() functions."""
+
+    def __init__(self, rest_latency: float = 0.0) -> None:
+        self.rest = FakeRest(rest_latency)
+        self.listeners: dict[type, list] = {}
+
+    def listen(self, event_type: type):
+        def decorator(callback):
+            self.listeners.setdefault(event_type, []).append(callback)
+            return callback
+
+        return decorator
+
+    def subscribe(self, event_type: type, callback) -> None:
+        self.listeners.setdefault(event_type, []).append(callback)
+
+    async def dispatch(self, event) -> None:
+        # hikari runs every listener of an event concurrently, and so do we
+        await asyncio.gather(
+            *(callback(event) for callback in self.listeners.get(type(event), []))
+        )
+
+
+class FakeClient:
+    # commands are never invoked by the harness, registering them is a no-op
+    def register(self, *args, **kwargs):
+        def decorator(command):
+            return command
+
+        return decorator
+
+
+def synthetic_user(user_id: int) -> types.SimpleNamespace:
+    return types.SimpleNamespace(
+        id=hikari.Snowflake(user_id),
+        is_bot=False,
+        username=f"user{user_id % 10000}",
+        global_name=None,
+        display_avatar_url=None,
+        default_avatar_url="https://cdn.discordapp.com/embed/avatars/0.png",
+    )
+
+
+def synthetic_event(
+    content: str,
+    custom_id: str,
+    user_id: int,
+    *,
+    message_id: int | None = None,
+    values: list[str] | None = None,
+) -> hikari.InteractionCreateEvent:
+    interaction = types.SimpleNamespace(
+        id=hikari.Snowflake(next(_ids)),
+        application_id=hikari.Snowflake(1),
+        token=f"token-{next(_ids)}",
+        custom_id=custom_id,
+        values=values or [],
+        user=synthetic_user(user_id),
+        channel_id=hikari.Snowflake(2),
+        guild_id=hikari.Snowflake(3),
+        created_at=datetime.datetime.now(datetime.timezone.utc),
+        message=types.SimpleNamespace(
+            id=hikari.Snowflake(message_id or next(_ids)),
+            content=content,
+            embeds=[],
+        ),
+    )
+    return hikari.InteractionCreateEvent(shard=None, interaction=interaction)
+
+
+def synthetic_emojis() -> dict[str, str]:
+    # every tile under assets/ plus the ones only ever uploaded by hand
+    emojis = {}
+    for root, _, files in os.walk("assets"):
+        for filename in files:
+            if filename.endswith(".png"):
+                name = filename[:-4]
+                emojis[name] = f"<:{name}:{next(_ids)}>"
+    for name in ["blank", "quiggle"]:
+        emojis.setdefault(name, f"<:{name}:{next(_ids)}>")
+    return emojis
+
+
+class Table:
+    """One game message being clicked on, with the two players sitting at it."""
+
+    def __init__(self, game: str, rng: random.Random) -> None:
+        self.game = game
+        self.rng = rng
+        self.message_id = next(_ids)
+        self.player_1 = hikari.Snowflake(next(_ids))
+        self.player_2 = hikari.Snowflake(next(_ids))
+        self.stalls = 0
+        self.content = self.start_content()
+
+    def start_content(self) -> str:
+        match self.game:
+            case "chess":
+                from games.chess import ChessGame, valid_chess_variants
+
+                variant = self.rng.choice(list(valid_chess_variants.keys()))
+                game = ChessGame(self.player_1, self.player_2, variant=variant)
+                return game.content()
+            case "connectfour":
+                from games.connectfour import ConnectFourGame
+
+                return ConnectFourGame(self.player_1, self.player_2).content()
+            case "tictactoe":
+                from games.tictactoe import TicTacToeGame
+
+                return TicTacToeGame(self.player_1, self.player_2).content()
+            case "rockpaperscissors":
+                from games.rockpaperscissors import Game
+
+                return Game(self.player_1, self.player_2).content()
+            case "invite":
+                target = self.rng.choice(
+                    ["Chess", "Connect Four", "Tic Tac Toe", "Rock Paper Scissors"]
+                )
+                return lib.GameInvite(
+                    self.player_1,
+                    self.player_2 if self.rng.random() < 0.5 else None,
+                    game_name=target,
+                    game_display_name=target,
+                ).content()
+        raise ValueError(f"Unknown game: {self.game}")
+
+    def next_click(self) -> tuple[str, int]:
+        """Picks a realistic (custom_id, user_id) for the current message content."""
+        match self.game:
+            case "chess":
+                from games.chess import ChessGame
+
+                game = ChessGame.from_header(self.content)
+                moves = game.get_moves()
+                if game.selected_piece is None or game.selected_piece not in moves:
+                    return (
+                        f"chess_select_{self.rng.choice(sorted(moves))}",
+                        game.current_turn,
+                    )
+                to_square = self.rng.choice(sorted(moves[game.selected_piece]))
+                if game.next_move_is_promotion():
+                    return f"chess_move_{to_square}_promote_queen", game.current_turn
+                return f"chess_move_{to_square}", game.current_turn
+            case "connectfour":
+                from games.connectfour import ConnectFourGame
+
+                game = ConnectFourGame.from_header(self.content)
+                columns = [c for c in range(7) if game.board[0][c] == " "]
+                return f"c4_move_{self.rng.choice(columns)}", game.current_turn
+            case "tictactoe":
+                from games.tictactoe import TicTacToeGame
+
+                game = TicTacToeGame.from_header(self.content)
+                cells = [
+                    (r, c)
+                    for r in range(3)
+                    for c in range(3)
+                    if game.board[r][c] == " "
+                ]
+                r, c = self.rng.choice(cells)
+                return f"ttt_move_{r}_{c}", game.current_turn
+            case "rockpaperscissors":
+                from games.rockpaperscissors import Game, game_name
+
+                game = Game.from_header(self.content)
+                player = (
+                    game.player_1 if game.player_1_choice is None else game.player_2
+                )
+                return (
+                    f"{game_name()}_move_{self.rng.randrange(3)}",
+                    player,
+                )
+            case "invite":
+                return "invite_accept", self.player_2
+        raise ValueError(f"Unknown game: {self.game}")
+
+    def advance(self, response: dict | None) -> None:
+        # follow the game along, and sit down at a fresh table once it is over
+        if response is None:
+            # an ephemeral reply leaves the message as it was, but don't get stuck on it
+            self.stalls += 1
+            if self.stalls < 3:
+                return
+        self.stalls = 0
+        content = response.get("content") if response is not None else None
+        if (
+            not isinstance(content, str)
+            or lib.header_name(content) is None
+            or lib.replay_data(content) is not None
+            or self.game == "invite"
+            or (self.game == "rockpaperscissors" and self.rng.random() < 0.1)
+        ):
+            self.message_id = next(_ids)
+            self.content = self.start_content()
+            return
+        self.content = content
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if len(samples) == 0:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Harness:
+    def __init__(
+        self,
+        games: list[str],
+        *,
+        bot: FakeBot | None = None,
+        rest_latency: float = 0.0,
+        db_path: str = ":memory:",
+        seed: int = 0,
+    ) -> None:
+        self.games = games
+        self.bot = bot or FakeBot(rest_latency)
+        self.rng = random.Random(seed)
+        self.latencies: dict[str, list[float]] = {game: [] for game in games}
+        self.errors: dict[str, int] = {game: 0 for game in games}
+        self.db = elo.init_db(db_path)
+        lib.set_application_emojis(synthetic_emojis())
+        for filename in sorted(os.listdir("games")):
+            if filename.endswith(".py") and not filename.startswith("__"):
+                code = filename[:-3]
+                module = importlib.import_module(f"games.{code}")
+                module.setup(
+                    self.bot, FakeClient(), elo.EloHandler(db=self.db, game_name=code)
+                )
+
+    async def click(self, table: Table) -> None:
+        custom_id, user_id = table.next_click()
+        event = synthetic_event(
+            table.content, custom_id, user_id, message_id=table.message_id
+        )
+        start = time.perf_counter()
+        try:
+            await self.bot.dispatch(event)
+        except Exception as e:
+            self.errors[table.game] += 1
+            lib.LOGGER.warning(f"{table.game} click {custom_id} failed: {e!r}")
+            table.advance(None)
+            return
+        self.latencies[table.game].append(time.perf_counter() - start)
+        table.advance(self.bot.rest.responses.pop(event.interaction.id, None))
+
+    async def worker(self, game: str, clicks: int) -> None:
+        table = Table(game, random.Random(self.rng.random()))
+        for _ in range(clicks):
+            await self.click(table)
+
+    async def run(self, *, clicks: int, concurrency: int) -> float:
+        """Runs `clicks` clicks per game over `concurrency` tables, returns wall time."""
+        per_worker = max(1, clicks // concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                self.worker(game, per_worker)
+                for game in self.games
+                for _ in range(concurrency)
+            )
+        )
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> str:
+        lines = [
+            f"{'game':<20}{'clicks':>8}{'clicks/s':>10}{'p50 ms':>9}{'p90 ms':>9}"
+            f"{'p99 ms':>9}{'max ms':>9}{'errors':>8}"
+        ]
+        for game in self.games:
+            samples = self.latencies[game]
+            p50, p90, p99 = (percentile(samples, p) * 1000 for p in (50, 90, 99))
+            lines.append(
+                f"{game:<20}{len(samples):>8}{len(samples) / elapsed:>10.1f}"
+                f"{p50:>9.2f}{p90:>9.2f}{p99:>9.2f}"
+                f"{max(samples, default=0) * 1000:>9.2f}{self.errors[game]:>8}"
+            )
+        total = sum(len(samples) for samples in self.latencies.values())
+        lines.append(f"{'all':<20}{total:>8}{total / elapsed:>10.1f}")
+        return "\n".join(lines)
+
+
+async def main(args: argparse.Namespace) -> None:
+    harness = Harness(
+        args.games.split(","),
+        rest_latency=args.rest_latency / 1000,
+        db_path=args.db,
+        seed=args.seed,
+    )
+    elapsed = await harness.run(clicks=args.clicks, concurrency=args.concurrency)
+    print(harness.report(elapsed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Drive the game listeners with synthetic clicks and a fake REST."
+    )
+    parser.add_argument("--games", default=",".join(all_games))
+    parser.add_argument("--clicks", type=int, default=500, help="clicks per game")
+    parser.add_argument("--concurrency", type=int, default=4, help="tables per game")
+    parser.add_argument(
+        "--rest-latency", type=float, default=0.0, help="simulated REST latency in ms"
+    )
+    parser.add_argument("--db", default=":memory:")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
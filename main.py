@@ -1,3 +1,8 @@
+import time
+
+startup_started = time.perf_counter()
+
+import asyncio
 import dotenv
 import hikari
 import lightbulb
@@ -5,10 +10,17 @@ import os
 import sys
 import lib
 import elo
+import metrics
+import matchmaking
+import replay
+import command_manifest
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 import datetime
 
+startup_elapsed = (time.perf_counter() - startup_started) * 1000
+lib.LOGGER.info(f"Startup phase imports took {startup_elapsed:.1f} ms")
+
 dotenv.load_dotenv()
 
 token = None
@@ -28,31 +40,48 @@ bot.subscribe(hikari.StartingEvent, client.start)
 
 import importlib
 
+# renders can use the last known emojis right away, on_ready refreshes them
+with lib.startup_phase("emoji cache"):
+    lib.load_emoji_cache()
+
 db = elo.init_db()
 
-for filename in os.listdir("games"):
-    if filename.endswith(".py") and not filename.startswith("__"):
-        game_name = filename[:-3]
-        module_name = f"games.{game_name}"
-        module = importlib.import_module(module_name)
-        if hasattr(module, "setup"):
-            if callable(module.setup):
-                module.setup(bot, client, elo.EloHandler(db=db, game_name=game_name))
-                try:
-                    readable_name = module.game_name()
-                    lib.LOGGER.info(f"Loaded game: {readable_name}")
-                    lib.set_game_name(game_code=game_name, name=readable_name)
-                except AttributeError:
-                    lib.LOGGER.info(
-                        f"Loaded game module: {module_name} (no game_name function found)"
-                    )
-            else:
-                raise TypeError(f"The setup in {module_name} is not callable.")
-        else:
-            raise AttributeError(f"No setup function found in {module_name}.")
+if "--lazy" in sys.argv:
+    # commands come from command_manifest.json, each game imports on first use
+    with lib.startup_phase("command manifest"):
+        lazy_games = command_manifest.LazyGames(
+            bot, client, db, command_manifest.load()
+        )
+else:
+    for filename in os.listdir("games"):
+        if filename.endswith(".py") and not filename.startswith("__"):
+            game_name = filename[:-3]
+            module_name = f"games.{game_name}"
+            with lib.startup_phase(f"load {module_name}"):
+                module = importlib.import_module(module_name)
+                if hasattr(module, "setup"):
+                    if callable(module.setup):
+                        module.setup(
+                            bot, client, elo.EloHandler(db=db, game_name=game_name)
+                        )
+                        try:
+                            readable_name = module.game_name()
+                            lib.LOGGER.info(f"Loaded game: {readable_name}")
+                            lib.set_game_name(game_code=game_name, name=readable_name)
+                        except AttributeError:
+                            lib.LOGGER.info(
+                                f"Loaded game module: {module_name} (no game_name function found)"
+                            )
+                    else:
+                        raise TypeError(f"The setup in {module_name} is not callable.")
+                else:
+                    raise AttributeError(f"No setup function found in {module_name}.")
 
 handler = elo.EloHandler(db=db, game_name="elo")
 
+matchmaker = matchmaking.setup(bot, client, db)
+replayer = replay.setup(bot, client)
+
 
 rolling_interactions: list[int] = (
     []
@@ -73,20 +102,50 @@ async def on_interaction(event: hikari.InteractionCreateEvent) -> None:
                 username=lib.get_username(user),
                 avatar_url=user.display_avatar_url or user.default_avatar_url,
             )
+    if isinstance(event.interaction, hikari.ComponentInteraction):
+        message = event.interaction.message
+        game = lib.game_code(lib.header_name(message.content or ""))
+        metrics.mark_active(game, message.id)
+    elif isinstance(event.interaction, hikari.CommandInteraction):
+        game = lib.game_code(event.interaction.command_name)
+    else:
+        game = "other"
+    metrics.interactions.inc(game)
     global first_interaction_timestamp
     if first_interaction_timestamp is None:
         first_interaction_timestamp = event.interaction.created_at.timestamp()
     rolling_interactions.append(event.interaction.created_at.timestamp())
 
 
+# keep a reference so the background refresh is not garbage collected
+background_tasks: set[asyncio.Task] = set()
+
+
+async def refresh_emojis() -> None:
+    with lib.startup_phase("emoji refresh"):
+        emojis = await bot.rest.fetch_application_emojis(client._application.id)
+        parsed = {}
+        for emoji in emojis:
+            parsed[str(emoji.name)] = f"<:{emoji.name}:{emoji.id}>"
+        lib.set_application_emojis(parsed)
+        lib.save_emoji_cache(parsed)
+    lib.LOGGER.info(f"Successfully loaded {len(emojis)} emojis.")
+
+
 @bot.listen()
 async def on_ready(event: hikari.StartedEvent) -> None:
-    emojis = await bot.rest.fetch_application_emojis(client._application.id)
-    parsed = {}
-    for emoji in emojis:
-        parsed[str(emoji.name)] = f"<:{emoji.name}:{emoji.id}>"
-    lib.set_application_emojis(parsed)
-    lib.LOGGER.info(f"Successfully loaded {len(emojis)} emojis.")
+    startup_elapsed = (time.perf_counter() - startup_started) * 1000
+    lib.LOGGER.info(f"Startup phase ready took {startup_elapsed:.1f} ms since launch")
+    if len(lib.application_emojis) > 0:
+        # the cached map is already in use, refresh it without holding up startup
+        task = asyncio.create_task(refresh_emojis())
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+    else:
+        await refresh_emojis()
+
+    if metrics.enabled():
+        await metrics.start()
 
     sched = AsyncIOScheduler()
     sched.start()
@@ -120,5 +179,16 @@ async def on_ready(event: hikari.StartedEvent) -> None:
     lib.LOGGER.info("Launched scheduled interaction stats updater.")
 
 
+def shard_options() -> dict:
+    # launcher.py hands each worker a slice of the shards, alone we run them all
+    options = {}
+    if "--shard-ids" in sys.argv:
+        shard_ids = sys.argv[sys.argv.index("--shard-ids") + 1]
+        options["shard_ids"] = [int(shard_id) for shard_id in shard_ids.split(",")]
+    if "--shard-count" in sys.argv:
+        options["shard_count"] = int(sys.argv[sys.argv.index("--shard-count") + 1])
+    return options
+
+
 if __name__ == "__main__":
-    bot.run()
+    bot.run(**shard_options())
@@ -0,0 +1,322 @@
+import asyncio
+import importlib
+import itertools
+import os
+import random
+import sqlite3
+import time
+from typing import Awaitable, Callable
+
+import hikari
+import lightbulb
+
+import elo
+import lib
+
+# game code -> (module, class) of the games that can be matched
+QUEUEABLE_GAMES = {
+    "chess": ("games.chess", "ChessGame"),
+    "connectfour": ("games.connectfour", "ConnectFourGame"),
+    "tictactoe": ("games.tictactoe", "TicTacToeGame"),
+    "rockpaperscissors": ("games.rockpaperscissors", "Game"),
+}
+
+
+def base_band() -> float:
+    return float(os.getenv("MATCHMAKING_BASE_BAND", "100"))
+
+
+def band_growth() -> float:
+    # rating points the band widens by for every second spent waiting
+    return float(os.getenv("MATCHMAKING_BAND_GROWTH", "5"))
+
+
+def max_band() -> float:
+    return float(os.getenv("MATCHMAKING_MAX_BAND", "800"))
+
+
+def max_wait() -> float:
+    return float(os.getenv("MATCHMAKING_MAX_WAIT", "900"))
+
+
+SWEEP_INTERVAL = 5.0
+
+_sequence = itertools.count()
+
+
+class Ticket:
+    __slots__ = ("user_id", "channel_id", "rating", "joined_at", "key")
+
+    def __init__(
+        self, user_id: int, channel_id: int, rating: int, joined_at: float
+    ) -> None:
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.rating = rating
+        self.joined_at = joined_at
+        # sort key, the sequence keeps equal ratings in join order
+        self.key = (rating, next(_sequence), user_id)
+
+    def band(self, now: float) -> float:
+        return min(base_band() + band_growth() * (now - self.joined_at), max_band())
+
+
+class SkipList:
+    # a sorted set with expected O(log n) add, remove and neighbour lookups. a
+    # node is [key, next node on level 0, next node on level 1, ...]
+    MAX_LEVEL = 32
+
+    def __init__(self) -> None:
+        self.head: list = [None] * (self.MAX_LEVEL + 1)
+        self.level = 1
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        node = self.head[1]
+        while node is not None:
+            yield node[0]
+            node = node[1]
+
+    def path(self, key) -> list[list]:
+        # the last node before key on every level
+        update = [self.head] * self.MAX_LEVEL
+        node = self.head
+        for level in reversed(range(self.level)):
+            while node[level + 1] is not None and node[level + 1][0] < key:
+                node = node[level + 1]
+            update[level] = node
+        return update
+
+    def add(self, key) -> None:
+        update = self.path(key)
+        height = 1
+        while height < self.MAX_LEVEL and random.random() < 0.5:
+            height += 1
+        self.level = max(self.level, height)
+        node = [key] + [None] * height
+        for level in range(height):
+            node[level + 1] = update[level][level + 1]
+            update[level][level + 1] = node
+        self.size += 1
+
+    def remove(self, key) -> bool:
+        update = self.path(key)
+        node = update[0][1]
+        if node is None or node[0] != key:
+            return False
+        for level in range(len(node) - 1):
+            update[level][level + 1] = node[level + 1]
+        self.size -= 1
+        return True
+
+    def neighbours(self, key) -> tuple:
+        # the keys right before and from key on, None past either end
+        before = self.path(key)[0]
+        after = before[1]
+        return (
+            None if before is self.head else before[0],
+            None if after is None else after[0],
+        )
+
+
+class Queue:
+    # waiting players of one game in one guild, sorted by rating
+    def __init__(self) -> None:
+        self.keys = SkipList()
+        self.tickets: dict[int, Ticket] = {}
+
+    def __len__(self) -> int:
+        return len(self.tickets)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.tickets
+
+    def add(self, ticket: Ticket) -> None:
+        self.keys.add(ticket.key)
+        self.tickets[ticket.user_id] = ticket
+
+    def remove(self, user_id: int) -> Ticket | None:
+        ticket = self.tickets.pop(user_id, None)
+        if ticket is not None:
+            self.keys.remove(ticket.key)
+        return ticket
+
+    def closest(self, ticket: Ticket, now: float) -> Ticket | None:
+        # the nearest ratings on either side are the only candidates worth checking
+        best = None
+        for key in self.keys.neighbours(ticket.key):
+            if key is None:
+                continue
+            other = self.tickets[key[2]]
+            difference = abs(other.rating - ticket.rating)
+            if difference > max(ticket.band(now), other.band(now)):
+                continue
+            if best is None or difference < abs(best.rating - ticket.rating):
+                best = other
+        return best
+
+    def sweep(self, now: float) -> tuple[list[tuple[Ticket, Ticket]], list[Ticket]]:
+        # pair neighbours whose bands have grown to cover each other, drop the stale
+        expired = [
+            ticket
+            for ticket in self.tickets.values()
+            if now - ticket.joined_at > max_wait()
+        ]
+        for ticket in expired:
+            self.remove(ticket.user_id)
+        pairs = []
+        waiting = [self.tickets[key[2]] for key in self.keys]
+        index = 0
+        while index + 1 < len(waiting):
+            a = waiting[index]
+            b = waiting[index + 1]
+            if b.rating - a.rating <= max(a.band(now), b.band(now)):
+                pairs.append((a, b))
+                index += 2
+            else:
+                index += 1
+        for a, b in pairs:
+            self.remove(a.user_id)
+            self.remove(b.user_id)
+        return pairs, expired
+
+
+class Matchmaker:
+    def __init__(
+        self,
+        ratings: Callable[[str, int], int],
+        on_match: Callable[[str, Ticket, Ticket], Awaitable[None]],
+    ) -> None:
+        self.ratings = ratings
+        self.on_match = on_match
+        self.queues: dict[tuple[str, int], Queue] = {}
+        self.sweeper: asyncio.Task | None = None
+
+    def waiting(self, game: str, guild_id: int) -> int:
+        queue = self.queues.get((game, guild_id))
+        return 0 if queue is None else len(queue)
+
+    def leave(self, game: str, guild_id: int, user_id: int) -> bool:
+        queue = self.queues.get((game, guild_id))
+        if queue is None or queue.remove(user_id) is None:
+            return False
+        if len(queue) == 0:
+            del self.queues[(game, guild_id)]
+        return True
+
+    async def join(
+        self, game: str, guild_id: int, user_id: int, channel_id: int
+    ) -> Ticket | None:
+        # returns the opponent if someone in range was already waiting
+        # the rating is a database read, keep it off the event loop
+        rating = await lib.offload(self.ratings, game, user_id)
+        now = time.monotonic()
+        ticket = Ticket(user_id, channel_id, rating, now)
+        queue = self.queues.setdefault((game, guild_id), Queue())
+        if user_id in queue:
+            # a second /queue from the same user joined while the rating loaded
+            return None
+        opponent = queue.closest(ticket, now)
+        if opponent is None:
+            queue.add(ticket)
+            self.start_sweeper()
+            return None
+        self.leave(game, guild_id, opponent.user_id)
+        await self.on_match(game, opponent, ticket)
+        return opponent
+
+    def start_sweeper(self) -> None:
+        if self.sweeper is None or self.sweeper.done():
+            self.sweeper = asyncio.create_task(self.sweep_forever())
+
+    async def sweep_forever(self) -> None:
+        while len(self.queues) > 0:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            await self.sweep()
+
+    async def sweep(self) -> None:
+        now = time.monotonic()
+        for (game, guild_id), queue in list(self.queues.items()):
+            pairs, expired = queue.sweep(now)
+            if len(queue) == 0:
+                del self.queues[(game, guild_id)]
+            for ticket in expired:
+                lib.LOGGER.info(f"Dropped {ticket.user_id} from the {game} queue")
+            for a, b in pairs:
+                try:
+                    await self.on_match(game, a, b)
+                except Exception as e:
+                    lib.LOGGER.error(f"Could not start {game} match: {e!r}")
+
+
+def setup(
+    bot: hikari.GatewayBot, client: lightbulb.Client, db: sqlite3.Connection
+) -> Matchmaker:
+    handlers = {code: elo.EloHandler(db=db, game_name=code) for code in QUEUEABLE_GAMES}
+
+    def rating(game: str, user_id: int) -> int:
+        return handlers[game].get_elo(user_id)
+
+    async def start_match(game: str, first: Ticket, second: Ticket) -> None:
+        module_name, class_name = QUEUEABLE_GAMES[game]
+        game_class = getattr(importlib.import_module(module_name), class_name)
+        players = [hikari.Snowflake(first.user_id), hikari.Snowflake(second.user_id)]
+        random.shuffle(players)
+        match = game_class(*players)
+        await bot.rest.create_message(
+            second.channel_id,
+            f"{match.content()}\n<@{first.user_id}> and <@{second.user_id}> were "
+            f"matched for **{lib.get_game_name(game)}**!",
+            embeds=await lib.offload(match.embeds) if hasattr(match, "embeds") else [],
+            components=match.components(bot),
+            user_mentions=players,
+        )
+
+    matchmaker = Matchmaker(rating, start_match)
+
+    @client.register()
+    class QueueCommand(
+        lightbulb.SlashCommand,
+        name="queue",
+        description="Join or leave the matchmaking queue for a game.",
+    ):
+        game = lightbulb.string(
+            "game",
+            "The game to find an opponent for.",
+            choices=[
+                lightbulb.Choice(lib.get_game_name(code), code)
+                for code in QUEUEABLE_GAMES
+            ],
+        )
+
+        @lightbulb.invoke
+        async def invoke(self, ctx: lightbulb.Context) -> None:
+            if ctx.guild_id is None:
+                await ctx.respond(
+                    "Matchmaking only works inside a server.", ephemeral=True
+                )
+                return
+            if self.game not in QUEUEABLE_GAMES:
+                await ctx.respond(f"Unknown game.\n`{self.game}`", ephemeral=True)
+                return
+            name = lib.get_game_name(self.game)
+            if matchmaker.leave(self.game, ctx.guild_id, ctx.user.id):
+                await ctx.respond(f"You left the {name} queue.", ephemeral=True)
+                return
+            opponent = await matchmaker.join(
+                self.game, ctx.guild_id, ctx.user.id, ctx.channel_id
+            )
+            if opponent is not None:
+                await ctx.respond(f"Found you a {name} opponent!", ephemeral=True)
+                return
+            waiting = matchmaker.waiting(self.game, ctx.guild_id)
+            await ctx.respond(
+                f"You joined the {name} queue ({waiting} waiting). "
+                "Run the command again to leave.",
+                ephemeral=True,
+            )
+
+    return matchmaker
@@ -0,0 +1,265 @@
+import asyncio
+import bisect
+import contextlib
+import logging
+import os
+import sys
+import time
+from typing import Callable
+
+LOGGER = logging.getLogger("quiggle-games-pro")
+
+# latency buckets in seconds, tuned for the sub-second work a single click does
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+_registry: list["Counter | Gauge | Histogram"] = []
+
+# keep references so the server and the lag monitor are not garbage collected
+_runner = None
+_lag_task: asyncio.Task | None = None
+
+
+def enabled() -> bool:
+    return "--metrics" in sys.argv
+
+
+def metrics_host() -> str:
+    return os.getenv("METRICS_HOST", "127.0.0.1")
+
+
+def metrics_port() -> int:
+    return int(os.getenv("METRICS_PORT", "9108"))
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = []
+    for name, value in zip(names, values):
+        value = (
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        parts.append(f'{name}="{value}"')
+    if extra:
+        parts.append(extra)
+    if len(parts) == 0:
+        return ""
+    return "{" + ",".join(parts) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values: dict[tuple, float] = {}
+        _registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, *label_values) -> float:
+        return self.values.get(label_values, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in self.values.items():
+            lines.append(
+                f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+            )
+        return lines
+
+
+class Gauge:
+    # a gauge holds values set directly, or asks `collect` for them at scrape time
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        collect: Callable[[], dict[tuple, float]] | None = None,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.collect = collect
+        self.values: dict[tuple, float] = {}
+        _registry.append(self)
+
+    def set(self, value: float, *label_values) -> None:
+        self.values[label_values] = value
+
+    def render(self) -> list[str]:
+        values = self.collect() if self.collect is not None else self.values
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for label_values, value in values.items():
+            lines.append(
+                f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+            )
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # per label set: [per-bucket counts (last one is +Inf), sum, count]
+        self.values: dict[tuple, list] = {}
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values) -> None:
+        entry = self.values.get(label_values)
+        if entry is None:
+            entry = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            self.values[label_values] = entry
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+# how long a game message counts as "active" after its last click
+ACTIVE_WINDOW = 3600
+
+_active_games: dict[int, tuple[str, float]] = {}
+
+
+def mark_active(game: str, message_id: int) -> None:
+    _active_games[message_id] = (game, time.monotonic())
+    if len(_active_games) > 50000:
+        # nobody is scraping, prune here so this stays bounded
+        _collect_active_games()
+
+
+def _collect_active_games() -> dict[tuple, float]:
+    cutoff = time.monotonic() - ACTIVE_WINDOW
+    counts: dict[tuple, float] = {}
+    for message_id, (game, last_seen) in list(_active_games.items()):
+        if last_seen < cutoff:
+            del _active_games[message_id]
+            continue
+        counts[(game,)] = counts.get((game,), 0) + 1
+    return counts
+
+
+interactions = Counter(
+    "quiggle_interactions_total",
+    "Interactions received, by game.",
+    ("game",),
+)
+phase_seconds = Histogram(
+    "quiggle_phase_seconds",
+    "Time spent handling a click, by game and span (decode, logic, render, rest, ...).",
+    ("game", "phase"),
+)
+sqlite_commit_seconds = Histogram(
+    "quiggle_sqlite_commit_seconds",
+    "Latency of SQLite commits.",
+)
+cache_requests = Counter(
+    "quiggle_cache_requests_total",
+    "Cache lookups, by cache and result (hit or miss).",
+    ("cache", "result"),
+)
+deferred_responses = Counter(
+    "quiggle_deferred_responses_total",
+    "Clicks acknowledged with a deferred update after missing the response budget.",
+    ("game",),
+)
+stale_clicks = Counter(
+    "quiggle_stale_clicks_total",
+    "Clicks rejected because the message had already been updated.",
+)
+event_loop_lag_seconds = Histogram(
+    "quiggle_event_loop_lag_seconds",
+    "How late the event loop woke up a sleeping task.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+active_games = Gauge(
+    "quiggle_active_games",
+    "Game messages clicked within the last hour, by game.",
+    ("game",),
+    collect=_collect_active_games,
+)
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def monitor_event_loop(interval: float = 0.5) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        event_loop_lag_seconds.observe(max(loop.time() - start - interval, 0.0))
+
+
+async def start() -> None:
+    global _runner, _lag_task
+    if _runner is not None:
+        return
+    _runner = await serve()
+    _lag_task = asyncio.create_task(monitor_event_loop())
+
+
+async def serve(host: str | None = None, port: int | None = None):
+    # aiohttp comes with hikari, so this runs on the bot's own loop
+    from aiohttp import web
+
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host or metrics_host(), port or metrics_port())
+    await site.start()
+    LOGGER.info(f"Serving metrics on {site.name}/metrics")
+    return runner
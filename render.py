@@ -0,0 +1,204 @@
+import functools
+import hashlib
+import io
+import math
+import os
+import sys
+import threading
+
+import hikari
+
+import lib
+
+# boards drawn as one PNG instead of an emoji grid, opt in with --image-boards.
+# Pillow is optional, without it the flag is ignored and emojis are used
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+
+
+def tile_size() -> int:
+    # the assets are 128px, emojis show at about 48px in an embed
+    return int(os.getenv("RENDER_TILE_SIZE", "48"))
+
+
+def compress_level() -> int:
+    # zlib level for the PNG, low levels encode much faster for a few more bytes
+    return int(os.getenv("RENDER_COMPRESS_LEVEL", "1"))
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def enabled() -> bool:
+    return "--image-boards" in sys.argv and available()
+
+
+if "--image-boards" in sys.argv and not available():
+    lib.LOGGER.warning("--image-boards needs Pillow installed, drawing emojis")
+
+
+class Atlas:
+    # every tile under assets/ resized once and packed into a single sheet,
+    # a board is then a series of alpha_composite calls out of it
+    def __init__(self, directory: str, size: int) -> None:
+        self.size = size
+        paths = {}
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename.endswith(".png"):
+                    # some tiles are duplicated between folders, the names match emojis
+                    paths.setdefault(filename[:-4], os.path.join(root, filename))
+        columns = max(1, math.ceil(math.sqrt(len(paths))))
+        rows = max(1, math.ceil(len(paths) / columns))
+        self.sheet = Image.new("RGBA", (columns * size, rows * size))
+        self.boxes: dict[str, tuple[int, int, int, int]] = {}
+        for index, (name, path) in enumerate(sorted(paths.items())):
+            with Image.open(path) as tile:
+                tile = tile.convert("RGBA").resize(
+                    (size, size), Image.Resampling.LANCZOS
+                )
+            x = (index % columns) * size
+            y = (index // columns) * size
+            self.sheet.paste(tile, (x, y))
+            self.boxes[name] = (x, y, x + size, y + size)
+
+    def compose(
+        self, tiles: list[list[str]], background: tuple[int, ...] = (0, 0, 0, 0)
+    ) -> "Image.Image":
+        size = self.size
+        width = max((len(row) for row in tiles), default=0)
+        canvas = Image.new("RGBA", (width * size, len(tiles) * size), background)
+        for y, row in enumerate(tiles):
+            for x, name in enumerate(row):
+                self.draw(canvas, x, y, name)
+        return canvas
+
+    def draw(self, canvas: "Image.Image", x: int, y: int, name: str) -> None:
+        box = self.boxes.get(name)
+        if box is None:
+            # "blank" only exists as an emoji, leave the square transparent
+            return
+        canvas.alpha_composite(self.sheet, (x * self.size, y * self.size), box)
+
+    def redraw(
+        self,
+        canvas: "Image.Image",
+        before: list[list[str]],
+        after: list[list[str]],
+        background: tuple[int, ...],
+    ) -> None:
+        # only the squares whose tile changed, a move touches a handful of them
+        size = self.size
+        for y, (old_row, new_row) in enumerate(zip(before, after)):
+            for x, (old, new) in enumerate(zip(old_row, new_row)):
+                if old != new:
+                    square = (x * size, y * size, (x + 1) * size, (y + 1) * size)
+                    canvas.paste(background, square)
+                    self.draw(canvas, x, y, new)
+
+    @functools.cached_property
+    def palette(self) -> "Image.Image":
+        # one palette for every frame, taken from the tiles themselves
+        flat = Image.new("RGB", self.sheet.size, GIF_BACKGROUND[:3])
+        flat.paste(self.sheet, mask=self.sheet)
+        return flat.quantize(colors=255)
+
+
+_atlas: Atlas | None = None
+_atlas_lock = threading.Lock()
+
+
+def atlas() -> Atlas:
+    # built on first use, renders run on executor threads
+    global _atlas
+    if _atlas is None:
+        with _atlas_lock:
+            if _atlas is None:
+                with lib.startup_phase("sprite atlas"):
+                    _atlas = Atlas(ASSET_DIR, tile_size())
+    return _atlas
+
+
+@functools.cache
+def asset_digest() -> str:
+    # cached images are only reused while the tiles they were drawn from match
+    digest = hashlib.blake2b(digest_size=8)
+    for root, dirs, files in os.walk(ASSET_DIR):
+        dirs.sort()
+        for filename in sorted(files):
+            with open(os.path.join(root, filename), "rb") as f:
+                digest.update(filename.encode("utf-8"))
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def draw_png(tiles: list[list[str]]) -> bytes:
+    buffer = io.BytesIO()
+    atlas().compose(tiles).save(buffer, "PNG", compress_level=compress_level())
+    return buffer.getvalue()
+
+
+def board_png(tiles: list[list[str]]) -> bytes:
+    key = lib.render_key("png", tiles, tile_size(), compress_level(), asset_digest())
+    return lib.render_cache.get(key, lambda: draw_png(tiles), disk=True)
+
+
+# GIFs have no partial transparency, blank squares get Discord's dark theme instead
+GIF_BACKGROUND = (0x31, 0x33, 0x38, 0xFF)
+# the final position stays up a while before the replay loops
+LAST_FRAME_MS = 3000
+
+
+def draw_gif(frames: list[list[list[str]]], frame_ms: int) -> bytes:
+    # runs in a worker process. each frame only redraws the tiles that changed,
+    # and Pillow stores just the box that differs from the frame before it
+    sheet = atlas()
+    images = []
+    durations = []
+    canvas = None
+    previous = None
+    for tiles in frames:
+        if tiles == previous:
+            durations[-1] += frame_ms
+            continue
+        if canvas is None or [len(row) for row in tiles] != [
+            len(row) for row in previous
+        ]:
+            canvas = sheet.compose(tiles, GIF_BACKGROUND)
+        else:
+            sheet.redraw(canvas, previous, tiles, GIF_BACKGROUND)
+        images.append(
+            canvas.convert("RGB").quantize(
+                palette=sheet.palette, dither=Image.Dither.NONE
+            )
+        )
+        durations.append(frame_ms)
+        previous = tiles
+    durations[-1] = max(durations[-1], LAST_FRAME_MS)
+    buffer = io.BytesIO()
+    images[0].save(
+        buffer,
+        "GIF",
+        save_all=True,
+        append_images=images[1:],
+        duration=durations,
+        loop=0,
+        optimize=True,
+        disposal=1,
+    )
+    return buffer.getvalue()
+
+
+def board_embed(
+    tiles: list[list[str]], color: hikari.Color, filename: str
+) -> hikari.Embed:
+    # hikari uploads the image with the message and points the embed at it
+    embed = hikari.Embed(color=color)
+    embed.set_image(hikari.Bytes(board_png(tiles), filename))
+    return embed
@@ -0,0 +1,106 @@
+import asyncio
+import concurrent.futures
+import importlib
+import os
+
+import hikari
+import lightbulb
+
+import lib
+import render
+
+# game name in the replay header -> module with replay_frames(data)
+REPLAYABLE_GAMES = {
+    "Chess": "games.chess",
+    "Connect Four": "games.connectfour",
+}
+
+
+def replay_workers() -> int:
+    return int(os.getenv("REPLAY_WORKERS", "2"))
+
+
+def replay_concurrency() -> int:
+    # renders running or waiting on the pool, everyone after that waits here
+    return int(os.getenv("REPLAY_CONCURRENCY", "4"))
+
+
+def frame_ms() -> int:
+    return int(os.getenv("REPLAY_FRAME_MS", "800"))
+
+
+class Replayer:
+    def __init__(self, workers: int, concurrency: int) -> None:
+        self.workers = workers
+        self.semaphore = asyncio.Semaphore(concurrency)
+        # started on the first replay, most processes never need one
+        self.pool: concurrent.futures.ProcessPoolExecutor | None = None
+        # the same game requested again while it renders waits for that render
+        self.rendering: dict[str, asyncio.Task] = {}
+
+    async def render(self, frames: list[list[list[str]]]) -> bytes:
+        # every frame's tiles go into the key, a replay is cached like any board
+        tiles = [row for frame in frames for row in frame + [["|"]]]
+        key = lib.render_key(
+            "gif", tiles, frame_ms(), render.tile_size(), render.asset_digest()
+        )
+        gif = await lib.offload(lib.render_cache.lookup, key, disk=True)
+        if gif is not None:
+            return gif
+        task = self.rendering.get(key)
+        if task is None:
+            task = asyncio.create_task(self.draw(key, frames))
+            self.rendering[key] = task
+            task.add_done_callback(lambda _: self.rendering.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def draw(self, key: str, frames: list[list[list[str]]]) -> bytes:
+        async with self.semaphore:
+            if self.pool is None:
+                self.pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+            gif = await asyncio.get_running_loop().run_in_executor(
+                self.pool, render.draw_gif, frames, frame_ms()
+            )
+        await lib.offload(lib.render_cache.store, key, gif, disk=True)
+        return gif
+
+
+def setup(bot: hikari.GatewayBot, client: lightbulb.Client) -> Replayer:
+    replayer = Replayer(replay_workers(), replay_concurrency())
+
+    @client.register()
+    class ReplayCommand(
+        lightbulb.MessageCommand,
+        name="replay",
+        description="Watch a finished game again.",
+    ):
+        @lightbulb.invoke
+        async def invoke(self, ctx: lightbulb.Context) -> None:
+            message = self.target
+            replay = None
+            if message is not None:
+                replay = lib.replay_data(message.content or "")
+            if replay is None or replay[0] not in REPLAYABLE_GAMES:
+                await ctx.respond(
+                    "That message is not a finished game with a replay.",
+                    ephemeral=True,
+                )
+                return
+            if not render.available():
+                await ctx.respond("Replays need Pillow installed.", ephemeral=True)
+                return
+            name, data = replay
+            module = importlib.import_module(REPLAYABLE_GAMES[name])
+            await ctx.defer()
+            try:
+                frames = await lib.offload(module.replay_frames, data)
+                gif = await replayer.render(frames)
+            except Exception as e:
+                lib.LOGGER.error(f"Could not replay {name} game {message.id}: {e!r}")
+                await ctx.respond("Could not replay that game.")
+                return
+            await ctx.respond(
+                attachment=hikari.Bytes(gif, f"{lib.game_code(name)}-replay.gif")
+            )
+
+    return replayer
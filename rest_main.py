@@ -0,0 +1,100 @@
+import dotenv
+import hikari
+import lightbulb
+import os
+import sys
+import importlib
+import lib
+import elo
+import httpbot
+import metrics
+import matchmaking
+import replay
+
+# serves Discord's HTTP interactions webhook instead of a gateway connection,
+# no state is kept between clicks so any number of these can run behind a proxy
+
+dotenv.load_dotenv()
+
+if "--prod" in sys.argv:
+    token = os.getenv("PRODUCTION_TOKEN")
+    public_key = os.getenv("PRODUCTION_PUBLIC_KEY")
+else:
+    token = os.getenv("DEVELOPMENT_TOKEN")
+    public_key = os.getenv("DEVELOPMENT_PUBLIC_KEY")
+
+if token is None:
+    raise ValueError("Bot token not found in environment variables.")
+if public_key is None:
+    raise ValueError("Application public key not found in environment variables.")
+
+rest_bot = hikari.RESTBot(
+    token=token, token_type=hikari.TokenType.BOT, public_key=public_key
+)
+httpbot.install_fast_path(rest_bot)
+client = lightbulb.client_from_app(rest_bot)
+rest_bot.add_startup_callback(client.start)
+
+# what the games' setup() sees as `bot`
+bot = httpbot.InteractionBot(rest_bot.rest)
+
+lib.load_emoji_cache()
+db = elo.init_db()
+
+for filename in os.listdir("games"):
+    if filename.endswith(".py") and not filename.startswith("__"):
+        game_name = filename[:-3]
+        module = importlib.import_module(f"games.{game_name}")
+        module.setup(bot, client, elo.EloHandler(db=db, game_name=game_name))
+        if hasattr(module, "game_name"):
+            lib.set_game_name(game_code=game_name, name=module.game_name())
+        lib.LOGGER.info(f"Loaded game module: games.{game_name}")
+
+handler = elo.EloHandler(db=db, game_name="elo")
+
+matchmaker = matchmaking.setup(bot, client, db)
+replayer = replay.setup(bot, client)
+
+
+async def on_component(
+    interaction: hikari.ComponentInteraction,
+) -> hikari.api.InteractionResponseBuilder:
+    # the same bookkeeping main.py does for gateway interactions
+    if not interaction.user.is_bot:
+        handler.store_user_data(
+            user_id=interaction.user.id,
+            username=lib.get_username(interaction.user),
+            avatar_url=interaction.user.display_avatar_url
+            or interaction.user.default_avatar_url,
+        )
+    game = lib.game_code(lib.header_name(interaction.message.content or ""))
+    metrics.mark_active(game, interaction.message.id)
+    metrics.interactions.inc(game)
+    return httpbot.build_response(await bot.respond(interaction))
+
+
+rest_bot.set_listener(hikari.ComponentInteraction, on_component)
+
+
+async def on_start(_: hikari.RESTBot) -> None:
+    application = await rest_bot.rest.fetch_application()
+    emojis = await rest_bot.rest.fetch_application_emojis(application.id)
+    parsed = {}
+    for emoji in emojis:
+        parsed[str(emoji.name)] = f"<:{emoji.name}:{emoji.id}>"
+    lib.set_application_emojis(parsed)
+    lib.save_emoji_cache(parsed)
+    lib.LOGGER.info(f"Successfully loaded {len(emojis)} emojis.")
+
+    if metrics.enabled():
+        await metrics.start()
+
+
+rest_bot.add_startup_callback(on_start)
+
+
+if __name__ == "__main__":
+    rest_bot.run(
+        host=os.getenv("HTTP_HOST", "127.0.0.1"),
+        port=int(os.getenv("HTTP_PORT", "8080")),
+    )
@@ -0,0 +1,55 @@
+import gzip
+import multiprocessing
+import os
+import sqlite3
+
+import archive
+
+
+def write_games(directory: str, worker: int, count: int) -> None:
+    # one sharded worker with its own PGNArchive, one game per batch
+    pgn_archive = archive.PGNArchive(directory)
+    for number in range(count):
+        # incompressible, so a write takes long enough for the workers to overlap
+        moves = os.urandom(20000).hex()
+        pgn = f'[Event "worker {worker} game {number}"]\n\n{moves}\n\n'
+        pgn_archive.write(
+            [
+                archive.Record(
+                    pgn,
+                    message_id=worker * 1000 + number,
+                    white_id=worker,
+                    black_id=worker + 100,
+                    variant="standard",
+                    result="*",
+                    finished_at=float(number),
+                )
+            ]
+        )
+
+
+def test_concurrent_workers_keep_the_index_right(tmp_path, monkeypatch) -> None:
+    # a new file every twenty or so games, so the workers also race to rotate
+    monkeypatch.setenv("CHESS_ARCHIVE_ROTATE_BYTES", "400000")
+    directory = str(tmp_path)
+    context = multiprocessing.get_context("fork")
+    workers = [
+        context.Process(target=write_games, args=(directory, worker, 60))
+        for worker in range(8)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    db = sqlite3.connect(os.path.join(directory, archive.INDEX_NAME))
+    rows = db.execute("SELECT message_id, file, offset, length FROM games").fetchall()
+    assert len(rows) == 480
+    assert len(archive.archive_files(directory)) > 1
+    for message_id, name, offset, length in rows:
+        with open(os.path.join(directory, name), "rb") as f:
+            f.seek(offset)
+            pgn = gzip.decompress(f.read(length)).decode("utf-8")
+        worker, number = divmod(message_id, 1000)
+        assert pgn.startswith(f'[Event "worker {worker} game {number}"]')
+    assert len(list(archive.iter_games(directory))) == 480
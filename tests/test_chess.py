@@ -0,0 +1,150 @@
+import os
+import random
+import subprocess
+import sys
+
+import chess
+import hikari
+import pytest
+
+import lib
+from games.chess import ChessGame, valid_chess_variants
+
+
+def random_game(variant: str, plies: int, seed: int) -> ChessGame:
+    random.seed(seed)  # chess960 picks its start position with the module rng
+    rng = random.Random(seed)
+    game = ChessGame(hikari.Snowflake(1), hikari.Snowflake(2), variant=variant)
+    for _ in range(plies):
+        if variant == "gravitychess":
+            # a click names the square the piece lands on
+            moves = [chess.Move(*pair) for pair in game.iter_moves()]
+        else:
+            moves = list(game.board.generate_legal_moves())
+        if len(moves) == 0:
+            break
+        game.push(rng.choice(moves))
+    return game
+
+
+def button_move(game: ChessGame, from_square: int, to_square: int) -> chess.Move:
+    # the move a click builds, pawns reaching the last rank become queens
+    piece = game.board.piece_at(from_square)
+    promotion = None
+    if (
+        game.variant != "gravitychess"
+        and piece is not None
+        and piece.piece_type == chess.PAWN
+        and chess.square_rank(to_square) in (0, 7)
+    ):
+        promotion = chess.QUEEN
+    return chess.Move(from_square, to_square, promotion=promotion)
+
+
+def assert_is_legal_matches_moves(game: ChessGame) -> None:
+    offered = set(game.iter_moves())
+    for from_square in chess.SQUARES:
+        for to_square in chess.SQUARES:
+            if from_square == to_square:
+                continue
+            move = button_move(game, from_square, to_square)
+            assert game.is_legal(move) == ((from_square, to_square) in offered), (
+                game.variant,
+                game.board.fen(),
+                move.uci(),
+            )
+
+
+@pytest.mark.parametrize("variant", list(valid_chess_variants))
+def test_is_legal_matches_get_moves(variant: str) -> None:
+    seeds = range(2) if variant == "gravitychess" else range(6)
+    for seed in seeds:
+        for plies in (0, 8, 20):
+            assert_is_legal_matches_moves(random_game(variant, plies, seed))
+
+
+def test_is_legal_rejects_king_onto_rook_castling() -> None:
+    # python-chess accepts e1h1 for castling, the buttons only ever offer e1g1
+    game = ChessGame(hikari.Snowflake(1), hikari.Snowflake(2))
+    game.board = chess.Board("r3k2r/pppppppp/8/8/8/8/PPPPPPPP/R3K2R w KQkq - 0 1")
+    assert game.is_legal(chess.Move.from_uci("e1g1"))
+    assert game.is_legal(chess.Move.from_uci("e1c1"))
+    assert not game.is_legal(chess.Move.from_uci("e1h1"))
+    assert not game.is_legal(chess.Move.from_uci("e1a1"))
+    assert_is_legal_matches_moves(game)
+
+
+def header_data(header: str) -> str:
+    # the serialized first line of a ```data\nName``` header
+    return header[3:-3].strip().splitlines()[0]
+
+
+def round_trip(game: ChessGame) -> ChessGame:
+    # what every click does, the game only survives as its message header
+    decoded = ChessGame.from_header(game.content())
+    assert decoded is not None
+    return decoded
+
+
+def test_long_quiet_game_fits_in_a_message() -> None:
+    # the header carries the whole move log, a game reaching the fifty move rule
+    # still has to fit in Discord's 2000 characters
+    game = ChessGame(hikari.Snowflake(1), hikari.Snowflake(2))
+    rng = random.Random(0)
+    while len(game.history) < 61 or game.board.halfmove_clock > 0:
+        game.push(rng.choice(list(game.board.generate_legal_moves())))
+    for _ in range(100):
+        quiet = [
+            move
+            for move in game.board.generate_legal_moves()
+            if not game.board.is_capture(move)
+            and game.board.piece_type_at(move.from_square) != chess.PAWN
+        ]
+        assert len(quiet) > 0
+        game.push(rng.choice(quiet))
+        assert len(game.content()) <= 2000, len(game.history)
+        game = round_trip(game)
+    assert len(game.history) >= 161
+    assert game.board.halfmove_clock == 100
+    assert isinstance(game.check_outcome(), lib.Tie)
+
+
+def test_threefold_repetition_across_headers() -> None:
+    game = ChessGame(hikari.Snowflake(1), hikari.Snowflake(2))
+    shuffle = ["g1f3", "g8f6", "f3g1", "f6g8"] * 2
+    for ply, uci in enumerate(shuffle, start=1):
+        game.push(chess.Move.from_uci(uci))
+        game.current_turn = game.player_w if ply % 2 == 0 else game.player_b
+        game = round_trip(game)
+        outcome = game.check_outcome()
+        if ply < len(shuffle):
+            assert outcome is None, ply
+    # the start position for the third time
+    assert isinstance(outcome, lib.Tie)
+
+
+def test_start_fen_is_only_stored_for_chess960() -> None:
+    standard = random_game("standard", 6, 0)
+    assert "start_fen" not in lib.deserialize(header_data(standard.to_header()))
+    assert round_trip(standard).start_fen == chess.STARTING_FEN
+    shuffled = random_game("chess960", 6, 0)
+    assert shuffled.start_fen != chess.STARTING_FEN
+    assert round_trip(shuffled).start_fen == shuffled.start_fen
+    _, replay = lib.replay_data(shuffled.to_replay_header())
+    assert replay["start_fen"] == shuffled.start_fen
+
+
+def test_lazy_chess_import_stays_lazy() -> None:
+    # a fresh interpreter, this one has long since loaded python-chess
+    script = (
+        "import sys\n"
+        "sys.argv.append('--lazy')\n"
+        "import games.chess\n"
+        "kind = type(sys.modules['chess']).__name__\n"
+        "assert kind == '_LazyModule', kind\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=os.path.dirname(os.path.abspath(lib.__file__)),
+        check=True,
+    )
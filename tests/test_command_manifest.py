@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sqlite3
+import subprocess
+import sys
+import types
+
+import hikari
+
+import command_manifest
+
+
+# any token of the right shape, nothing connects
+TOKEN = "MTAw.test.test"
+
+
+def lazy_games() -> tuple:
+    bot = hikari.GatewayBot(token=TOKEN)
+    client = command_manifest.CommandCollector()
+    games = command_manifest.LazyGames(
+        bot, client, sqlite3.connect(":memory:"), command_manifest.load()
+    )
+    return games, client
+
+
+def test_manifest_is_up_to_date() -> None:
+    # run `python command_manifest.py` after changing a game's commands
+    assert command_manifest.generate() == command_manifest.load()
+
+
+def test_proxies_register_the_games_commands() -> None:
+    games, client = lazy_games()
+    specs = [
+        spec for entry in command_manifest.load().values() for spec in entry["commands"]
+    ]
+    assert [command_manifest.describe(command) for command in client.commands] == specs
+
+
+def test_startup_imports_no_game() -> None:
+    # a fresh interpreter, the rest of the suite has imported every game already
+    script = (
+        "import sys, sqlite3, hikari, command_manifest\n"
+        f"command_manifest.LazyGames(hikari.GatewayBot(token={TOKEN!r}),"
+        " command_manifest.CommandCollector(), sqlite3.connect(':memory:'),"
+        " command_manifest.load())\n"
+        "loaded = [name for name in sys.modules if name.startswith('games.')]\n"
+        "assert loaded == [], loaded\n"
+    )
+    subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=os.path.dirname(os.path.abspath(command_manifest.__file__)),
+        check=True,
+    )
+
+
+def test_first_command_loads_the_game() -> None:
+    games, client = lazy_games()
+    proxy = next(
+        command
+        for command in client.commands
+        if command._command_data.name == "tictactoe"
+        and command._command_data.type == hikari.CommandType.SLASH
+    )
+    responses = []
+
+    async def respond(content, **kwargs):
+        responses.append(content)
+
+    opponent = hikari.Snowflake(2)
+    ctx = types.SimpleNamespace(
+        client=types.SimpleNamespace(
+            default_locale=hikari.Locale.EN_US,
+            localization_provider=None,
+        ),
+        options=[types.SimpleNamespace(name="opponent", value=opponent)],
+        interaction=types.SimpleNamespace(
+            resolved=types.SimpleNamespace(
+                members={}, users={opponent: types.SimpleNamespace(is_bot=True)}
+            )
+        ),
+        respond=respond,
+    )
+    asyncio.run(proxy().invoke(ctx))
+    assert responses == ["Bots cannot play games."]
+    assert list(games.listeners) == ["tictactoe"]
+    # the game's listener is routed through LazyGames instead of the bot
+    assert len(games.listeners["tictactoe"]) == 1
+    assert list(games.bot.get_listeners(hikari.InteractionCreateEvent)) == [
+        games.on_interaction
+    ]
@@ -0,0 +1,66 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import hikari
+
+import dbwriter
+import elo
+import lib
+
+WINNER = hikari.Snowflake(1)
+LOSER = hikari.Snowflake(2)
+
+
+def record_wins(address: str, count: int, changes) -> None:
+    # one sharded worker, with its own connection and its own elo.db_lock
+    handler = elo.EloHandler(db=dbwriter.RemoteConnection(address), game_name="chess")
+    for _ in range(count):
+        change = handler.record_outcome(lib.Win(winner_id=WINNER, loser_id=LOSER))
+        changes.put((change.get_old_elo(WINNER), change.get_new_elo(WINNER)))
+
+
+def test_concurrent_outcomes_are_not_lost(tmp_path) -> None:
+    address = str(tmp_path / "writer.sock")
+    # the writer runs as its own process, the way launcher.py starts it
+    writer = subprocess.Popen(
+        [sys.executable, "dbwriter.py", "--address", address]
+        + ["--db", str(tmp_path / "elo.db")],
+        cwd=os.path.dirname(os.path.abspath(dbwriter.__file__)),
+    )
+    try:
+        check_outcomes(address)
+    finally:
+        writer.kill()
+        writer.wait()
+
+
+def check_outcomes(address: str) -> None:
+    context = multiprocessing.get_context("fork")
+    changes = context.Queue()
+    # the first connection retries until the writer listens
+    while True:
+        try:
+            handler = elo.EloHandler(
+                db=dbwriter.RemoteConnection(address), game_name="chess"
+            )
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            time.sleep(0.01)
+    workers = [
+        context.Process(target=record_wins, args=(address, 25, changes))
+        for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+    recorded = sorted(changes.get() for _ in range(100))
+    # every outcome started from the rating the one before it left behind
+    assert recorded[0][0] == elo.default_elo
+    for (_, new_elo), (old_elo, _) in zip(recorded, recorded[1:]):
+        assert old_elo == new_elo
+    assert handler.get_elo(WINNER) == recorded[-1][1]
@@ -0,0 +1,68 @@
+import asyncio
+import json
+import os
+import time
+
+import aiohttp.test_utils
+import aiohttp.web
+import hikari
+import nacl.signing
+
+import httpbot
+
+SIGNING_KEY = nacl.signing.SigningKey.generate()
+
+
+async def post(body: bytes, signature: bytes, timestamp: str) -> tuple[int, str]:
+    # the request goes through the same aiohttp_hook RESTBot serves
+    bot = hikari.RESTBot(
+        "MTAw.test.test",
+        "Bot",
+        public_key=bytes(SIGNING_KEY.verify_key),
+        banner=None,
+    )
+    httpbot.install_fast_path(bot)
+    app = aiohttp.web.Application()
+    app.router.add_post("/", bot.interaction_server.aiohttp_hook)
+    async with aiohttp.test_utils.TestClient(
+        aiohttp.test_utils.TestServer(app)
+    ) as client:
+        response = await client.post(
+            "/",
+            data=body,
+            headers={
+                "Content-Type": "application/json",
+                "X-Signature-Ed25519": signature.hex(),
+                "X-Signature-Timestamp": timestamp,
+            },
+        )
+        return response.status, await response.text()
+
+
+def ping() -> bytes:
+    return json.dumps({"type": 1, "id": "1", "application_id": "1"}).encode()
+
+
+def test_signed_ping_gets_a_pong() -> None:
+    timestamp = str(int(time.time()))
+    signature = SIGNING_KEY.sign(timestamp.encode() + ping()).signature
+    status, text = asyncio.run(post(ping(), signature, timestamp))
+    assert status == 200
+    assert json.loads(text) == {"type": 1}
+
+
+def test_forged_signature_is_unauthorized() -> None:
+    status, text = asyncio.run(post(ping(), os.urandom(64), str(int(time.time()))))
+    assert (status, text) == (401, "Invalid request signature")
+
+
+def test_malformed_signature_is_unauthorized() -> None:
+    status, text = asyncio.run(post(ping(), os.urandom(32), str(int(time.time()))))
+    assert (status, text) == (401, "Invalid request signature")
+
+
+def test_replayed_request_is_unauthorized() -> None:
+    timestamp = str(int(time.time()) - httpbot.max_request_age() - 60)
+    signature = SIGNING_KEY.sign(timestamp.encode() + ping()).signature
+    status, text = asyncio.run(post(ping(), signature, timestamp))
+    assert (status, text) == (401, "Request timestamp out of range")
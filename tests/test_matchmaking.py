@@ -0,0 +1,30 @@
+import asyncio
+import threading
+
+import matchmaking
+
+
+def test_join_reads_ratings_off_the_event_loop() -> None:
+    threads = []
+
+    def ratings(game: str, user_id: int) -> int:
+        threads.append(threading.current_thread())
+        return 1200
+
+    async def on_match(game, first, second) -> None:
+        raise AssertionError("nobody else is queued")
+
+    async def join_twice() -> matchmaking.Matchmaker:
+        matchmaker = matchmaking.Matchmaker(ratings, on_match)
+        # a double /queue, both joins wait on the rating at the same time
+        results = await asyncio.gather(
+            matchmaker.join("chess", 1, 10, 100),
+            matchmaker.join("chess", 1, 10, 100),
+        )
+        assert results == [None, None]
+        matchmaker.sweeper.cancel()
+        return matchmaker
+
+    matchmaker = asyncio.run(join_twice())
+    assert matchmaker.waiting("chess", 1) == 1
+    assert threading.main_thread() not in threads
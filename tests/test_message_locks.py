@@ -0,0 +1,45 @@
+import asyncio
+
+import hikari
+
+import elo
+import lib
+import loadtest
+from games import chess as chess_module
+from games.chess import ChessGame
+
+
+class CountingEloHandler(elo.EloHandler):
+    def __init__(self, db) -> None:
+        super().__init__(db=db, game_name="chess")
+        self.outcomes: list = []
+
+    def record_outcome(self, result):
+        self.outcomes.append(result)
+        return super().record_outcome(result)
+
+
+def test_concurrent_forfeits_record_one_outcome() -> None:
+    lib.set_application_emojis(loadtest.synthetic_emojis())
+    # every REST call yields, so the second click queues behind the first
+    bot = loadtest.FakeBot(rest_latency=0.01)
+    handler = CountingEloHandler(elo.init_db(":memory:"))
+    chess_module.setup(bot, loadtest.FakeClient(), handler)
+    player_w, player_b = hikari.Snowflake(1), hikari.Snowflake(2)
+    content = ChessGame(player_w, player_b).content()
+    clicks = [
+        loadtest.synthetic_event(content, "chess_forfeit", player, message_id=100)
+        for player in (player_w, player_b)
+    ]
+
+    async def click_both() -> None:
+        await asyncio.gather(*(bot.dispatch(event) for event in clicks))
+
+    asyncio.run(click_both())
+    assert len(handler.outcomes) == 1
+    replies = [
+        kwargs.get("content")
+        for _, kwargs in bot.rest.calls
+        if kwargs.get("response_type") == hikari.ResponseType.MESSAGE_CREATE
+    ]
+    assert replies == ["This game is already over."]
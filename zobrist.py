@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+
+import lib
+
+# python-chess is only needed for the chess keys, with --lazy it loads on first use
+chess = lib.lazy_import("chess")
+
+# 64 bit Zobrist keys for board positions: one random key per (square, piece) XORed
+# together, so a move changes the key by one XOR per piece it moves. the keys come
+# from fixed names rather than a random seed, a position keeps its key in every
+# process and across restarts
+
+
+def keys(name: str, count: int) -> tuple[int, ...]:
+    return tuple(
+        int.from_bytes(
+            hashlib.blake2b(f"{name}:{index}".encode("utf-8"), digest_size=8).digest(),
+            "big",
+        )
+        for index in range(count)
+    )
+
+
+# grid games, rows of one letter cells with " " for empty. whose turn it is follows
+# from the number of pieces, so it isn't part of the key
+CONNECT_FOUR_PIECES = "RY"
+CONNECT_FOUR_KEYS = keys("connectfour", 6 * 7 * len(CONNECT_FOUR_PIECES))
+TIC_TAC_TOE_PIECES = "XO"
+TIC_TAC_TOE_KEYS = keys("tictactoe", 3 * 3 * len(TIC_TAC_TOE_PIECES))
+
+
+def grid_key(
+    table: tuple[int, ...], pieces: str, width: int, row: int, col: int, piece: str
+) -> int:
+    return table[(row * width + col) * len(pieces) + pieces.index(piece)]
+
+
+def grid_hash(table: tuple[int, ...], pieces: str, board: list[list[str]]) -> int:
+    key = 0
+    for row, cells in enumerate(board):
+        for col, cell in enumerate(cells):
+            if cell != " ":
+                key ^= grid_key(table, pieces, len(cells), row, col, cell)
+    return key
+
+
+def connect_four_hash(board: list[list[str]]) -> int:
+    return grid_hash(CONNECT_FOUR_KEYS, CONNECT_FOUR_PIECES, board)
+
+
+def connect_four_update(key: int, row: int, col: int, piece: str) -> int:
+    # the key after piece lands on (row, col)
+    return key ^ grid_key(CONNECT_FOUR_KEYS, CONNECT_FOUR_PIECES, 7, row, col, piece)
+
+
+def tic_tac_toe_hash(board: list[list[str]]) -> int:
+    return grid_hash(TIC_TAC_TOE_KEYS, TIC_TAC_TOE_PIECES, board)
+
+
+def tic_tac_toe_update(key: int, row: int, col: int, piece: str) -> int:
+    return key ^ grid_key(TIC_TAC_TOE_KEYS, TIC_TAC_TOE_PIECES, 3, row, col, piece)
+
+
+# chess uses the Polyglot table python-chess ships, standard positions get the
+# same keys as opening books. every other variant adds a key of its own, the
+# same pieces on a crossderby board are a different position
+@functools.cache
+def variant_key(variant: str) -> int:
+    if variant == "standard":
+        return 0
+    return keys(f"chess:{variant}", 1)[0]
+
+
+@functools.cache
+def _polyglot():
+    import chess.polyglot
+
+    return chess.polyglot.ZobristHasher(chess.polyglot.POLYGLOT_RANDOM_ARRAY)
+
+
+def chess_hash(board: chess.Board, variant: str = "standard") -> int:
+    return _polyglot()(board) ^ variant_key(variant)
+
+
+def chess_state(board: chess.Board) -> int:
+    # the side to move, castling rights and en passant part of a key
+    hasher = _polyglot()
+    return (
+        hasher.hash_turn(board)
+        ^ hasher.hash_castling(board)
+        ^ hasher.hash_ep_square(board)
+    )
+
+
+def chess_snapshot(board: chess.Board) -> tuple[int, ...]:
+    # what chess_update needs of the position before a move, cheaper than a copy
+    return (
+        chess_state(board),
+        *(
+            board.pieces_mask(piece_type, color)
+            for color in (chess.BLACK, chess.WHITE)
+            for piece_type in chess.PIECE_TYPES
+        ),
+    )
+
+
+def chess_update(key: int, before: tuple[int, ...], after: chess.Board) -> int:
+    # the key of after from the key and chess_snapshot of the position before it.
+    # only the squares whose piece changed are touched, however many gravity moved
+    array = _polyglot().array
+    key ^= before[0] ^ chess_state(after)
+    index = 1
+    for pivot, color in enumerate((chess.BLACK, chess.WHITE)):
+        for piece_type in chess.PIECE_TYPES:
+            changed = before[index] ^ after.pieces_mask(piece_type, color)
+            index += 1
+            offset = 64 * ((piece_type - 1) * 2 + pivot)
+            for square in chess.scan_forward(changed):
+                key ^= array[offset + square]
+    return key